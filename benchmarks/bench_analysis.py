@@ -0,0 +1,84 @@
+"""
+Benchmark: rebuild with an e-class analysis attached.
+
+Grows the e-graph of `tests/input/constant_folding.py` with the AST rules of
+`bench_search.py` (except `mul_div_distributive_rule`, which is unsound:
+constant folding finds e-classes with two different values) and
+`ASTConstantFolding`, and saturates a chain sum of
+variables and constants `v0 + 1 + v1 + 2 + ...` with the rules of
+`bench_rebuild.py` and `ExprConstantFolding`. Reports, for each iteration,
+the e-graph size, the number of calls to the analysis' `make` during
+`EGraph.rebuild`, and the rebuild time.
+
+Usage:
+
+    $ python benchmarks/bench_analysis.py [AST iterations] [terms]
+"""
+import os
+import sys
+from functools import reduce
+from time import perf_counter
+
+from quiche import EGraph
+from quiche.lang.expr_constant_folding import ExprConstantFolding
+from quiche.lang.expr_lang import ExprNode, ExprTree
+from quiche.pyast import ASTConstantFolding, ASTQuicheTree
+from quiche.pyast.pyarith_rewrites import mul_div_distributive_rule
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_rebuild import make_rules  # noqa: E402
+from bench_search import ROOT, all_rules  # noqa: E402
+
+
+def counting(analysis_class):
+    class CountingAnalysis(analysis_class):
+        calls = 0
+
+        def make(self, egraph, enode):
+            self.calls += 1
+            return super().make(egraph, enode)
+
+    return CountingAnalysis()
+
+
+def run(name, egraph, rules, iterations):
+    analysis = egraph.analysis
+    totals = [0, 0.0]
+    for iteration in range(iterations):
+        matches = [(rule, rule.search(egraph)) for rule in rules]
+        version = egraph.version
+        for rule, rule_matches in matches:
+            egraph.apply_rewrite(rule, rule_matches)
+        analysis.calls = 0
+        start = perf_counter()
+        egraph.rebuild()
+        row = [analysis.calls, perf_counter() - start]
+        totals = [total + x for total, x in zip(totals, row)]
+        print("{:<6} {:>4} {:>8} {:>10} {:>10.4f}".format(
+            name, iteration, len(egraph.hashcons), *row
+        ))
+        if version == egraph.version:
+            break
+    print("{:<6} {:>4} {:>8} {:>10} {:>10.4f}".format(name, "all", "", *totals))
+
+
+def main(iterations: int, terms: int):
+    print("{:<6} {:>4} {:>8} {:>10} {:>10}".format(
+        "e-graph", "iter", "e-nodes", "make", "rebuild s"
+    ))
+    tree = ASTQuicheTree(os.path.join(ROOT, "tests", "input", "constant_folding.py"))
+    rules = [rule for rule in all_rules() if rule is not mul_div_distributive_rule]
+    run("ast", EGraph(tree, counting(ASTConstantFolding)), rules, iterations)
+
+    leaves = []
+    for i in range(terms):
+        leaves += [ExprNode("v{}".format(i), ()), ExprNode(i + 1, ())]
+    tree = ExprTree(reduce(lambda x, y: x + y, leaves))
+    run("expr", EGraph(tree, counting(ExprConstantFolding)), make_rules(), 30)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 3,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+    )
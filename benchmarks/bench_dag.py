@@ -0,0 +1,65 @@
+"""
+Benchmark: DAG cost extraction.
+
+Grows the e-graph of `tests/input/constant_folding.py` with the AST rules of
+`bench_search.py`, and the chain sum of `bench_rebuild.py`, then extracts
+the root with `MinimumCostExtractor` (tree cost) and with
+`DagCostExtractor`, greedy and exact (within the time limit), and reports
+the DAG cost of each extracted term (the sum of the costs of its distinct
+e-classes) and the extraction time.
+
+Usage:
+
+    $ python benchmarks/bench_dag.py [AST iterations] [terms] [time limit]
+"""
+import os
+import sys
+from time import perf_counter
+
+from quiche import DagCostExtractor, MinimumCostExtractor
+from quiche.lang.expr_lang import ExprNodeCost
+from quiche.pyast import ASTHeuristicCostModel
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_memory import grow_ast, grow_expr  # noqa: E402
+
+
+def measure(name, egraph, cost_model, time_limit):
+    root = egraph.root.find()
+    print(name, egraph.total_size(), "e-nodes")
+    print("{:<8} {:>10} {:>8} {:>10}".format("mode", "DAG cost", "optimal", "time s"))
+
+    start = perf_counter()
+    tree_costs = MinimumCostExtractor().compute_costs(cost_model, egraph)
+    selection = DagCostExtractor._tree_selection(tree_costs, root)
+    elapsed = perf_counter() - start
+    print("{:<8} {:>10} {:>8} {:>10.4f}".format(
+        "tree", DagCostExtractor.dag_cost(cost_model, selection), "", elapsed
+    ))
+
+    for mode, extractor in [
+        ("greedy", DagCostExtractor()),
+        ("exact", DagCostExtractor(exact=True, time_limit=time_limit)),
+    ]:
+        start = perf_counter()
+        selection = extractor.select(cost_model, egraph, root)
+        elapsed = perf_counter() - start
+        print("{:<8} {:>10} {:>8} {:>10.4f}".format(
+            mode,
+            extractor.dag_cost(cost_model, selection),
+            str(extractor.optimal) if extractor.exact else "",
+            elapsed,
+        ))
+
+
+def main(iterations: int, terms: int, time_limit: float):
+    measure("ast", grow_ast(iterations), ASTHeuristicCostModel(), time_limit)
+    measure("expr", grow_expr(terms), ExprNodeCost(), time_limit)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 3,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+        float(sys.argv[3]) if len(sys.argv) > 3 else 5.0,
+    )
@@ -0,0 +1,72 @@
+"""
+Benchmark: time per `Rule.apply_rules` iteration against e-graph size.
+
+Builds a balanced sum of `n` distinct variables and runs a few rounds of
+arithmetic rules. Most rules do not match, so the iteration time is dominated
+by the search phase. Also reports the cost of a single `EGraph.eclasses()`
+call right after the e-graph has been modified.
+
+Usage:
+
+    $ python benchmarks/bench_eclasses.py [size ...]
+"""
+import sys
+from time import perf_counter
+
+from quiche import EGraph, Rule
+from quiche.lang.expr_lang import ExprNode, ExprTree
+
+
+def make_rules():
+    return [
+        ExprTree.make_rule(lambda x: (x * 2, x << 1)),
+        ExprTree.make_rule(lambda x, y, z: ((x * y) / z, x * (y / z))),
+        ExprTree.make_rule(lambda x: (x / x, ExprNode(1, ()))),
+        ExprTree.make_rule(lambda x: (x * 1, x)),
+        ExprTree.make_rule(lambda x: (x - x, ExprNode(0, ()))),
+        ExprTree.make_rule(lambda x: (x + 0, x)),
+        ExprTree.make_rule(lambda x, y: (x + y, y + x)),
+    ]
+
+
+def make_sum(size: int, start: int = 0) -> ExprNode:
+    if size == 1:
+        return ExprNode("v{}".format(start), ())
+    half = size // 2
+    return make_sum(half, start) + make_sum(size - half, start + half)
+
+
+def run(size: int, iterations: int = 3):
+    egraph = EGraph(ExprTree(make_sum(size)))
+    rules = make_rules()
+    times = []
+    for _ in range(iterations):
+        start = perf_counter()
+        Rule.apply_rules(rules, egraph)
+        times.append(perf_counter() - start)
+
+    # modify the e-graph, then time a single (uncached) `eclasses()` call
+    egraph.add(ExprTree(ExprNode("fresh", ())))
+    start = perf_counter()
+    egraph.eclasses()
+    eclasses_time = perf_counter() - start
+    return len(egraph.hashcons), times, eclasses_time
+
+
+def main(sizes):
+    print(
+        "{:>8} {:>10} {:>14}  {}".format(
+            "terms", "e-nodes", "eclasses() s", "seconds per iteration"
+        )
+    )
+    for size in sizes:
+        nodes, times, eclasses_time = run(size)
+        print(
+            "{:>8} {:>10} {:>14.6f}  {}".format(
+                size, nodes, eclasses_time, " ".join("{:.4f}".format(t) for t in times)
+            )
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [500, 1000, 2000, 4000])
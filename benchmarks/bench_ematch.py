@@ -0,0 +1,55 @@
+"""
+Microbenchmark: recursive `EGraph.ematch` vs. the compiled e-matching
+machine (`quiche.machine.Program`) on the same e-graph and rules.
+
+Grows an AST e-graph for `tests/input/constant_folding.py` with all AST
+rules for a few iterations, then times both matchers on every rule and
+checks that they return identical matches (in the same order).
+
+Usage:
+
+    $ python benchmarks/bench_ematch.py [iterations]
+"""
+import os
+import sys
+from time import perf_counter
+
+from quiche import EGraph, Rule
+from quiche.pyast import ASTQuicheTree
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_search import ROOT, all_rules  # noqa: E402
+
+
+def best_of(fn, repeat: int = 3):
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        result = fn()
+        times.append(perf_counter() - start)
+    return min(times), result
+
+
+def main(iterations: int):
+    tree = ASTQuicheTree(os.path.join(ROOT, "tests", "input", "constant_folding.py"))
+    egraph = EGraph(tree)
+    rules = all_rules()
+    for _ in range(iterations):
+        Rule.apply_rules(rules, egraph)
+    eclasses = egraph.eclasses()
+    print("{} e-nodes, {} e-classes, {} rules".format(len(egraph.hashcons), len(eclasses), len(rules)))
+
+    ematch_time, ematch_matches = best_of(
+        lambda: [egraph.ematch(rule.lhs, eclasses) for rule in rules]
+    )
+    program_time, program_matches = best_of(
+        lambda: [rule.program.search(egraph, eclasses) for rule in rules]
+    )
+    assert ematch_matches == program_matches
+    print("matches:        {}".format(sum(len(m) for m in ematch_matches)))
+    print("EGraph.ematch:  {:.4f}s".format(ematch_time))
+    print("Program.search: {:.4f}s".format(program_time))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,102 @@
+"""
+Benchmark: cost computation of `MinimumCostExtractor`.
+
+Grows the e-graph of `tests/input/constant_folding.py` with the AST rules of
+`bench_search.py`, and the chain sum of `bench_rebuild.py`, then computes the
+lowest cost of every e-class with the worklist algorithm of
+`MinimumCostExtractor.compute_costs` and with the previous algorithm (full
+passes over every e-node until no cost changes), checks that both agree, and
+reports the time and the number of `enode_cost_rec` calls of each.
+
+Usage:
+
+    $ python benchmarks/bench_extract.py [AST iterations] [terms]
+"""
+import os
+import sys
+from math import inf
+from time import perf_counter
+
+from quiche import MinimumCostExtractor
+from quiche.lang.expr_lang import ExprNodeCost
+from quiche.pyast import ASTHeuristicCostModel
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_memory import grow_ast, grow_expr  # noqa: E402
+
+
+class CountingCostModel:
+    """Wraps a cost model, counting the calls to `enode_cost_rec`."""
+
+    def __init__(self, cost_model):
+        self.cost_model = cost_model
+        self.calls = 0
+
+    def enode_cost(self, enode):
+        return self.cost_model.enode_cost(enode)
+
+    def enode_cost_rec(self, enode, costs):
+        self.calls += 1
+        return self.cost_model.enode_cost_rec(enode, costs)
+
+
+def fixpoint_costs(cost_model, egraph):
+    """The previous algorithm: full passes until a fixed point."""
+    eclasses = egraph.eclasses()
+    costs = {eid: (inf, None) for eid in eclasses}
+    changed = True
+    while changed:
+        changed = False
+        for eclass, enodes in eclasses.items():
+            new_cost = min((cost_model.enode_cost_rec(enode, costs), enode) for enode in enodes)
+            if costs[eclass][0] != new_cost[0]:
+                changed = True
+            costs[eclass] = new_cost
+    return costs
+
+
+def measure(name, egraph, cost_model):
+    counting = CountingCostModel(cost_model)
+    start = perf_counter()
+    expected = fixpoint_costs(counting, egraph)
+    passes_time, passes_calls = perf_counter() - start, counting.calls
+
+    counting.calls = 0
+    start = perf_counter()
+    actual = MinimumCostExtractor().compute_costs(counting, egraph)
+    worklist_time, worklist_calls = perf_counter() - start, counting.calls
+
+    assert {eid: cost for eid, (cost, _) in actual.items()} == {
+        eid: cost for eid, (cost, _) in expected.items()
+    }
+    assert all(
+        actual[eid][1] == enode for eid, (cost, enode) in expected.items() if cost != inf
+    )
+    print(
+        "{:<6} {:>8} {:>10} {:>10.4f} {:>10} {:>10.4f} {:>8.1f}x".format(
+            name,
+            egraph.total_size(),
+            passes_calls,
+            passes_time,
+            worklist_calls,
+            worklist_time,
+            passes_time / worklist_time,
+        )
+    )
+
+
+def main(iterations: int, terms: int):
+    print(
+        "{:<6} {:>8} {:>10} {:>10} {:>10} {:>10} {:>9}".format(
+            "e-graph", "e-nodes", "pass calls", "passes s", "wl calls", "worklist s", "speedup"
+        )
+    )
+    measure("ast", grow_ast(iterations), ASTHeuristicCostModel())
+    measure("expr", grow_expr(terms), ExprNodeCost())
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+    )
@@ -0,0 +1,91 @@
+"""
+Benchmark: constant folding with pruning of the constant e-classes.
+
+Grows the e-graph of `tests/input/constant_folding.py` and of a generated
+module of constant expressions (over all the folded operators, mixed with
+variables) with the AST rules of `bench_search.py` (except
+`mul_div_distributive_rule`, as in `bench_analysis.py`) and
+`ASTConstantFolding`, with `modify` pruning the e-classes found to be
+constants and without (the e-graph's `prune` disabled). Reports, for each
+iteration, the number of e-nodes in the e-classes, the number of matches,
+and the search time.
+
+Usage:
+
+    $ python benchmarks/bench_folding.py [iterations] [statements]
+"""
+import os
+import random
+import sys
+from time import perf_counter
+
+from quiche import EGraph
+from quiche.pyast import ASTConstantFolding, ASTQuicheTree
+from quiche.pyast.pyarith_rewrites import mul_div_distributive_rule
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_search import ROOT, all_rules  # noqa: E402
+
+BINOPS = ["+", "-", "*", "/", "//", "%", "**", "<<", ">>", "&", "|", "^"]
+
+
+def generate(statements: int) -> str:
+    """Assignments of random expressions of small ints and a variable."""
+    rng = random.Random(0)
+
+    def expression(depth):
+        if depth == 0:
+            return rng.choice(["x", str(rng.randint(0, 3)), str(rng.randint(1, 9))])
+        left, right = expression(depth - 1), expression(depth - 1)
+        return "({} {} {})".format(left, rng.choice(BINOPS), right)
+
+    return "\n".join(
+        "y{} = {}".format(i, expression(rng.randint(1, 3))) for i in range(statements)
+    )
+
+
+def run(name, tree, rules, iterations, prune):
+    egraph = EGraph(tree, ASTConstantFolding())
+    if not prune:
+        egraph.prune = lambda eclass, keep: None
+    egraph.rebuild()
+    totals = [0, 0.0]
+    for iteration in range(iterations):
+        start = perf_counter()
+        matches = [(rule, rule.search(egraph)) for rule in rules]
+        row = [sum(len(m) for _, m in matches), perf_counter() - start]
+        totals = [total + x for total, x in zip(totals, row)]
+        version = egraph.version
+        for rule, rule_matches in matches:
+            egraph.apply_rewrite(rule, rule_matches)
+        egraph.rebuild()
+        size = sum(len(nodes) for nodes in egraph.eclasses().values())
+        print("{:<8} {:<6} {:>4} {:>8} {:>8} {:>10.4f}".format(
+            name, "prune" if prune else "keep", iteration, size, *row
+        ))
+        if version == egraph.version:
+            break
+    print("{:<8} {:<6} {:>4} {:>8} {:>8} {:>10.4f}".format(
+        name, "prune" if prune else "keep", "all", "", *totals
+    ))
+
+
+def main(iterations: int, statements: int):
+    print("{:<8} {:<6} {:>4} {:>8} {:>8} {:>10}".format(
+        "input", "mode", "iter", "e-nodes", "matches", "search s"
+    ))
+    rules = [rule for rule in all_rules() if rule is not mul_div_distributive_rule]
+    fname = os.path.join(ROOT, "tests", "input", "constant_folding.py")
+    source = generate(statements)
+    for prune in (False, True):
+        run("file", ASTQuicheTree(fname), rules, iterations, prune)
+        tree = ASTQuicheTree()
+        tree.from_string(source)
+        run("random", tree, rules, iterations, prune)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 3,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 40,
+    )
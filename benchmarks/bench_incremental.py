@@ -0,0 +1,85 @@
+"""
+Benchmark: full vs incremental (delta) e-matching.
+
+Builds a balanced sum of `n` distinct variables, in which none of the rules
+match, plus a small term `(a * 2) / 2` that the rules rewrite for a few
+iterations. The full search re-matches every rule against the whole e-graph
+in every iteration; the incremental search (`SimpleScheduler(incremental=True)`)
+only visits the e-classes changed since each rule was last searched, and
+their ancestors. Both must build the same e-graph.
+
+Usage:
+
+    $ python benchmarks/bench_incremental.py [size ...]
+"""
+import os
+import sys
+from time import perf_counter
+
+from quiche import EGraph, Rule
+from quiche.lang.expr_lang import ExprNode, ExprTree
+from quiche.scheduler import SimpleScheduler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_eclasses import make_sum  # noqa: E402
+
+
+def make_rules():
+    return [
+        ExprTree.make_rule(lambda x: (x * 2, x << 1)),
+        ExprTree.make_rule(lambda x, y, z: ((x * y) / z, x * (y / z))),
+        ExprTree.make_rule(lambda x: (x / x, ExprNode(1, ()))),
+        ExprTree.make_rule(lambda x: (x * 1, x)),
+        ExprTree.make_rule(lambda x: (x + 0, x)),
+    ]
+
+
+def run(size: int, incremental: bool, max_iterations: int = 20):
+    a = ExprNode("a", ())
+    egraph = EGraph(ExprTree(make_sum(size) + (a * 2) / 2))
+    rules = make_rules()
+    scheduler = SimpleScheduler(incremental=incremental)
+    times = []
+    for _ in range(max_iterations):
+        if egraph.is_saturated():
+            break
+        start = perf_counter()
+        matches = Rule.search_rules(rules, egraph, scheduler=scheduler)
+        times.append(perf_counter() - start)
+        version = egraph.version
+        for rule, rule_matches in matches:
+            egraph.apply_rewrite(rule, rule_matches)
+        egraph.rebuild()
+        egraph._is_saturated = version == egraph.version
+        scheduler.iteration += 1
+    return egraph, times
+
+
+def main(sizes):
+    print(
+        "{:>8} {:>10} {:>6} {:>12} {:>12} {:>8}".format(
+            "terms", "e-nodes", "iters", "full s", "delta s", "speedup"
+        )
+    )
+    for size in sizes:
+        full, full_times = run(size, False)
+        delta, delta_times = run(size, True)
+        assert len(full.hashcons) == len(delta.hashcons)
+        assert len(full.eclasses()) == len(delta.eclasses())
+        assert len(full_times) == len(delta_times)
+        # the first search is a full search in both cases
+        full_time, delta_time = sum(full_times[1:]), sum(delta_times[1:])
+        print(
+            "{:>8} {:>10} {:>6} {:>12.4f} {:>12.4f} {:>7.1f}x".format(
+                size,
+                len(full.hashcons),
+                len(full_times),
+                full_time,
+                delta_time,
+                full_time / delta_time,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 4000, 16000])
@@ -0,0 +1,129 @@
+"""
+Benchmark: best-so-far monitoring during equality saturation.
+
+Grows the e-graph of `tests/input/constant_folding.py` with the AST rules of
+`bench_search.py`, and the chain sum of `bench_rebuild.py`, one iteration at
+a time, and extracts the best term after every iteration, with a new
+`MinimumCostExtractor` (all costs computed from scratch) and with an
+`IncrementalCostExtractor` kept across iterations. Reports, for each
+iteration, the number of `enode_cost_rec` calls and the time of both, and
+checks that both find terms of the same cost. Then merges two e-classes of
+the final e-graph and extracts again ("edit" row, with the number of
+changed e-classes).
+
+Usage:
+
+    $ python benchmarks/bench_incremental_extract.py [AST iterations] [terms]
+"""
+import os
+import sys
+from functools import reduce
+from time import perf_counter
+
+from quiche import EGraph, IncrementalCostExtractor, MinimumCostExtractor, Rule
+from quiche.lang.expr_lang import ExprNode, ExprNodeCost, ExprTree
+from quiche.pyast import ASTHeuristicCostModel, ASTQuicheTree
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_extract import CountingCostModel  # noqa: E402
+from bench_rebuild import make_rules  # noqa: E402
+from bench_search import ROOT, all_rules  # noqa: E402
+
+
+def extract(extractor, cost_model, egraph, build_tree):
+    cost_model.calls = 0
+    start = perf_counter()
+    extractor.extract(cost_model, egraph, egraph.root, build_tree)
+    elapsed = perf_counter() - start
+    return elapsed, cost_model.calls
+
+
+def check(incremental, cost_model, egraph):
+    expected = MinimumCostExtractor().compute_costs(cost_model, egraph)
+    assert all(incremental.costs[eid][0] == cost for eid, (cost, _) in expected.items())
+
+
+def measure(name, egraph, rules, iterations, cost_model, build_tree):
+    print(name)
+    print(
+        "{:>4} {:>8} {:>10} {:>10} {:>10} {:>10}".format(
+            "iter", "e-nodes", "full calls", "full s", "incr calls", "incr s"
+        )
+    )
+    full_model = CountingCostModel(cost_model)
+    incremental_model = CountingCostModel(cost_model)
+    incremental = IncrementalCostExtractor()
+    totals = [0, 0.0, 0, 0.0]
+    for iteration in range(iterations):
+        version = egraph.version
+        Rule.apply_rules(rules, egraph)
+        if version == egraph.version:
+            break
+        full_time, full_calls = extract(
+            MinimumCostExtractor(), full_model, egraph, build_tree
+        )
+        incremental_time, incremental_calls = extract(
+            incremental, incremental_model, egraph, build_tree
+        )
+        check(incremental, cost_model, egraph)
+
+        row = [full_calls, full_time, incremental_calls, incremental_time]
+        totals = [total + x for total, x in zip(totals, row)]
+        print(
+            "{:>4} {:>8} {:>10} {:>10.4f} {:>10} {:>10.4f}".format(
+                iteration, egraph.total_size(), *row
+            )
+        )
+    print("{:>4} {:>8} {:>10} {:>10.4f} {:>10} {:>10.4f}".format("all", "", *totals))
+
+    # a small edit of the final e-graph: merge an e-class from the middle of
+    # the e-graph with a leaf
+    eclasses = sorted(egraph.eclasses())
+    leaf = next(eid for eid in eclasses if any(not enode.args for enode in eid.nodes))
+    version = egraph.version
+    egraph.merge(eclasses[len(eclasses) // 2], leaf)
+    egraph.rebuild()
+    full_time, full_calls = extract(MinimumCostExtractor(), full_model, egraph, build_tree)
+    incremental_time, incremental_calls = extract(
+        incremental, incremental_model, egraph, build_tree
+    )
+    check(incremental, cost_model, egraph)
+    print(
+        "{:>4} {:>8} {:>10} {:>10.4f} {:>10} {:>10.4f}".format(
+            "edit",
+            len(egraph.changed_since(version)),
+            full_calls,
+            full_time,
+            incremental_calls,
+            incremental_time,
+        )
+    )
+
+
+def main(iterations: int, terms: int):
+    tree = ASTQuicheTree(os.path.join(ROOT, "tests", "input", "constant_folding.py"))
+    measure(
+        "ast",
+        EGraph(tree),
+        all_rules(),
+        iterations,
+        ASTHeuristicCostModel(),
+        ASTQuicheTree.make_node,
+    )
+
+    variables = [ExprNode("v{}".format(i), ()) for i in range(terms)]
+    measure(
+        "expr",
+        EGraph(ExprTree(reduce(lambda x, y: x + y, variables) * 2)),
+        make_rules(),
+        30,
+        ExprNodeCost(),
+        ExprTree.make_node,
+    )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+    )
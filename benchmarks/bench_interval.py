@@ -0,0 +1,74 @@
+"""
+Benchmark: conditions of conditional rules with an interval analysis.
+
+Grows the e-graph of `tests/input/constant_folding.py` with the AST rules of
+`bench_search.py` (except `mul_div_distributive_rule`, as in
+`bench_analysis.py`), without an analysis and with `ASTIntervalAnalysis`,
+and reports the growth time of both. Then checks the condition of
+`div_self_rule` for every e-class of the final e-graph, by scanning the
+e-class for a literal zero (without an analysis) and with the O(1) interval
+check, and reports the time of each and the number of e-classes that pass.
+
+Usage:
+
+    $ python benchmarks/bench_interval.py [AST iterations] [repeats]
+"""
+import os
+import sys
+from ast import Constant, Num
+from time import perf_counter
+
+from quiche import EGraph, Rule
+from quiche.pyast import ASTIntervalAnalysis, ASTQuicheTree
+from quiche.pyast.pyarith_rewrites import mul_div_distributive_rule
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_search import ROOT, all_rules  # noqa: E402
+
+ZEROS = [("int", Constant, 0, None), ("int", Num, 0)]
+
+
+def grow(analysis, iterations):
+    tree = ASTQuicheTree(os.path.join(ROOT, "tests", "input", "constant_folding.py"))
+    rules = [rule for rule in all_rules() if rule is not mul_div_distributive_rule]
+    start = perf_counter()
+    egraph = EGraph(tree, analysis)
+    for _ in range(iterations):
+        Rule.apply_rules(rules, egraph)
+    return egraph, perf_counter() - start
+
+
+def scan(egraph, eclass):
+    return not any(
+        (not enode.args) and enode.key.value in ZEROS
+        for enode in egraph.lookup_eclass(eclass)
+    )
+
+
+def main(iterations: int, repeats: int):
+    plain, plain_time = grow(None, iterations)
+    analysis = ASTIntervalAnalysis()
+    egraph, interval_time = grow(analysis, iterations)
+    print("{} e-nodes, {} e-classes".format(egraph.total_size(), len(egraph.eclasses())))
+    print("{:<10} {:>10}".format("growth", "time s"))
+    print("{:<10} {:>10.4f}".format("plain", plain_time))
+    print("{:<10} {:>10.4f}".format("interval", interval_time))
+
+    print("{:<10} {:>10} {:>10}".format("condition", "pass", "time s"))
+    for name, graph, check in [
+        ("scan", plain, lambda eclass: scan(plain, eclass)),
+        ("interval", egraph, analysis.is_nonzero),
+    ]:
+        eclasses = list(graph.eclasses())
+        start = perf_counter()
+        for _ in range(repeats):
+            passed = sum(1 for eclass in eclasses if check(eclass))
+        elapsed = perf_counter() - start
+        print("{:<10} {:>10} {:>10.4f}".format(name, passed, elapsed))
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 3,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 100,
+    )
@@ -0,0 +1,85 @@
+"""
+Benchmark: memory per e-node.
+
+Grows the e-graph of `tests/input/constant_folding.py` with the AST rules of
+`bench_search.py`, and the chain sum of `bench_rebuild.py`, and reports the
+memory allocated for each e-graph (measured with `tracemalloc`, after the
+matches of the last iteration were dropped) divided by its number of
+e-nodes, along with the number of e-class ids (canonical or merged).
+
+Usage:
+
+    $ python benchmarks/bench_memory.py [AST iterations] [terms]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+from functools import reduce
+
+from quiche import EGraph, Rule
+from quiche.lang.expr_lang import ExprNode, ExprTree
+from quiche.pyast import ASTQuicheTree
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_rebuild import make_rules  # noqa: E402
+from bench_search import ROOT, all_rules  # noqa: E402
+
+
+def grow_ast(iterations: int) -> EGraph:
+    tree = ASTQuicheTree(os.path.join(ROOT, "tests", "input", "constant_folding.py"))
+    egraph = EGraph(tree)
+    rules = all_rules()
+    for _ in range(iterations):
+        Rule.apply_rules(rules, egraph)
+    return egraph
+
+
+def grow_expr(terms: int) -> EGraph:
+    variables = [ExprNode("v{}".format(i), ()) for i in range(terms)]
+    egraph = EGraph(ExprTree(reduce(lambda x, y: x + y, variables) * 2))
+    rules = make_rules()
+    for _ in range(30):
+        version = egraph.version
+        Rule.apply_rules(rules, egraph)
+        if version == egraph.version:
+            break
+    return egraph
+
+
+def measure(name: str, grow):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    egraph = grow()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    nodes = egraph.total_size()
+    print(
+        "{:<6} {:>8} {:>8} {:>8} {:>10.1f} {:>8.1f}".format(
+            name,
+            nodes,
+            len(egraph.eclasses()),
+            len(egraph._eclass_ids),
+            size / 2 ** 20,
+            size / nodes,
+        )
+    )
+
+
+def main(iterations: int, terms: int):
+    print(
+        "{:<6} {:>8} {:>8} {:>8} {:>10} {:>8}".format(
+            "e-graph", "e-nodes", "classes", "ids", "MiB", "B/node"
+        )
+    )
+    measure("ast", lambda: grow_ast(iterations))
+    measure("expr", lambda: grow_expr(terms))
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 3,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+    )
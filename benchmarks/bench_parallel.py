@@ -0,0 +1,73 @@
+"""
+Benchmark: parallel search phase with a pool of forked workers.
+
+Grows the e-graph of `tests/input/constant_folding.py` with the AST rules
+of `bench_search.py`, then times one search phase of all the rules
+(`Rule.search_rules`) sequentially and with 2, 4, ..., N worker processes,
+and checks that every run finds the same matches. Speedups are bounded by
+the number of CPUs, by the most expensive rule (a rule is never split
+across workers) and by the cost of forking and of sending the matches
+back.
+
+Usage:
+
+    $ python benchmarks/bench_parallel.py [max workers] [iterations]
+"""
+import os
+import sys
+from time import perf_counter
+
+from quiche import EGraph, Rule
+from quiche.pyast import ASTQuicheTree
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_search import ROOT, all_rules  # noqa: E402
+
+
+def fingerprint(matches):
+    return [
+        [(eid.id, tuple(binding.id for binding in env.bindings)) for eid, env in rule_matches]
+        for _, rule_matches in matches
+    ]
+
+
+def main(max_workers: int, iterations: int):
+    tree = ASTQuicheTree(os.path.join(ROOT, "tests", "input", "constant_folding.py"))
+    egraph = EGraph(tree)
+    rules = all_rules()
+    for _ in range(iterations):
+        Rule.apply_rules(rules, egraph)
+    print(
+        "{} rules, {} e-nodes, {} e-classes, {} CPUs".format(
+            len(rules), len(egraph.hashcons), len(egraph.eclasses()), os.cpu_count()
+        )
+    )
+
+    counts = [1]
+    while counts[-1] * 2 <= max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != max_workers:
+        counts.append(max_workers)
+
+    print("{:>8} {:>9} {:>10} {:>8}".format("workers", "matches", "search s", "speedup"))
+    expected = None
+    baseline = None
+    for workers in counts:
+        start = perf_counter()
+        matches = Rule.search_rules(rules, egraph, workers=workers)
+        elapsed = perf_counter() - start
+        if expected is None:
+            expected, baseline = fingerprint(matches), elapsed
+        assert fingerprint(matches) == expected
+        print(
+            "{:>8} {:>9} {:>10.3f} {:>7.2f}x".format(
+                workers, sum(len(m) for _, m in matches), elapsed, baseline / elapsed
+            )
+        )
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else (os.cpu_count() or 1),
+        int(sys.argv[2]) if len(sys.argv) > 2 else 3,
+    )
@@ -0,0 +1,78 @@
+"""
+Benchmark: several e-class analyses in one e-graph.
+
+Saturates a chain sum of variables and constants `v0 + 1 + v1 + 2 + ...`
+with the rules of `bench_rebuild.py`, once with each of two analyses
+(`ExprConstantFolding` and the depth of the shallowest term of each e-class)
+and once with their `ProductAnalysis`, and reports the time of each run and
+its rebuild phases.
+
+Usage:
+
+    $ python benchmarks/bench_product.py [terms]
+"""
+import os
+import sys
+from functools import reduce
+from time import perf_counter
+
+from quiche import EGraph, Rule
+from quiche.egraph import EClassAnalysis, ProductAnalysis
+from quiche.lang.expr_constant_folding import ExprConstantFolding
+from quiche.lang.expr_lang import ExprNode, ExprTree
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_rebuild import make_rules  # noqa: E402
+
+
+class MinDepth(EClassAnalysis[int]):
+    def make(self, egraph, enode):
+        return 1 + max((self.data(arg) for arg in enode.args), default=0)
+
+    def join(self, dval1, dval2):
+        return min(dval1, dval2)
+
+
+def run(terms: int, analysis: EClassAnalysis):
+    leaves = []
+    for i in range(terms):
+        leaves += [ExprNode("v{}".format(i), ()), ExprNode(i + 1, ())]
+    rules = make_rules()
+    start = perf_counter()
+    egraph = EGraph(ExprTree(reduce(lambda x, y: x + y, leaves)), analysis)
+    rebuild_time = 0.0
+    for _ in range(30):
+        matches = [(rule, rule.search(egraph)) for rule in rules]
+        version = egraph.version
+        for rule, rule_matches in matches:
+            egraph.apply_rewrite(rule, rule_matches)
+        rebuild_start = perf_counter()
+        egraph.rebuild()
+        rebuild_time += perf_counter() - rebuild_start
+        if version == egraph.version:
+            break
+    return egraph, perf_counter() - start, rebuild_time
+
+
+def main(terms: int):
+    print(
+        "{:<10} {:>8} {:>10} {:>10}".format("analysis", "e-nodes", "total s", "rebuild s")
+    )
+    totals = [0.0, 0.0]
+    for name, analysis in [
+        ("constants", ExprConstantFolding()),
+        ("depth", MinDepth()),
+        ("product", ProductAnalysis(constants=ExprConstantFolding(), depth=MinDepth())),
+    ]:
+        egraph, total, rebuild = run(terms, analysis)
+        if name != "product":
+            totals = [totals[0] + total, totals[1] + rebuild]
+        else:
+            print("{:<10} {:>8} {:>10.4f} {:>10.4f}".format("separate", "", *totals))
+        print("{:<10} {:>8} {:>10.4f} {:>10.4f}".format(
+            name, egraph.total_size(), total, rebuild
+        ))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
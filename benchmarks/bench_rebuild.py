@@ -0,0 +1,73 @@
+"""
+Benchmark: rebuild time on merge-heavy workloads.
+
+Saturates a chain sum `v0 + v1 + ... + vn` with the associativity and
+commutativity rules of `+` (and `*`-by-constant rules from
+`tests/test_expr.py`), which merge nearly every e-class with several others
+in each iteration. Reports, for each iteration, the e-graph size, the number
+of (enode, eclass) entries in the `uses` lists, and the time spent in
+`EGraph.rebuild`.
+
+Usage:
+
+    $ python benchmarks/bench_rebuild.py [terms ...]
+"""
+import sys
+from functools import reduce
+from time import perf_counter
+
+from quiche import EGraph, Rule
+from quiche.lang.expr_lang import ExprNode, ExprTree
+
+
+def make_rules():
+    return [
+        ExprTree.make_rule(lambda x, y: (x + y, y + x)),
+        ExprTree.make_rule(lambda x, y, z: ((x + y) + z, x + (y + z))),
+        ExprTree.make_rule(lambda x, y, z: (x + (y + z), (x + y) + z)),
+        ExprTree.make_rule(lambda x: (x * 2, x << 1)),
+        ExprTree.make_rule(lambda x: (x * 1, x)),
+    ]
+
+
+def run(terms: int, max_iterations: int = 30):
+    variables = [ExprNode("v{}".format(i), ()) for i in range(terms)]
+    egraph = EGraph(ExprTree(reduce(lambda x, y: x + y, variables) * 2))
+    rules = make_rules()
+    rows = []
+    for _ in range(max_iterations):
+        matches = [(rule, rule.search(egraph)) for rule in rules]
+        version = egraph.version
+        for rule, rule_matches in matches:
+            egraph.apply_rewrite(rule, rule_matches)
+        start = perf_counter()
+        egraph.rebuild()
+        rebuild_time = perf_counter() - start
+        uses = sum(len(eid.uses) for eid in egraph.eclasses())
+        rows.append((len(egraph.hashcons), len(egraph.eclasses()), uses, rebuild_time))
+        if version == egraph.version:
+            break
+    return rows
+
+
+def main(sizes):
+    print(
+        "{:>6} {:>6} {:>10} {:>10} {:>10} {:>12}".format(
+            "terms", "iter", "e-nodes", "e-classes", "uses", "rebuild s"
+        )
+    )
+    for terms in sizes:
+        rows = run(terms)
+        for i, (nodes, classes, uses, rebuild_time) in enumerate(rows):
+            print(
+                "{:>6} {:>6} {:>10} {:>10} {:>10} {:>12.4f}".format(
+                    terms, i, nodes, classes, uses, rebuild_time
+                )
+            )
+        print(
+            "{:>6} {:>6} {:>45.4f}".format(terms, "total", sum(row[-1] for row in rows))
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [5, 6, 7])
@@ -0,0 +1,79 @@
+"""
+Benchmark: term reconstruction (`MinimumCostExtractor._extract_tree`).
+
+Grows the e-graph of `tests/input/constant_folding.py` with the AST rules of
+`bench_search.py`, and the chain sum of `bench_rebuild.py`, and builds a
+chain of doublings (x_{i+1} = x_i + x_i), then times the reconstruction of
+the extracted term of each root with `_extract_tree` and with the previous
+recursive implementation (which rebuilds an e-class at each of its uses),
+along with the number of `build_tree` calls of each.
+
+Usage:
+
+    $ python benchmarks/bench_reconstruct.py [AST iterations] [terms] [doublings]
+"""
+import os
+import sys
+from time import perf_counter
+
+from quiche import EGraph, ENode, MinimumCostExtractor
+from quiche.lang.expr_lang import ExprNode, ExprNodeCost, ExprTree
+from quiche.pyast import ASTHeuristicCostModel, ASTQuicheTree
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_memory import grow_ast, grow_expr  # noqa: E402
+
+
+def recursive_extract_tree(eclassid, costs, build_tree):
+    """The previous implementation."""
+    enode = costs[eclassid.find()][1]
+    return build_tree(
+        enode.key.value,
+        tuple(recursive_extract_tree(eid, costs, build_tree) for eid in enode.args),
+    )
+
+
+def doublings(count: int) -> EGraph:
+    egraph = EGraph()
+    eclass = egraph.add(ExprTree(ExprNode("x", ())))
+    for _ in range(count):
+        eclass = egraph.add_enode(ENode("+", (eclass, eclass)))
+    egraph.root = eclass
+    return egraph
+
+
+def measure(name, egraph, cost_model, build_tree):
+    calls = [0]
+
+    def counting_build_tree(key, children):
+        calls[0] += 1
+        return build_tree(key, children)
+
+    costs = MinimumCostExtractor().compute_costs(cost_model, egraph)
+    root = egraph.root.find()
+    row = [name]
+    for extract_tree in [recursive_extract_tree, MinimumCostExtractor()._extract_tree]:
+        calls[0] = 0
+        start = perf_counter()
+        extract_tree(root, costs, counting_build_tree)
+        row += [calls[0], perf_counter() - start]
+    print("{:<10} {:>10} {:>10.4f} {:>10} {:>10.4f}".format(*row))
+
+
+def main(iterations: int, terms: int, count: int):
+    print(
+        "{:<10} {:>10} {:>10} {:>10} {:>10}".format(
+            "e-graph", "rec calls", "rec s", "calls", "s"
+        )
+    )
+    measure("ast", grow_ast(iterations), ASTHeuristicCostModel(), ASTQuicheTree.make_node)
+    measure("expr", grow_expr(terms), ExprNodeCost(), ExprTree.make_node)
+    measure("doublings", doublings(count), ExprNodeCost(), ExprTree.make_node)
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 3,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 18,
+    )
@@ -0,0 +1,55 @@
+"""
+Benchmark: top-down e-matching machine vs. relational (generic join)
+e-matching on a non-linear pattern.
+
+Builds `(| L R)` where the e-class `L` holds `(& a_i b_i)` and `R` holds
+`(& a_i c_i)` for i < n, and matches `(| (& ?x ?y) (& ?x ?z))`. The machine
+tries all n * n pairs of `&` e-nodes before comparing `?x`; generic join
+intersects the candidates for `?x` and only visits the n matches.
+
+Usage:
+
+    $ python benchmarks/bench_relational.py [n ...]
+"""
+import sys
+from time import perf_counter
+
+from quiche import EGraph
+from quiche.lang.prop_parser import PropTree
+
+
+def make_egraph(n: int) -> EGraph:
+    egraph = EGraph()
+    left = [egraph.add(PropTree.parse("(& a{0} b{0})".format(i))) for i in range(n)]
+    right = [egraph.add(PropTree.parse("(& a{0} c{0})".format(i))) for i in range(n)]
+    for eclasses in (left, right):
+        for eid in eclasses[1:]:
+            egraph.merge(eclasses[0], eid)
+    egraph.add(PropTree("|", (PropTree("L", ()), PropTree("R", ()))))
+    egraph.merge(egraph.add(PropTree("L", ())), left[0])
+    egraph.merge(egraph.add(PropTree("R", ())), right[0])
+    egraph.rebuild()
+    return egraph
+
+
+def main(sizes):
+    rule = PropTree.make_rule("(| (& ?x ?y) (& ?x ?z))", "(& ?x (| ?y ?z))")
+    print("{:>6} {:>8} {:>10} {:>10}".format("n", "matches", "machine s", "relational s"))
+    for n in sizes:
+        egraph = make_egraph(n)
+        times = {}
+        results = {}
+        for matcher in ("machine", "relational"):
+            start = perf_counter()
+            results[matcher] = rule.search(egraph, matcher)
+            times[matcher] = perf_counter() - start
+        assert len(results["machine"]) == len(results["relational"]) == n
+        print(
+            "{:>6} {:>8} {:>10.4f} {:>10.4f}".format(
+                n, n, times["machine"], times["relational"]
+            )
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [100, 300, 1000, 3000])
@@ -0,0 +1,95 @@
+"""
+Benchmark: saving and loading e-graphs with `EGraph.save` / `EGraph.load`.
+
+Grows two e-graphs, the chain sum of `bench_rebuild.py` (ExprTree keys) and
+`tests/input/constant_folding.py` with the AST rules of `bench_search.py`
+(ASTQuicheTree keys), then reports the file size, the save and load times,
+and the time it took to grow the e-graph in the first place, which is what
+a crashed job would have to redo without a saved e-graph.
+
+Usage:
+
+    $ python benchmarks/bench_save.py [terms] [AST iterations]
+"""
+import os
+import sys
+import tempfile
+from functools import reduce
+from time import perf_counter
+
+from quiche import EGraph, Rule
+from quiche.lang.expr_lang import ExprNode, ExprTree
+from quiche.pyast import ASTQuicheTree
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_rebuild import make_rules  # noqa: E402
+from bench_search import ROOT, all_rules  # noqa: E402
+
+
+def grow_expr(terms: int) -> EGraph:
+    variables = [ExprNode("v{}".format(i), ()) for i in range(terms)]
+    egraph = EGraph(ExprTree(reduce(lambda x, y: x + y, variables) * 2))
+    rules = make_rules()
+    for _ in range(30):
+        version = egraph.version
+        Rule.apply_rules(rules, egraph)
+        if version == egraph.version:
+            break
+    return egraph
+
+
+def grow_ast(iterations: int) -> EGraph:
+    tree = ASTQuicheTree(os.path.join(ROOT, "tests", "input", "constant_folding.py"))
+    egraph = EGraph(tree)
+    rules = all_rules()
+    for _ in range(iterations):
+        Rule.apply_rules(rules, egraph)
+    return egraph
+
+
+def measure(name: str, grow):
+    start = perf_counter()
+    egraph = grow()
+    grow_time = perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "egraph.bin")
+        start = perf_counter()
+        egraph.save(path)
+        save_time = perf_counter() - start
+        size = os.path.getsize(path)
+        start = perf_counter()
+        loaded = EGraph.load(path)
+        load_time = perf_counter() - start
+    assert loaded.total_size() == egraph.total_size()
+    assert len(loaded.eclasses()) == len(egraph.eclasses())
+
+    print(
+        "{:<10} {:>8} {:>8} {:>10.1f} {:>8.1f} {:>10.4f} {:>10.4f} {:>10.4f}".format(
+            name,
+            egraph.total_size(),
+            len(egraph.eclasses()),
+            size / 1024,
+            size / egraph.total_size(),
+            save_time,
+            load_time,
+            grow_time,
+        )
+    )
+
+
+def main(terms: int, iterations: int):
+    print(
+        "{:<10} {:>8} {:>8} {:>10} {:>8} {:>10} {:>10} {:>10}".format(
+            "e-graph", "e-nodes", "classes", "file KiB", "B/node", "save s", "load s", "grow s"
+        )
+    )
+    measure("expr", lambda: grow_expr(terms))
+    measure("ast", lambda: grow_ast(iterations))
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 8,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 3,
+    )
@@ -0,0 +1,62 @@
+"""
+Benchmark: search (e-matching) phase of `Rule.apply_rules` on a Python AST.
+
+Loads `tests/input/constant_folding.py` and, for a few iterations, times the
+search phase of every arithmetic, logic, bitwise, relational and code rule
+before applying the matches.
+
+Usage:
+
+    $ python benchmarks/bench_search.py [iterations]
+"""
+import os
+import sys
+from time import perf_counter
+
+from quiche import EGraph, Rule
+from quiche.pyast import ASTQuicheTree
+from quiche.pyast.pyarith_rewrites import get_all_arith_rules
+from quiche.pyast.pybitwise_rewrites import get_all_bitwise_rules
+from quiche.pyast.pycode_rewrites import get_all_code_rules
+from quiche.pyast.pylogic_rewrites import get_all_logic_rules
+from quiche.pyast.pyrelational_rewrites import get_all_relational_rules
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def all_rules():
+    return (
+        get_all_arith_rules()
+        + get_all_logic_rules()
+        + get_all_bitwise_rules()
+        + get_all_relational_rules()
+        + get_all_code_rules()
+    )
+
+
+def main(iterations: int):
+    tree = ASTQuicheTree(os.path.join(ROOT, "tests", "input", "constant_folding.py"))
+    egraph = EGraph(tree)
+    rules = all_rules()
+    print("{} rules".format(len(rules)))
+    print("{:>4} {:>8} {:>8} {:>8} {:>10}".format("iter", "e-nodes", "classes", "matches", "search s"))
+    for iteration in range(iterations):
+        start = perf_counter()
+        matches = [(rule, egraph.search(rule)) for rule in rules]
+        search_time = perf_counter() - start
+        print(
+            "{:>4} {:>8} {:>8} {:>8} {:>10.4f}".format(
+                iteration,
+                len(egraph.hashcons),
+                len(egraph.eclasses()),
+                sum(len(m) for _, m in matches),
+                search_time,
+            )
+        )
+        for rule, rule_matches in matches:
+            egraph.apply_rewrite(rule, rule_matches)
+        egraph.rebuild()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
@@ -0,0 +1,83 @@
+"""
+Benchmark: streaming e-matching with early cutoff.
+
+On the propositional e-graph of `bench_subst.py`, measures the wall time and
+the peak memory (with `tracemalloc`) of:
+
+- counting the matches of a commutativity pattern with `EGraph.ematch` (a
+  list) and with `EGraph.iter_matches` (a stream);
+- one search phase of `Rule.apply_rules` with every match, with a per-rule
+  match limit (`SimpleScheduler(match_limit=...)`) and with a
+  `BackoffScheduler`, which stops searching a rule once it exceeds its limit.
+
+Usage:
+
+    $ python benchmarks/bench_stream.py [clauses] [match limit]
+"""
+import os
+import sys
+import tracemalloc
+from time import perf_counter
+
+from quiche import Rule
+from quiche.lang.prop_parser import PropTree
+from quiche.scheduler import BackoffScheduler, SimpleScheduler
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_subst import make_egraph, make_rules  # noqa: E402
+
+
+def measure(fn):
+    start = perf_counter()
+    fn()
+    elapsed = perf_counter() - start
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+
+def main(clauses: int, limit: int):
+    egraph = make_egraph(clauses)
+    rules = make_rules()
+    print("{} e-nodes, {} e-classes".format(len(egraph.hashcons), len(egraph.eclasses())))
+    pattern = PropTree.parse("(& ?x ?y)")
+    eclasses = egraph.eclasses()
+    workloads = [
+        ("ematch count", lambda: len(egraph.ematch(pattern, eclasses))),
+        ("iter_matches count", lambda: sum(1 for _ in egraph.iter_matches(pattern))),
+        (
+            "iter_matches first {}".format(limit),
+            lambda: sum(1 for _ in egraph.iter_matches(pattern, limit)),
+        ),
+        (
+            "search, all matches",
+            lambda: Rule.search_rules(rules, egraph, scheduler=SimpleScheduler()),
+        ),
+        (
+            "search, limit {}".format(limit),
+            lambda: Rule.search_rules(
+                rules, egraph, scheduler=SimpleScheduler(match_limit=limit)
+            ),
+        ),
+        (
+            "search, backoff {}".format(limit),
+            lambda: Rule.search_rules(
+                rules, egraph, scheduler=BackoffScheduler(match_limit=limit)
+            ),
+        ),
+    ]
+    print("{:>24} {:>9} {:>10} {:>9}".format("workload", "matches", "peak KiB", "seconds"))
+    for name, fn in workloads:
+        result, peak, elapsed = measure(fn)
+        if not isinstance(result, int):
+            result = sum(len(matches) for _, matches in result)
+        print("{:>24} {:>9} {:>10.0f} {:>9.3f}".format(name, result, peak / 1024, elapsed))
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 1000,
+    )
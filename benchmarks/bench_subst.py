@@ -0,0 +1,84 @@
+"""
+Benchmark: memory allocated by the substitutions of e-matching.
+
+Grows an e-graph from a conjunction of implications with a few rounds of
+propositional rules. It then measures,
+with `tracemalloc`, the memory held by the matches of every rule and the
+peak memory while searching. Three searches are measured: the recursive
+`EGraph.ematch`, the e-matching machine and the relational backend.
+
+Usage:
+
+    $ python benchmarks/bench_subst.py [clauses]
+"""
+import sys
+import tracemalloc
+from time import perf_counter
+
+from quiche import EGraph, Rule
+from quiche.lang.prop_parser import PropTree
+
+
+def make_rules():
+    return [
+        PropTree.make_rule("(-> ?x ?y)", "(| (~ ?x) ?y)"),
+        PropTree.make_rule("(| (~ ?x) ?y)", "(-> ?x ?y)"),
+        PropTree.make_rule("(| ?x ?y)", "(| ?y ?x)"),
+        PropTree.make_rule("(& ?x ?y)", "(& ?y ?x)"),
+        PropTree.make_rule("(& ?x (& ?y ?z))", "(& (& ?x ?y) ?z)"),
+        PropTree.make_rule("(| ?x (| ?y ?z))", "(| (| ?x ?y) ?z)"),
+        PropTree.make_rule("(& (-> ?x ?y) (-> (~ ?x) ?z))", "(| ?y ?z)"),
+    ]
+
+
+def make_egraph(clauses: int, rounds: int = 4) -> EGraph:
+    # (-> a0 a1) & ((-> a1 a2) & ... )
+    term = "(-> a{} a{})".format(clauses - 1, clauses)
+    for i in reversed(range(clauses - 1)):
+        term = "(& (-> a{} a{}) {})".format(i, i + 1, term)
+    egraph = EGraph(PropTree.parse(term))
+    for _ in range(rounds):
+        Rule.apply_rules(make_rules(), egraph)
+    return egraph
+
+
+def measure(search, repeat: int = 3):
+    # time without tracing (best of `repeat`), then trace a single run
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        search()
+        times.append(perf_counter() - start)
+    tracemalloc.start()
+    matches = search()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return sum(len(m) for m in matches), current, peak, min(times)
+
+
+def main(clauses: int):
+    egraph = make_egraph(clauses)
+    rules = make_rules()
+    eclasses = egraph.eclasses()
+    print("{} e-nodes, {} e-classes".format(len(egraph.hashcons), len(eclasses)))
+    searches = [
+        ("ematch", lambda: [egraph.ematch(rule.lhs, eclasses) for rule in rules]),
+        ("machine", lambda: [rule.search(egraph, "machine") for rule in rules]),
+        ("relational", lambda: [rule.search(egraph, "relational") for rule in rules]),
+    ]
+    print(
+        "{:>12} {:>9} {:>10} {:>10} {:>12} {:>9}".format(
+            "search", "matches", "held KiB", "peak KiB", "bytes/match", "seconds"
+        )
+    )
+    for name, search in searches:
+        count, current, peak, elapsed = measure(search)
+        print(
+            "{:>12} {:>9} {:>10.0f} {:>10.0f} {:>12.0f} {:>9.3f}".format(
+                name, count, current / 1024, peak / 1024, current / count, elapsed
+            )
+        )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
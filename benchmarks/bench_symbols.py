@@ -0,0 +1,69 @@
+"""
+Benchmark: the hot paths that hash and compare ENode keys, on a Python AST.
+
+Grows the e-graph of `tests/input/constant_folding.py` with the AST rules of
+`bench_search.py` and reports, for each iteration, the time of the search
+(e-matching key checks), apply and rebuild (hashcons lookups) phases, then
+times hashcons lookups of every e-node and a minimum cost extraction with
+`ASTHeuristicCostModel`.
+
+Usage:
+
+    $ python benchmarks/bench_symbols.py [iterations]
+"""
+import os
+import sys
+from time import perf_counter
+
+from quiche import EGraph, MinimumCostExtractor
+from quiche.pyast import ASTHeuristicCostModel, ASTQuicheTree
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_search import ROOT, all_rules  # noqa: E402
+
+
+def main(iterations: int):
+    tree = ASTQuicheTree(os.path.join(ROOT, "tests", "input", "constant_folding.py"))
+    start = perf_counter()
+    egraph = EGraph(tree)
+    print("add {:.4f}s".format(perf_counter() - start))
+
+    rules = all_rules()
+    print(
+        "{:>4} {:>8} {:>10} {:>10} {:>10}".format(
+            "iter", "e-nodes", "search s", "apply s", "rebuild s"
+        )
+    )
+    totals = [0.0, 0.0, 0.0]
+    for iteration in range(iterations):
+        start = perf_counter()
+        matches = [(rule, egraph.search(rule)) for rule in rules]
+        search_end = perf_counter()
+        for rule, rule_matches in matches:
+            egraph.apply_rewrite(rule, rule_matches)
+        apply_end = perf_counter()
+        egraph.rebuild()
+        end = perf_counter()
+        times = [search_end - start, apply_end - search_end, end - apply_end]
+        totals = [total + t for total, t in zip(totals, times)]
+        print("{:>4} {:>8} {:>10.4f} {:>10.4f} {:>10.4f}".format(
+            iteration, len(egraph.hashcons), *times
+        ))
+    print("{:>4} {:>8} {:>10.4f} {:>10.4f} {:>10.4f}".format("all", "", *totals))
+
+    enodes = list(egraph.hashcons)
+    hashcons = egraph.hashcons
+    start = perf_counter()
+    for _ in range(10):
+        for enode in enodes:
+            hashcons[enode]
+    print("10 x {} hashcons lookups {:.4f}s".format(len(enodes), perf_counter() - start))
+
+    cost_model = ASTHeuristicCostModel()
+    start = perf_counter()
+    MinimumCostExtractor().extract(cost_model, egraph, egraph.root, ASTQuicheTree.make_node)
+    print("extract {:.4f}s".format(perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
@@ -0,0 +1,85 @@
+"""
+Benchmark: union-find performance.
+
+Times a long chain of merges followed by a `find()` on the deepest e-class,
+plus the end-to-end demo workloads (which are dominated by `find()` calls
+from canonicalization).
+
+Usage:
+
+    $ python benchmarks/bench_union_find.py [chain length]
+"""
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+from time import perf_counter
+
+from quiche import EGraph, Rule
+from quiche.lang.expr_lang import ExprNode, ExprTree
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def merge_chain(length: int):
+    egraph = EGraph()
+    eclasses = [
+        egraph.add(ExprTree(ExprNode("v{}".format(i), ()))) for i in range(length)
+    ]
+    start = perf_counter()
+    # merge from the newest e-class backwards, so that a naive union-find
+    # builds a single chain of length `length`
+    for i in reversed(range(length - 1)):
+        egraph.merge(eclasses[i], eclasses[i + 1])
+    try:
+        eclasses[-1].find()
+    except RecursionError:
+        return None
+    egraph.rebuild()
+    return perf_counter() - start
+
+
+def arithmetic_demo():
+    sys.path.insert(0, os.path.join(ROOT, "demo"))
+    import arithmetic_demo
+
+    # the demo prints its intermediate results
+    with redirect_stdout(io.StringIO()):
+        arithmetic_demo.main()
+
+
+def ast_arith_rules():
+    from quiche.pyast import ASTQuicheTree
+    from quiche.pyast.pyarith_rewrites import get_all_arith_rules
+
+    tree = ASTQuicheTree(os.path.join(ROOT, "tests", "input", "constant_folding.py"))
+    egraph = EGraph(tree)
+    for _ in range(3):
+        Rule.apply_rules(get_all_arith_rules(), egraph)
+
+
+def timed(fn, repeat: int = 1):
+    """Best-of-`repeat` wall time of `fn()`."""
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        fn()
+        times.append(perf_counter() - start)
+    return min(times)
+
+
+def main(length: int):
+    chain_time = merge_chain(length)
+    print(
+        "merge chain ({}): {}".format(
+            length,
+            "RecursionError" if chain_time is None else "{:.4f}s".format(chain_time),
+        )
+    )
+    print("arithmetic_demo: {:.4f}s".format(timed(arithmetic_demo, repeat=50)))
+    if sys.version_info[:2] <= (3, 10):
+        print("AST arith rules x3: {:.4f}s".format(timed(ast_arith_rules, repeat=10)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,67 @@
+"""
+Benchmark: cost computation with NumPy.
+
+Grows the e-graph of `tests/input/constant_folding.py` with the AST rules of
+`bench_search.py`, and the chain sum of `bench_rebuild.py`, then computes the
+lowest cost of every e-class with `MinimumCostExtractor` and with
+`VectorizedCostExtractor` (including lowering the e-graph to arrays),
+checks that both agree, and reports the time of each. Without NumPy,
+`VectorizedCostExtractor` falls back to `MinimumCostExtractor`.
+
+Usage:
+
+    $ python benchmarks/bench_vectorized.py [AST iterations] [terms]
+"""
+import os
+import sys
+from time import perf_counter
+
+from quiche import MinimumCostExtractor, VectorizedCostExtractor
+from quiche import analysis
+from quiche.lang.expr_lang import ExprNodeCost
+from quiche.pyast import ASTHeuristicCostModel
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_memory import grow_ast, grow_expr  # noqa: E402
+
+
+def measure(name, egraph, cost_model):
+    start = perf_counter()
+    expected = MinimumCostExtractor().compute_costs(cost_model, egraph)
+    python_time = perf_counter() - start
+
+    start = perf_counter()
+    actual = VectorizedCostExtractor().compute_costs(cost_model, egraph)
+    vectorized_time = perf_counter() - start
+
+    assert {eid: cost for eid, (cost, _) in actual.items()} == {
+        eid: cost for eid, (cost, _) in expected.items()
+    }
+    print(
+        "{:<6} {:>8} {:>10.4f} {:>10.4f} {:>8.1f}x".format(
+            name,
+            egraph.total_size(),
+            python_time,
+            vectorized_time,
+            python_time / vectorized_time,
+        )
+    )
+
+
+def main(iterations: int, terms: int):
+    if analysis.np is None:
+        print("NumPy is not installed: VectorizedCostExtractor falls back to Python")
+    print(
+        "{:<6} {:>8} {:>10} {:>10} {:>9}".format(
+            "e-graph", "e-nodes", "python s", "numpy s", "speedup"
+        )
+    )
+    measure("ast", grow_ast(iterations), ASTHeuristicCostModel())
+    measure("expr", grow_expr(terms), ExprNodeCost())
+
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+    )
@@ -1,4 +1,11 @@
 from .egraph import EGraph, EClassID, ENode
 from .quiche_tree import QuicheTree
 from .rewrite import Rule
-from .analysis import CostModel, MinimumCostExtractor
+from .analysis import (
+    CostModel,
+    DagCostExtractor,
+    IncrementalCostExtractor,
+    MinimumCostExtractor,
+    VectorizedCostExtractor,
+)
+from .runner import Runner
@@ -1,10 +1,22 @@
 from abc import ABC, abstractmethod
+from heapq import heappop, heappush
 from math import inf
-from typing import Dict, Tuple, Callable, Any
+from time import perf_counter
+from typing import Dict, List, Set, Tuple, Callable, Any
 
 from quiche.egraph import EGraph, EClassID, ENode
 from quiche.quiche_tree import QuicheTree
 
+try:
+    import numpy as np
+except ImportError:
+    # optional: VectorizedCostExtractor falls back to pure Python
+    np = None
+
+
+def _uses(eclass: EClassID) -> Dict[ENode, EClassID]:
+    return eclass.uses
+
 
 class CostModel(ABC):
     @abstractmethod
@@ -67,27 +79,94 @@ class MinimumCostExtractor(CostExtractor):
         :returns: lowest cost node
         """
         result = result.find()
+        costs = self.compute_costs(cost_model, egraph)
+        return self._extract_tree(result, costs, build_tree)
+
+    def compute_costs(
+        self, cost_model: CostModel, egraph: EGraph
+    ) -> Dict[EClassID, Tuple[int, ENode]]:
+        """
+        Calculate the lowest cost of each e-class, bottom-up from the leaves
+        (Knuth's generalization of Dijkstra's algorithm): e-classes are
+        settled in increasing order of cost, and an e-node is costed once,
+        when the last of its children is settled, by following the `uses`
+        of the settled e-classes. Each e-node is therefore costed once,
+        instead of once per pass over the e-graph.
+
+        This assumes that an e-node never costs less than any of its
+        children (e.g., non-negative costs summed over the children), as
+        with the cost models in this package. Ties are broken by taking the
+        smallest ENode. E-classes that can't be built from leaves keep an
+        infinite cost.
+
+        :returns: dictionary from canonical EClassID to its lowest (cost,
+            ENode), or (inf, None)
+        """
         eclasses = egraph.eclasses()
-        # TODO: initializing costs like this doesn't typecheck because inf is a
-        # float, and there is no maxint in python3. Rework so that
-        # uninitialized costs can be absent from `costs`. (NOTE: this might
-        # also help with the issue of eclasses containing enodes with the same
-        # key).
-        costs = {eid.find(): (inf, None) for eid in eclasses.keys()}
-        changed = True
-
-        # iterate until saturation, taking lowest cost option
-        while changed:
-            changed = False
+        costs: Dict[EClassID, Tuple[int, ENode]] = {
+            eid: (inf, None) for eid in eclasses
+        }
+        if egraph.worklist:
+            # until the e-graph is rebuilt, `uses` may list stale forms of
+            # the e-nodes: index the canonical e-nodes of each e-class instead
+            uses: Dict[EClassID, Dict[ENode, EClassID]] = {eid: {} for eid in eclasses}
             for eclass, enodes in eclasses.items():
-                new_cost = min(
-                    (cost_model.enode_cost_rec(enode, costs), enode) for enode in enodes
-                )
-                if costs[eclass][0] != new_cost[0]:
-                    changed = True
-                costs[eclass] = new_cost
+                for enode in enodes:
+                    enode = enode.canonicalize()
+                    for arg in enode.args:
+                        uses[arg][enode] = eclass
+            parents = uses.__getitem__
+        elif sum(map(len, eclasses.values())) < egraph.total_size():
+            # `uses` also lists the e-nodes pruned from their e-classes (see
+            # `EGraph.prune`), which mustn't be costed
+            live = {enode for enodes in eclasses.values() for enode in enodes}
 
-        return self._extract_tree(result, costs, build_tree)
+            def parents(eclass: EClassID) -> Dict[ENode, EClassID]:
+                return {
+                    enode: parent
+                    for enode, parent in eclass.uses.items()
+                    if enode in live
+                }
+
+        else:
+            parents = _uses
+
+        # heap of (tentative cost, e-class): an e-class is settled when its
+        # lowest cost is popped (costs only decrease, and no e-class gets
+        # cheaper once settled)
+        heap: List[Tuple[Any, EClassID]] = []
+        # number of distinct children of a parent e-node not settled yet
+        pending: Dict[ENode, int] = {}
+
+        def update(eclass: EClassID, enode: ENode):
+            cost = cost_model.enode_cost_rec(enode, costs)
+            best_cost, best_enode = costs[eclass]
+            if cost < best_cost:
+                costs[eclass] = (cost, enode)
+                heappush(heap, (cost, eclass))
+            elif cost == best_cost and best_enode is not None and enode < best_enode:
+                costs[eclass] = (cost, enode)
+
+        for eclass, enodes in eclasses.items():
+            for enode in enodes:
+                if not enode.args:
+                    update(eclass, enode)
+
+        while heap:
+            cost, eclass = heappop(heap)
+            if cost > costs[eclass][0]:
+                continue
+            for enode, parent in parents(eclass).items():
+                count = pending.get(enode)
+                if count is None:
+                    # (one EClassID object per canonical e-class)
+                    count = len(set(map(id, enode.args)))
+                if count > 1:
+                    pending[enode] = count - 1
+                else:
+                    pending.pop(enode, None)
+                    update(parent.find(), enode)
+        return costs
 
     def _extract_tree(
         self,
@@ -98,12 +177,519 @@ class MinimumCostExtractor(CostExtractor):
         """
         Build QuicheTree from a dictionary of costs and EClassIDs.
 
+        The tree is built bottom-up without recursion (so deep terms don't
+        hit the recursion limit), and the subtree of each e-class is built
+        once: an e-class used several times in the term has the same
+        QuicheTree object at each of its uses (unless `build_tree` copies
+        its children).
+
         :param eclassid: eclassid to look up
         :param costs: dictionary from EClassID to a (cost, ENode) tuple
         :returns: QuicheTree corresponding to the best cost ENode
         """
-        enode = costs[eclassid][1]
-        return build_tree(
-            enode.key,
-            tuple(self._extract_tree(eid, costs, build_tree) for eid in enode.args),
-        )
+        # dict<EClassID_canon, QuicheTree> of the subtrees built so far
+        trees: Dict[EClassID, QuicheTree] = {}
+        # e-classes whose children were pushed on the stack
+        expanded: Set[EClassID] = set()
+        stack = [eclassid.find()]
+        while stack:
+            eid = stack[-1]
+            if eid in trees:
+                stack.pop()
+                continue
+            enode = costs[eid][1]
+            args = [arg.find() for arg in enode.args]
+            missing = [arg for arg in args if arg not in trees]
+            if missing:
+                if eid in expanded:
+                    raise ValueError("cyclic selection of ENodes: {}".format(eid))
+                expanded.add(eid)
+                stack.extend(missing)
+                continue
+            stack.pop()
+            trees[eid] = build_tree(enode.key.value, tuple(trees[arg] for arg in args))
+        return trees[eclassid.find()]
+
+
+class IncrementalCostExtractor(MinimumCostExtractor):
+    """
+    A MinimumCostExtractor that keeps its costs between extractions, for
+    extracting repeatedly from a growing e-graph (e.g., to monitor the best
+    term between iterations of equality saturation).
+
+    The costs are tied to the cost model and EGraph of the last extraction.
+    When they are extracted from again, only the e-classes that changed
+    since (see `EGraph.changed_since`) are costed again, and then the
+    parents of the e-classes whose cost decreased; otherwise, all costs are
+    computed from scratch (as they are when most e-classes changed). This
+    relies on costs never increasing as the e-graph grows (adding e-nodes
+    and merging e-classes), and on the superiority of the cost model (see
+    `MinimumCostExtractor.compute_costs`).
+    Among e-nodes of equal cost, the one kept may differ from a full
+    computation.
+    """
+
+    def __init__(self):
+        self.cost_model: CostModel = None
+        self.egraph: EGraph = None
+        self.version = -1
+        # dict<EClassID, (cost, ENode)>, also holding the costs of e-classes
+        # merged since they were computed (until the next pruning)
+        self.costs: Dict[EClassID, Tuple[int, ENode]] = {}
+
+    def compute_costs(
+        self, cost_model: CostModel, egraph: EGraph
+    ) -> Dict[EClassID, Tuple[int, ENode]]:
+        """
+        Update the lowest cost of each e-class since the last call.
+
+        :param cost_model: CostModel to use for cost calculations
+        :param egraph: rebuilt EGraph
+        :returns: dictionary from EClassID to its lowest (cost, ENode), or
+            (inf, None); the dictionary is owned by the extractor, and may
+            hold non-canonical EClassIDs
+        """
+        if egraph.worklist:
+            raise ValueError("EGraph must be rebuilt before an incremental extraction")
+        if cost_model is not self.cost_model or egraph is not self.egraph:
+            self.cost_model = cost_model
+            self.egraph = egraph
+            self.costs = super().compute_costs(cost_model, egraph)
+        elif egraph.version != self.version:
+            changed = egraph.changed_since(self.version)
+            eclasses = egraph.eclasses()
+            if 2 * len(changed) >= len(eclasses) or self._pruned_best(changed):
+                # most of the e-graph changed (costing it bottom-up is cheaper
+                # than propagating cost decreases from every change), or an
+                # e-class lost its best e-node and may cost more
+                self.costs = super().compute_costs(cost_model, egraph)
+            else:
+                self._update_costs(changed)
+                if len(self.costs) > 2 * len(eclasses):
+                    # drop the costs of the merged e-classes
+                    self.costs = {eid: self.costs[eid] for eid in eclasses}
+        self.version = egraph.version
+        return self.costs
+
+    def _pruned_best(self, changed: Set[EClassID]) -> bool:
+        """
+        Whether the best e-node of a `changed` e-class was pruned from it
+        (see `EGraph.prune`).
+        """
+        for eclass in changed:
+            enode = self.costs.get(eclass, (inf, None))[1]
+            if enode is not None and enode.canonicalize() not in eclass.nodes:
+                return True
+        return False
+
+    def _update_costs(self, changed: Set[EClassID]):
+        """
+        Cost the e-nodes of the `changed` e-classes, then propagate the cost
+        decreases to their ancestors, lowest cost first.
+        """
+        cost_model = self.cost_model
+        costs = self.costs
+        heap: List[Tuple[Any, EClassID]] = []
+
+        def update(eclass: EClassID, enode: ENode):
+            cost = cost_model.enode_cost_rec(enode, costs)
+            # (the uses of an e-class also list the e-nodes pruned from its
+            # parents)
+            if cost < costs[eclass][0] and enode in eclass.nodes:
+                costs[eclass] = (cost, enode)
+                heappush(heap, (cost, eclass))
+
+        for eclass in changed:
+            if eclass not in costs:
+                costs[eclass] = (inf, None)
+        for eclass in changed:
+            for enode in eclass.nodes:
+                update(eclass, enode)
+
+        while heap:
+            cost, eclass = heappop(heap)
+            if cost > costs[eclass][0]:
+                continue
+            for enode, parent in eclass.uses.items():
+                update(parent.find(), enode)
+
+
+class DagCostExtractor(MinimumCostExtractor):
+    """
+    Extract the term of lowest DAG cost from an EGraph: the cost of the term
+    is the sum of the costs (`CostModel.enode_cost`, without the children)
+    of the e-nodes selected for the distinct e-classes it uses, so that a
+    subterm used several times is counted once. Unlike the tree cost of
+    `MinimumCostExtractor`, this favors terms that reuse the same subterms,
+    which can then be computed once.
+
+    By default, the selection is greedy: each e-class takes the e-node whose
+    sub-DAG (the union of the sub-DAGs of its children) is cheapest. With
+    `exact`, a branch and bound search then looks for a cheaper selection,
+    for up to `time_limit` seconds, and `optimal` tells whether the search
+    completed (and the selection is optimal). Either way, the result costs
+    no more than that of `MinimumCostExtractor`.
+
+    This assumes non-negative e-node costs.
+
+    :param exact: search for an optimal selection with branch and bound
+    :param time_limit: time budget in seconds of the exact search
+    """
+
+    def __init__(self, exact: bool = False, time_limit: float = 1.0):
+        self.exact = exact
+        self.time_limit = time_limit
+        self.optimal = False
+
+    def extract(
+        self,
+        cost_model: CostModel,
+        egraph: EGraph,
+        result: EClassID,
+        build_tree: Callable[[Any, Tuple[Any, ...]], QuicheTree],
+    ) -> QuicheTree:
+        """
+        Extract the ENodes of lowest DAG cost from EGraph.
+
+        :returns: tree of the selected ENodes (repeated subtrees are
+            identical)
+        """
+        result = result.find()
+        selection = self.select(cost_model, egraph, result)
+        costs = {
+            eid: (cost_model.enode_cost(enode), enode)
+            for eid, enode in selection.items()
+        }
+        return self._extract_tree(result, costs, build_tree)
+
+    def select(
+        self, cost_model: CostModel, egraph: EGraph, result: EClassID
+    ) -> Dict[EClassID, ENode]:
+        """
+        Select an ENode for each e-class of the term extracted for `result`.
+
+        :returns: dictionary from the canonical EClassIDs used by the term
+            to their selected ENode
+        """
+        result = result.find()
+        # canonical e-nodes of each e-class, whether or not the e-graph was
+        # rebuilt
+        nodes: Dict[EClassID, List[ENode]] = {
+            eid: list(dict.fromkeys(enode.canonicalize() for enode in enodes))
+            for eid, enodes in egraph.eclasses().items()
+        }
+        tree_costs = self.compute_costs(cost_model, egraph)
+        candidates = [self._tree_selection(tree_costs, result)]
+        greedy = self._reachable(self._greedy_choices(cost_model, nodes), result)
+        if greedy is not None:
+            candidates.append(greedy)
+        best = min(candidates, key=lambda choice: self.dag_cost(cost_model, choice))
+        self.optimal = False
+        if self.exact:
+            best = self._branch_and_bound(cost_model, nodes, tree_costs, result, best)
+        return best
+
+    @staticmethod
+    def dag_cost(cost_model: CostModel, selection: Dict[EClassID, ENode]):
+        """
+        :returns: DAG cost of a selection, i.e., the sum of the costs of the
+            selected ENodes
+        """
+        return sum(cost_model.enode_cost(enode) for enode in selection.values())
+
+    @staticmethod
+    def _tree_selection(
+        costs: Dict[EClassID, Tuple[int, ENode]], result: EClassID
+    ) -> Dict[EClassID, ENode]:
+        """The e-nodes of lowest tree cost, reachable from `result`."""
+        selection: Dict[EClassID, ENode] = {}
+        todo = [result]
+        while todo:
+            eid = todo.pop().find()
+            if eid not in selection:
+                enode = selection[eid] = costs[eid][1].canonicalize()
+                todo.extend(enode.args)
+        return selection
+
+    @staticmethod
+    def _reachable(
+        choices: Dict[EClassID, ENode], result: EClassID
+    ) -> Dict[EClassID, ENode]:
+        """
+        :returns: the choices reachable from `result`, or None if they are
+            missing an e-class or form a cycle
+        """
+        selection: Dict[EClassID, ENode] = {}
+        # e-classes on the path from `result` (to detect cycles)
+        on_path: Set[EClassID] = set()
+        stack = [(result, False)]
+        while stack:
+            eid, done = stack.pop()
+            if done:
+                on_path.discard(eid)
+                continue
+            if eid in on_path:
+                return None
+            if eid in selection:
+                continue
+            enode = choices.get(eid)
+            if enode is None:
+                return None
+            selection[eid] = enode
+            on_path.add(eid)
+            stack.append((eid, True))
+            stack.extend((arg, False) for arg in enode.args)
+        return selection
+
+    def _greedy_choices(
+        self, cost_model: CostModel, nodes: Dict[EClassID, List[ENode]]
+    ) -> Dict[EClassID, ENode]:
+        """
+        Choose, for each e-class, the e-node whose sub-DAG is the cheapest,
+        given the sub-DAGs chosen for its children (updated, from the
+        leaves up, until no sub-DAG gets cheaper).
+
+        :returns: dictionary from EClassID to its chosen ENode
+        """
+        uses: Dict[EClassID, Dict[ENode, EClassID]] = {eid: {} for eid in nodes}
+        for eclass, enodes in nodes.items():
+            for enode in enodes:
+                for arg in enode.args:
+                    uses[arg][enode] = eclass
+
+        # dict<EClassID, (cost, dict<EClassID, cost>)>: the cost of the
+        # cheapest sub-DAG found for each e-class, and the cost of each of
+        # the e-classes in it
+        dags: Dict[EClassID, Tuple[Any, Dict[EClassID, Any]]] = {}
+        choices: Dict[EClassID, ENode] = {}
+        todo: List[EClassID] = []
+        for eclass, enodes in nodes.items():
+            for enode in enodes:
+                if not enode.args:
+                    cost = cost_model.enode_cost(enode)
+                    if eclass not in dags or cost < dags[eclass][0]:
+                        dags[eclass] = (cost, {eclass: cost})
+                        choices[eclass] = enode
+            if eclass in dags:
+                todo.append(eclass)
+
+        queued = set(todo)
+        while todo:
+            eclass = todo.pop()
+            queued.discard(eclass)
+            for enode, parent in uses[eclass].items():
+                children = [dags.get(arg) for arg in dict.fromkeys(enode.args)]
+                if None in children:
+                    continue
+                # union of the sub-DAGs of the children, starting from the
+                # largest one
+                children.sort(key=lambda dag: len(dag[1]), reverse=True)
+                dag = dict(children[0][1])
+                for child in children[1:]:
+                    dag.update(child[1])
+                if parent in dag:
+                    # cycle
+                    continue
+                own = cost_model.enode_cost(enode)
+                dag[parent] = own
+                cost = sum(dag.values())
+                if parent not in dags or cost < dags[parent][0]:
+                    dags[parent] = (cost, dag)
+                    choices[parent] = enode
+                    if parent not in queued:
+                        queued.add(parent)
+                        todo.append(parent)
+        return choices
+
+    def _branch_and_bound(
+        self,
+        cost_model: CostModel,
+        nodes: Dict[EClassID, List[ENode]],
+        tree_costs: Dict[EClassID, Tuple[int, ENode]],
+        result: EClassID,
+        best: Dict[EClassID, ENode],
+    ) -> Dict[EClassID, ENode]:
+        """
+        Search for the selection of lowest DAG cost, depth first: select an
+        e-node for one of the e-classes needed by the selection so far (the
+        frontier) at a time, cheapest tree cost first, and prune the
+        selections whose cost plus the cheapest e-node of each e-class of
+        the frontier is no lower than the best selection found.
+
+        :param best: the best selection known (e.g., greedy)
+        :returns: the best selection found before `time_limit`
+        """
+        deadline = perf_counter() + self.time_limit
+        best_cost = self.dag_cost(cost_model, best)
+
+        # e-nodes that can be built (and aren't their own child) for each
+        # e-class, and their costs
+        options: Dict[EClassID, List[ENode]] = {}
+        min_cost: Dict[EClassID, Any] = {}
+        own: Dict[ENode, Any] = {}
+        for eclass, enodes in nodes.items():
+            buildable = [
+                enode
+                for enode in enodes
+                if eclass not in enode.args
+                and cost_model.enode_cost_rec(enode, tree_costs) < inf
+            ]
+            buildable.sort(
+                key=lambda enode: cost_model.enode_cost_rec(enode, tree_costs)
+            )
+            for enode in buildable:
+                own[enode] = cost_model.enode_cost(enode)
+            options[eclass] = buildable
+            min_cost[eclass] = min((own[enode] for enode in buildable), default=inf)
+
+        selection: Dict[EClassID, ENode] = {}
+        # number of selected e-nodes using each e-class
+        needed: Dict[EClassID, int] = {result: 1}
+        # e-classes needed but not selected yet, and the sum of their
+        # cheapest e-nodes
+        frontier: Set[EClassID] = {result}
+        frontier_cost = min_cost[result]
+        cost = 0
+        # stack of [e-class, number of its options tried]
+        stack: List[List[Any]] = []
+        steps = 0
+        branch = True
+        self.optimal = True
+        while True:
+            steps += 1
+            if steps % 1024 == 0 and perf_counter() > deadline:
+                self.optimal = False
+                break
+            if branch:
+                if not frontier:
+                    if cost < best_cost:
+                        complete = self._reachable(selection, result)
+                        if complete is not None:
+                            best, best_cost = complete, cost
+                elif cost + frontier_cost < best_cost:
+                    # branch on the e-class of the frontier with the fewest
+                    # options
+                    eclass = min(frontier, key=lambda eid: (len(options[eid]), eid))
+                    frontier.discard(eclass)
+                    frontier_cost -= min_cost[eclass]
+                    stack.append([eclass, 0])
+            if not stack:
+                break
+
+            # try the next option of the e-class on top of the stack
+            frame = stack[-1]
+            eclass, index = frame
+            if index > 0:
+                enode = options[eclass][index - 1]
+                del selection[eclass]
+                cost -= own[enode]
+                for arg in dict.fromkeys(enode.args):
+                    needed[arg] -= 1
+                    if needed[arg] == 0 and arg not in selection:
+                        frontier.discard(arg)
+                        frontier_cost -= min_cost[arg]
+            if index < len(options[eclass]):
+                enode = options[eclass][index]
+                frame[1] = index + 1
+                selection[eclass] = enode
+                cost += own[enode]
+                for arg in dict.fromkeys(enode.args):
+                    count = needed.get(arg, 0)
+                    needed[arg] = count + 1
+                    if count == 0 and arg not in selection:
+                        frontier.add(arg)
+                        frontier_cost += min_cost[arg]
+                branch = True
+            else:
+                stack.pop()
+                frontier.add(eclass)
+                frontier_cost += min_cost[eclass]
+                branch = False
+        return best
+
+
+class VectorizedCostExtractor(MinimumCostExtractor):
+    """
+    A MinimumCostExtractor that computes the costs with NumPy, for large
+    e-graphs: the e-graph is lowered to flat arrays indexed by integers (the
+    e-class of each e-node, the children of the e-nodes in CSR form, and the
+    `CostModel.enode_cost` of each e-node), the costs of all the e-nodes and
+    e-classes are relaxed together in sweeps until they no longer change,
+    and each e-class then takes its first e-node of lowest cost.
+
+    This assumes that the cost of an e-node is its `enode_cost` plus the
+    costs of its children (as with the cost models in this package; its
+    `enode_cost_rec` isn't called), and that costs fit exactly in a float64.
+    Among e-nodes of equal cost, the one kept may differ from
+    `MinimumCostExtractor`.
+
+    Without NumPy, the costs are computed by `MinimumCostExtractor`.
+    """
+
+    def compute_costs(
+        self, cost_model: CostModel, egraph: EGraph
+    ) -> Dict[EClassID, Tuple[int, ENode]]:
+        if np is None:
+            return super().compute_costs(cost_model, egraph)
+
+        eclasses = egraph.eclasses()
+        index = {eid: i for i, eid in enumerate(eclasses)}
+        # the e-nodes of each e-class are contiguous: e-class i has the
+        # e-nodes class_starts[i] to class_starts[i + 1] - 1
+        enodes: List[ENode] = []
+        class_starts: List[int] = []
+        base_costs: List[Any] = []
+        # CSR children: e-node j has the children children[child_starts[j]]
+        # to children[child_starts[j + 1] - 1]
+        child_starts: List[int] = [0]
+        children: List[int] = []
+        for eclass, nodes in eclasses.items():
+            class_starts.append(len(enodes))
+            for enode in nodes:
+                enodes.append(enode)
+                base_costs.append(cost_model.enode_cost(enode))
+                children.extend(index[arg.find()] for arg in enode.args)
+                child_starts.append(len(children))
+        costs: Dict[EClassID, Tuple[int, ENode]] = {
+            eid: (inf, None) for eid in eclasses
+        }
+        if not enodes:
+            return costs
+
+        starts = np.array(class_starts, dtype=np.intp)
+        sizes = np.diff(np.append(starts, len(enodes)))
+        # e-classes without e-nodes (e.g., all pruned) are left out of the
+        # reduction: `reduceat` would give them the cost of the next e-node
+        # (or fail on a last empty e-class), instead of an infinite cost
+        nonempty = sizes > 0
+        nonempty_starts = starts[nonempty]
+        node_classes = np.repeat(np.arange(len(eclasses)), sizes)
+        arities = np.diff(np.array(child_starts, dtype=np.intp))
+        # the parent e-node of each child
+        parents = np.repeat(np.arange(len(enodes)), arities)
+        children_array = np.array(children, dtype=np.intp)
+        base = np.array(base_costs, dtype=np.float64)
+
+        class_costs = np.full(len(eclasses), inf)
+        while True:
+            node_costs = base + np.bincount(
+                parents, weights=class_costs[children_array], minlength=len(enodes)
+            )
+            new_costs = np.full(len(eclasses), inf)
+            new_costs[nonempty] = np.minimum.reduceat(node_costs, nonempty_starts)
+            if np.array_equal(new_costs, class_costs):
+                break
+            class_costs = new_costs
+
+        # the first e-node of lowest cost of each e-class
+        best = np.flatnonzero(node_costs == class_costs[node_classes])
+        _, first = np.unique(node_classes[best], return_index=True)
+        best = best[first]
+
+        integral = all(type(cost) is int for cost in base_costs)
+        eids = list(eclasses)
+        for eclass, node in zip(node_classes[best].tolist(), best.tolist()):
+            cost = class_costs[eclass].item()
+            if cost != inf:
+                costs[eids[eclass]] = (int(cost) if integral else cost, enodes[node])
+        return costs
@@ -1,20 +1,37 @@
-from typing import NamedTuple, Sequence, Tuple, Dict, List, Any, TypeVar, Generic
+from array import array
+from bisect import bisect_right
+from itertools import islice
+from types import MappingProxyType
+from typing import Iterable, Iterator, Mapping, NamedTuple, Optional, Sequence, Set, Tuple, Dict, List, Any, TypeVar, Generic, Callable
 from abc import ABC, abstractmethod
 
 from .quiche_tree import QuicheTree
+from .symbol_table import Symbol, SymbolTable
+from .union_find import UnionFind
 
 
 class EClassID:
-    def __init__(self, id, parent: "EClassID" = None, data: Any = None):
+    __slots__ = ("id", "egraph", "_union_find", "data", "uses", "nodes")
+
+    def __init__(self, id, egraph: "EGraph" = None, data: Any = None):
         self.id = id
-        self.parent = parent
+        # EGraph owning the union-find that this EClassID's `id` lives in
+        # (the union-find is also referenced directly to keep `find` fast)
+        self.egraph = egraph
+        self._union_find = egraph._union_find if egraph is not None else None
         self.data = data
 
-        # List of tuples of (ENode, EClassID) of enodes that use this EClassID
-        # and the EClassID of that use
+        # Dict of the ENodes that use this EClassID (in their latest
+        # canonical form) to the EClassID of that use
         # Only set on a canonical EClass (parent == None) and is used in
-        # `EGraph.rebuild()`
-        self.uses: List[Tuple[ENode, EClassID]] = []
+        # `EGraph.rebuild()`; a merged EClassID shares the read-only
+        # `_NO_USES`
+        self.uses: Dict[ENode, EClassID] = {}
+
+        # List of the ENodes in this EClassID
+        # Only set on a canonical EClass (parent == None); merged into the
+        # parent by `EGraph.union_eclasses()`, which leaves an empty tuple
+        self.nodes: List[ENode] = []
 
     def __repr__(self):
         return f"e{self.id}"
@@ -45,15 +62,34 @@ class EClassID:
 
     # end TODO
 
+    @property
+    def parent(self) -> "EClassID":
+        """Parent of this EClassID in the union-find, or None if canonical."""
+        if self.egraph is None:
+            return None
+        parent = self._union_find.parents[self.id]
+        if parent == self.id:
+            return None
+        return self.egraph._eclass_ids[parent]
+
     def find(self) -> "EClassID":
-        if self.parent is None:
+        union_find = self._union_find
+        if union_find is None or union_find.parents[self.id] == self.id:
             return self
-        top = self.parent.find()
-        self.parent = top  # caching top
-        return top
+        return self.egraph._eclass_ids[union_find.find(self.id)]
+
+
+# the change log of an EGraph is compacted once it has more entries than
+# this, or than twice as many as after the last compaction
+_MIN_CHANGE_LOG_LIMIT = 1024
+
+# `uses` of every merged EClassID: most EClassIDs of a saturated e-graph
+# are merged, and they don't need an (empty) dict each
+_NO_USES: Mapping[Any, EClassID] = MappingProxyType({})
 
 
 class ENode(NamedTuple):
+    # interned by `EGraph.add_enode` (see `Symbol`)
     key: Any
     args: Tuple[EClassID, ...]
 
@@ -88,8 +124,36 @@ class EClassAnalysis(ABC, Generic[D]):
     `make` on all nodes of the eclass and then `join`ed them together
 
     2. `modify` is at a fixed point
+
+    Analyses should read the data of e-classes (e.g., of the children of an
+    e-node in `make`) with `data`, so that they can be composed in a
+    `ProductAnalysis`.
     """
 
+    # indices of this analysis' data in the data of the e-classes, when it
+    # is a component of a `ProductAnalysis` (set by `_nest`)
+    _path: Tuple[int, ...] = ()
+
+    def data(self, eclass: EClassID) -> D:
+        """
+        The data of this analysis for `eclass`: `eclass.data`, or its
+        component when this analysis is part of a `ProductAnalysis`.
+        """
+        data = eclass.data
+        for index in self._path:
+            data = data[index]
+        return data
+
+    def _nest(self, path: Tuple[int, ...]):
+        self._path = path
+
+    def component(self, analysis_type: type) -> Optional["EClassAnalysis"]:
+        """
+        This analysis if it is an `analysis_type`, else None (a
+        `ProductAnalysis` searches its components).
+        """
+        return self if isinstance(self, analysis_type) else None
+
     def make(self, egraph: "EGraph", n: ENode) -> D:
         """
         Create a new analysis value in the domain.
@@ -113,7 +177,104 @@ class EClassAnalysis(ABC, Generic[D]):
         pass
 
 
-Subst = Dict[str, EClassID]  # type alias
+class ProductAnalysis(EClassAnalysis[Tuple[Any, ...]]):
+    """
+    Product of several analyses, run in the same e-graph: the data of an
+    e-class is the tuple of the data of each component analysis (in the
+    order they are given), made and joined component by component, and
+    propagated in a single pass by `EGraph.rebuild`. When the data of an
+    e-class changes, the `modify` of every component is called.
+
+    Components are named, and each reads its own data with
+    `EClassAnalysis.data`, e.g., in a `ConditionalRule` checker:
+    `egraph.analysis["constants"].data(eid)`.
+
+    :param components: the component analyses, by name (an analysis can
+        only be a component of one ProductAnalysis)
+    """
+
+    def __init__(self, **components: EClassAnalysis):
+        self.components: Dict[str, EClassAnalysis] = components
+        self._analyses = tuple(components.values())
+        for index, analysis in enumerate(self._analyses):
+            if analysis._path:
+                raise ValueError(
+                    "{!r} is already a component of a ProductAnalysis".format(analysis)
+                )
+            analysis._nest((index,))
+
+    def __getitem__(self, name: str) -> EClassAnalysis:
+        return self.components[name]
+
+    def _nest(self, path: Tuple[int, ...]):
+        self._path = path
+        for index, analysis in enumerate(self._analyses):
+            analysis._nest(path + (index,))
+
+    def component(self, analysis_type: type) -> Optional[EClassAnalysis]:
+        if isinstance(self, analysis_type):
+            return self
+        for analysis in self._analyses:
+            found = analysis.component(analysis_type)
+            if found is not None:
+                return found
+        return None
+
+    def make(self, egraph: "EGraph", n: ENode) -> Tuple[Any, ...]:
+        return tuple(analysis.make(egraph, n) for analysis in self._analyses)
+
+    def join(self, dval1: Tuple[Any, ...], dval2: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        if dval1 is dval2:
+            return dval1
+        joined = tuple(
+            analysis.join(d1, d2)
+            for analysis, d1, d2 in zip(self._analyses, dval1, dval2)
+        )
+        # return an argument that didn't change, to share the tuples
+        if joined == dval1:
+            return dval1
+        if joined == dval2:
+            return dval2
+        return joined
+
+    def modify(self, egraph: "EGraph", eclass: EClassID) -> EClassID:
+        for analysis in self._analyses:
+            analysis.modify(egraph, eclass)
+            eclass = eclass.find()
+        return eclass
+
+
+class SlotSubst(Mapping[str, EClassID]):
+    """
+    Substitution of a pattern, stored as a tuple of EClassIDs (`bindings`)
+    indexed by the slots that the pattern's symbols were numbered with when
+    the pattern was compiled. The `slots` table is shared by all the
+    substitutions of a pattern, so each match only allocates its bindings.
+
+    Behaves as a read-only Dict[str, EClassID]; use `dict(subst)` to get a
+    mutable copy.
+    """
+
+    __slots__ = ("slots", "bindings")
+
+    def __init__(self, slots: Dict[Any, int], bindings: Tuple[EClassID, ...]):
+        self.slots = slots
+        self.bindings = bindings
+
+    def __getitem__(self, symbol: Any) -> EClassID:
+        return self.bindings[self.slots[symbol]]
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+Subst = Mapping[str, EClassID]  # type alias
 EMatch = Tuple[EClassID, Subst]
 
 
@@ -121,6 +282,10 @@ class EGraph:
     def __init__(self, tree: QuicheTree = None, analysis: EClassAnalysis = None):
         self.id_counter = 0
 
+        # union-find over integer e-class ids, and the EClassID for each id
+        self._union_find = UnionFind()
+        self._eclass_ids: List[EClassID] = []
+
         # quickly check whether the egraph has mutated
         self.version = 0
         self._is_saturated = False
@@ -130,11 +295,40 @@ class EGraph:
         # already defined
         self.hashcons: Dict[ENode, EClassID] = {}
 
-        self._cached_eclasses: Tuple[int, Dict[EClassID, List[ENode]]] = (0, {})
+        # dict<EClassID_canon, List<ENode>> mapping each canonical e-class to
+        # its `nodes` list, maintained incrementally by `add_enode`, `merge`
+        # and `rebuild` so that `eclasses()` doesn't have to regroup `hashcons`
+        self._eclasses: Dict[EClassID, List[ENode]] = {}
+
+        # symbol table of the ENode keys (see `quiche.symbol_table`)
+        self.symbols = SymbolTable()
+
+        # dict<Symbol, Set<EClassID_canon>> of the canonical e-classes that
+        # contain at least one e-node with a given key, used by `ematch` to
+        # only visit candidate e-classes for a pattern's root
+        self._eclasses_by_key: Dict[Symbol, Set[EClassID]] = {}
+
+        # log of the e-classes created or modified (merged into, or holding an
+        # enode that was re-canonicalized or whose analysis data changed),
+        # with the version at which they changed (in a compact array of
+        # ints), used by `changed_since`; compacted by `_compact_change_log`
+        # once it has more than `_change_log_limit` entries
+        self._change_versions = array("q")
+        self._changed_eclasses: List[EClassID] = []
+        self._change_log_limit = _MIN_CHANGE_LOG_LIMIT
+
+        # canonical EClassIDs whose e-node lists may hold stale (non-canonical
+        # or duplicate) e-nodes; cleaned up at the end of `rebuild`
+        self._dirty_eclasses: List[EClassID] = []
 
         # List<EClassID> of eclasses mutated by a merge, used for `rebuild`
         self.worklist: List[EClassID] = []
 
+        # dict<ENode, EClassID> of the parent e-nodes (and their e-classes)
+        # whose analysis data must be recomputed because the data of a child
+        # changed, processed by `rebuild` after the congruence closure
+        self._analysis_pending: Dict[ENode, EClassID] = {}
+
         self.analysis = analysis
 
         self.root = None
@@ -179,10 +373,9 @@ class EGraph:
                     enode_id = str(id(enode))
                     # ec.edge(f'{eclass.id}', enode_id)
 
-                    if hasattr(enode.key, "__name__"):
-                        key = enode.key.__name__
-                    else:
-                        key = enode.key
+                    key = enode.key.value
+                    if hasattr(key, "__name__"):
+                        key = key.__name__
                     record = [escape(key)]
                     for i, arg in enumerate(enode.args):
                         dest = f"cluster_{arg.id}"
@@ -211,9 +404,52 @@ class EGraph:
         with open(filename, "w") as f:
             f.write(svg_xml)
 
+    def save(self, path: str):
+        """
+        Save the EGraph to a file in a compact binary format: a table of the
+        distinct enode keys (pickled, so keys must be picklable), integer
+        arrays of the enodes, their children and the union-find, and the
+        pickled analysis data of each e-class. The analysis itself isn't
+        saved. The EGraph must be rebuilt (see `rebuild`).
+
+        :param path: path of the file to write
+        :return: None
+        """
+        from .serialize import save_egraph
+
+        save_egraph(self, path)
+
+    @staticmethod
+    def load(path: str, analysis: EClassAnalysis = None) -> "EGraph":
+        """
+        Load an EGraph saved by `save`. The file is memory-mapped, and its
+        integer arrays are copied to lists (the map is closed before the
+        EGraph is built).
+
+        The file's keys and analysis data are unpickled, which can run
+        arbitrary code: only load files from trusted sources.
+
+        The e-class ids, `version` and analysis data are those of the saved
+        EGraph, so it can be grown further with the same rules and analysis.
+        The change log isn't saved: `changed_since` reports every e-class as
+        changed at the saved version.
+
+        :param path: path of the file to read
+        :param analysis: analysis of the loaded EGraph, which should be the
+            one the saved EGraph used
+        :returns: the loaded EGraph
+        """
+        from .serialize import load_egraph
+
+        return load_egraph(path, analysis)
+
     def is_saturated(self):
         return self._is_saturated
 
+    def total_size(self) -> int:
+        """Total number of enodes in the EGraph (including pruned ones)."""
+        return len(self.hashcons)
+
     def ematch(
         self, pattern: QuicheTree, eclasses: Dict[EClassID, List[ENode]]
     ) -> List[EMatch]:
@@ -230,10 +466,26 @@ class EGraph:
             to e-class IDs. NOTE: The list of e-matches may include multiple entries with the
             same e-class ID if there are multiple matching substitutions.
         """
-        def enode_matches(pattern: QuicheTree, enode: ENode, envs: List[Subst]) -> List[Subst]:
+        # number the pattern symbols by first (left-to-right) occurrence;
+        # substitutions are tuples indexed by these slots (None if unbound),
+        # which branches of the search share until they bind a symbol
+        slots: Dict[Any, int] = {}
+        # dict<id(pattern node), Symbol> of the keys of the pattern's nodes
+        keys: Dict[int, Symbol] = {}
+        todo = [pattern]
+        while todo:
+            node = todo.pop()
+            if node.is_pattern_symbol():
+                slots.setdefault(node.value(), len(slots))
+            else:
+                keys[id(node)] = self.symbols.intern(node.value())
+                todo.extend(reversed(node.children()))
+        SlotEnv = Tuple[Optional[EClassID], ...]
+
+        def enode_matches(pattern: QuicheTree, enode: ENode, envs: List[SlotEnv]) -> List[SlotEnv]:
             """ Check if the pattern matches the e-node under any specified substitutions."""
             # e-node key doesn't match or e-node has wrong number of children
-            if pattern.value() != enode.key or len(pattern.children()) != len(enode.args):
+            if keys[id(pattern)] is not enode.key or len(pattern.children()) != len(enode.args):
                 return []
             # no pattern children: all envs are good
             elif not pattern.children():
@@ -249,21 +501,21 @@ class EGraph:
                         return []
                 return new_envs
 
-        def match_in_eclass(pattern: QuicheTree, eid: EClassID, envs: List[Subst]) -> List[Subst]:
+        def match_in_eclass(pattern: QuicheTree, eid: EClassID, envs: List[SlotEnv]) -> List[SlotEnv]:
             """Check if pattern matches the e-class under any specified substitutions."""
-            matched_envs: List[Subst] = []
+            matched_envs: List[SlotEnv] = []
             # the root of the pattern is a symbol: in each environment, we either
             # 1. bind it to this e-class ID if the symbol isn't bound; or
             # 2. verify that the symbol was previously bound to this e-class ID
             if pattern.is_pattern_symbol():
-                val = pattern.value()
+                slot = slots[pattern.value()]
                 for env in envs:
-                    if val not in env:
-                        # (inefficiently) copy the environment because other e-classes might also match
-                        new_env = {**env}
-                        new_env[val] = eid
-                        matched_envs.append(new_env)
-                    elif env[val] is eid:
+                    bound = env[slot]
+                    if bound is None:
+                        # other e-classes might also match: bind the symbol
+                        # in a new env, `env` itself is shared by them
+                        matched_envs.append(env[:slot] + (eid,) + env[slot + 1:])
+                    elif bound is eid:
                         matched_envs.append(env)
             else:
                 # Not a pattern symbol: check if any e-nodes match
@@ -271,12 +523,67 @@ class EGraph:
                     matched_envs.extend(enode_matches(pattern, enode, envs))
             return matched_envs
 
+        root_key = keys.get(id(pattern))
+        empty: SlotEnv = (None,) * len(slots)
         matches: List[EMatch] = []
-        for eid in eclasses.keys():
-            eclass_matches = match_in_eclass(pattern, eid, [{}])
-            matches.extend([(eid, env) for env in eclass_matches])
+        for eid in self._ematch_candidates(root_key, eclasses):
+            eclass_matches = match_in_eclass(pattern, eid, [empty])
+            matches.extend([(eid, SlotSubst(slots, env)) for env in eclass_matches])
         return matches
 
+    def iter_matches(
+        self,
+        pattern: QuicheTree,
+        limit: int = None,
+        eclasses: Dict[EClassID, List[ENode]] = None,
+    ) -> Iterator[EMatch]:
+        """
+        Lazily e-match `pattern`: yields the same matches as `ematch`, in
+        the same order, as they are found, and stops after `limit` matches.
+        Unlike `ematch`, the whole list of matches is never built, so memory
+        stays bounded by what the consumer keeps.
+
+        The EGraph must not be modified before the iterator is exhausted or
+        discarded.
+
+        :param pattern: QuicheTree pattern to match against
+        :param limit: maximum number of matches (None for no limit)
+        :param eclasses: mapping from e-class IDs to their e-nodes (defaults
+            to all canonical e-classes)
+        :returns: iterator over (e-class ID, substitution) matches
+        """
+        # imported here because the machine depends on this module
+        from .machine import compile_pattern
+
+        matches = compile_pattern(pattern).iter_search(self, eclasses)
+        return islice(matches, limit)
+
+    def _ematch_candidates(
+        self,
+        root_key: Optional[Any],
+        eclasses: Dict[EClassID, List[ENode]],
+        roots: Set[EClassID] = None,
+    ):
+        """
+        E-classes of `eclasses` that may match a pattern whose root has the
+        given key or Symbol (None for a pattern symbol, which matches any e-class),
+        optionally restricted to the canonical e-classes in `roots`.
+        """
+        if root_key is None:
+            if roots is None:
+                return eclasses.keys()
+            candidates = roots
+        else:
+            # only e-classes containing an e-node with the pattern's root key
+            # can match
+            candidates = self.eclasses_with_key(root_key)
+            if roots is not None:
+                candidates = candidates & roots
+        # visit them in the same order as `eclasses`
+        return sorted(
+            (eid for eid in candidates if eid in eclasses), key=lambda eid: eid.id
+        )
+
     def env_lookup(self, env: Subst, key: str):
         """Look up key in the env substition"""
         import ast
@@ -294,11 +601,15 @@ class EGraph:
         return None
 
     def _new_singleton_eclass(self):
-        singleton = EClassID(self.id_counter)
+        singleton = EClassID(self._union_find.make_set(), self)
+        self._eclass_ids.append(singleton)
         self.id_counter += 1
         return singleton
 
     def add_enode(self, enode: ENode) -> EClassID:
+        key = enode.key
+        if type(key) is not Symbol or key.table is not self.symbols:
+            enode = ENode(self.symbols.intern(key), enode.args)
         enode = enode.canonicalize()
         eclassid = self.hashcons.get(enode, None)
         if eclassid is None:
@@ -307,8 +618,15 @@ class EGraph:
             self._is_saturated = False
             eclassid = self._new_singleton_eclass()
             for arg in enode.args:
-                arg.uses.append((enode, eclassid))
+                arg.uses[enode] = eclassid
             self.hashcons[enode] = eclassid
+            eclassid.nodes.append(enode)
+            self._eclasses[eclassid] = eclassid.nodes
+            if enode.key in self._eclasses_by_key:
+                self._eclasses_by_key[enode.key].add(eclassid)
+            else:
+                self._eclasses_by_key[enode.key] = {eclassid}
+            self._log_change(eclassid)
             if self.analysis:
                 eclassid.data = self.analysis.make(self, enode)
                 self.analysis.modify(self, eclassid)
@@ -323,11 +641,14 @@ class EGraph:
         :returns: the EClassID of the new ENode
         """
         return self.add_enode(
-            ENode(node.value(), tuple(self.add(n) for n in node.children()))
+            ENode(
+                self.symbols.intern(node.value()),
+                tuple(self.add(n) for n in node.children()),
+            )
         )
 
     def find(self, eclass_id: EClassID) -> EClassID:
-        return eclass_id.find()
+        return self._eclass_ids[self._union_find.find(eclass_id.id)]
 
     def union_eclasses(self, eid1: EClassID, eid2: EClassID) -> EClassID:
         """
@@ -337,17 +658,29 @@ class EGraph:
         :param eid2: EClassID
         :returns: EClassID
         """
+        eid1 = eid1.find()
+        eid2 = eid2.find()
         if eid1 is eid2:
             return eid1
 
-        # Merge into the lower (older) eclass_id
-        e1 = max(eid1, eid2)
-        e2 = min(eid1, eid2)
+        # Merge the smaller e-class into the larger one (on ties, into the
+        # lower, i.e. older, eclass_id)
+        e2 = self._eclass_ids[self._union_find.union(eid1.id, eid2.id)]
+        e1 = eid2 if e2 is eid1 else eid1
 
         # Maintain invariant that uses are recorded on the parent EClassID
-        e1.parent = e2
-        e2.uses += e1.uses
-        e1.uses = []
+        e2.uses.update(e1.uses)
+        e1.uses = _NO_USES
+
+        # ... and so are the e-nodes of the class
+        for enode in e1.nodes:
+            by_key = self._eclasses_by_key[enode.key]
+            by_key.discard(e1)
+            by_key.add(e2)
+        e2.nodes += e1.nodes
+        e1.nodes = ()
+        del self._eclasses[e1]
+        self._dirty_eclasses.append(e2)
 
         return e2
 
@@ -359,7 +692,17 @@ class EGraph:
         self.version += 1
         self._is_saturated = False
 
+        if self.analysis:
+            # the parents of an e-class whose data changed must be made again
+            data1, data2 = e1.data, e2.data
+            data = self.analysis.join(data1, data2)
+            if data != data1:
+                self._analysis_pending.update(e1.uses)
+            if data != data2:
+                self._analysis_pending.update(e2.uses)
+
         new_id = self.union_eclasses(e1, e2)
+        self._log_change(new_id)
 
         # now that eclassid e2 is worklist, nodes in the hashcons may not be
         # canonicalized, and we might discover that 2 enodes are actually the
@@ -367,68 +710,202 @@ class EGraph:
         # list.
         self.worklist.append(new_id)
 
-        # Update analysis
         if self.analysis:
-            data1, data2 = e1.data, e2.data
-            new_id.data = self.analysis.join(data1, data2)
+            new_id.data = data
 
         return new_id
 
+    def prune(self, eclassid: EClassID, keep: Callable[[ENode], bool]):
+        """
+        Remove the enodes of an e-class that `keep` rejects, e.g., all but
+        the leaves of an e-class that an analysis found to be a constant (as
+        egg does), so that they are no longer matched, costed or extracted.
+        The pruned enodes stay in the hashcons (and in the uses of their
+        children, which keep them canonical), so adding one of them again
+        returns the e-class instead of making a new one.
+        """
+        eclassid = eclassid.find()
+        nodes = eclassid.nodes
+        kept = [enode for enode in nodes if keep(enode)]
+        if len(kept) == len(nodes):
+            return
+        self.version += 1
+        for key in {enode.key for enode in nodes} - {enode.key for enode in kept}:
+            self._eclasses_by_key[key].discard(eclassid)
+        nodes[:] = kept
+        self._log_change(eclassid)
+
     # Ensure we have a de-duplicated version of the EGraph
     def rebuild(self):
-        while self.worklist:
-            # de-duplicate repeated calls to repair the same EClass
-            todo = set(eid.find() for eid in self.worklist)
-            self.worklist = []
-            for eclassid in todo:
-                self.repair(eclassid)
+        """
+        Restore the hashcons and congruence invariants after merges, in
+        batches (as in egg): the e-classes merged since the last batch are
+        de-duplicated and each is repaired once, which may merge more
+        e-classes for the next batch. Once the congruence is restored, the
+        analysis data is propagated to the parents of the e-classes whose
+        data changed (which may merge more e-classes, see
+        `_propagate_analysis`). Then the e-node lists touched by the
+        repairs are compacted.
+        """
+        while self.worklist or self._analysis_pending:
+            while self.worklist:
+                # de-duplicate repeated calls to repair the same EClass
+                todo = set(eid.find() for eid in self.worklist)
+                self.worklist = []
+                for eclassid in todo:
+                    self.repair(eclassid)
+            if self._analysis_pending:
+                self._propagate_analysis()
+        self._clean_eclasses()
         self._is_saturated = True
 
+    def _clean_eclasses(self):
+        """
+        Re-canonicalize and de-duplicate the e-node lists of the e-classes
+        touched since the last `rebuild`.
+        """
+        dirty = set(eid.find() for eid in self._dirty_eclasses)
+        self._dirty_eclasses = []
+        for eid in dirty:
+            eid.nodes[:] = dict.fromkeys(enode.canonicalize() for enode in eid.nodes)
+
     def repair(self, eclassid):
         """
-        Repair the EClassID `eclassid` by canonicalizing all nodes in the
-        uses list.
+        Repair the EClassID `eclassid`: re-canonicalize every enode in its
+        uses (once), update the hashcons, merge the parents that became
+        congruent, and replace the stale enodes in the uses of the other
+        children of the re-canonicalized enodes in place.
         """
         # If this happens, it probably means that `eclassid` was marked
         # for repair and then merged into another e-class. If that happens,
         # just don't worry about `eclassid` because it will be repaired
         # later (I think- unless I'm wrong, and we do need to repair...)
-        if eclassid.parent is not None:
+        if eclassid.find() is not eclassid:
             return
 
-        # reset uses of eclassid, repopulate at the end
-        uses, eclassid.uses = eclassid.uses, []
-
-        # any uses in hashcons may not be canoncial, so re-canonicalize them
-        for enode, eclass in uses:
-            if enode in self.hashcons:
-                del self.hashcons[enode]
-            enode = enode.canonicalize()
-            self.hashcons[enode] = eclass.find()
+        # detach the uses while merging: a merge into eclassid extends them
+        uses, eclassid.uses = eclassid.uses, {}
+        hashcons = self.hashcons
 
         # because we merged eclasses, some enodes might now be the same,
         # meaning we can merge additional eclasses.
-        new_uses = {}
-        for enode, eclass in uses:
-            enode = enode.canonicalize()
-            if enode in new_uses:
-                self.merge(eclass, new_uses[enode])
-            new_uses[enode] = eclass.find()
+        new_uses: Dict[ENode, EClassID] = {}
+        for enode, eclass in uses.items():
+            canonical = enode.canonicalize()
+            if canonical in new_uses:
+                self.merge(eclass, new_uses[canonical])
+            eclass = eclass.find()
+            new_uses[canonical] = eclass
+            hashcons[canonical] = eclass
+            if canonical != enode:
+                # any uses in hashcons may not be canonical
+                hashcons.pop(enode, None)
+                self._dirty_eclasses.append(eclass)
+                self._log_change(eclass)
+                # the other children still list the stale enode
+                for arg in canonical.args:
+                    arg = arg.find()
+                    if arg is not eclassid:
+                        arg_uses = arg.uses
+                        arg_uses.pop(enode, None)
+                        arg_uses[canonical] = eclass
+
         # note the find: it's possible that eclassid was merged, and uses
         # should be tied to the parent instead
-        eclassid.find().uses += new_uses.items()
+        parent = eclassid.find()
+        if parent.uses:
+            parent.uses.update(new_uses)
+        else:
+            parent.uses = new_uses
 
-        # Update analysis
-        # Mutations that modify makes to the eclass are added to the worklist
+        # the data of the merged e-class is propagated to its parents by
+        # `_propagate_analysis`
         if self.analysis:
             self.analysis.modify(self, eclassid)
-            for enode, eclass in eclassid.uses:
-                new_data = self.analysis.join(
-                    eclass.data, self.analysis.make(self, enode)
-                )
-                if new_data != eclass.data:
-                    eclass.data = new_data
-                    self.worklist.append(eclass)
+
+    def _propagate_analysis(self):
+        """
+        Make the pending parent e-nodes again and join their data into
+        their e-classes, in batches: an e-node is made once per batch, and
+        the parents of the e-classes whose data changed are made in the next
+        batch. The e-classes whose data changed are then modified, which may
+        merge e-classes (left in the worklist for `rebuild`).
+        """
+        analysis = self.analysis
+        while self._analysis_pending:
+            pending, self._analysis_pending = self._analysis_pending, {}
+            # the same e-node may be pending in several (stale) forms
+            todo: Dict[ENode, EClassID] = {}
+            for enode, eclass in pending.items():
+                todo[enode.canonicalize()] = eclass
+            for enode, eclass in todo.items():
+                eclass = eclass.find()
+                data = analysis.join(eclass.data, analysis.make(self, enode))
+                if data != eclass.data:
+                    eclass.data = data
+                    self._log_change(eclass)
+                    self._analysis_pending.update(eclass.uses)
+                    analysis.modify(self, eclass)
+
+    def _log_change(self, eclassid: EClassID):
+        self._change_versions.append(self.version)
+        self._changed_eclasses.append(eclassid)
+        if len(self._changed_eclasses) > self._change_log_limit:
+            self._compact_change_log()
+
+    def _compact_change_log(self):
+        """
+        Only keep the last change of each (canonical) e-class in the change
+        log, which doesn't change the results of `changed_since`, so that the
+        log is proportional to the number of e-classes however long the
+        e-graph is grown (the next compaction waits for as many changes as
+        are left, so this is amortized O(1) per change).
+        """
+        last: Dict[EClassID, int] = {}
+        for eid, version in zip(
+            reversed(self._changed_eclasses), reversed(self._change_versions)
+        ):
+            eid = eid.find()
+            if eid not in last:
+                last[eid] = version
+        # (in decreasing order of version)
+        eclassids = list(last)
+        eclassids.reverse()
+        self._changed_eclasses = eclassids
+        self._change_versions = array("q", [last[eid] for eid in eclassids])
+        self._change_log_limit = max(2 * len(eclassids), _MIN_CHANGE_LOG_LIMIT)
+
+    def changed_since(self, version: int) -> Set[EClassID]:
+        """
+        Canonical EClassIDs that were created or modified after the EGraph
+        was at `version`: e-classes that were merged, or that hold an enode
+        that was added or re-canonicalized (or whose analysis data changed).
+
+        :param version: a previous value of `self.version`
+        :returns: set of canonical EClassIDs
+        """
+        start = bisect_right(self._change_versions, version)
+        return set(eid.find() for eid in self._changed_eclasses[start:])
+
+    def ancestors(self, eclassids: Iterable[EClassID], depth: int) -> Set[EClassID]:
+        """
+        Canonical EClassIDs reachable from `eclassids` by following at most
+        `depth` uses (i.e., child-to-parent edges), including `eclassids`.
+        """
+        result = set(eid.find() for eid in eclassids)
+        frontier = result
+        for _ in range(depth):
+            parents = set()
+            for eid in frontier:
+                for parent in eid.uses.values():
+                    parent = parent.find()
+                    if parent not in result:
+                        parents.add(parent)
+            if not parents:
+                break
+            result |= parents
+            frontier = parents
+        return result
 
     def search(self, searcher: "EGraphSearcher") -> Sequence[EMatch]:
         return searcher.search(self)
@@ -445,36 +922,27 @@ class EGraph:
 
     def eclasses(self):
         """
-        Extract dictionary of (canonicalized) EClassIDs to ENodes
+        Dictionary of (canonicalized) EClassIDs to ENodes. The dictionary is
+        maintained incrementally and returned as-is, so callers must not
+        mutate it. E-nodes are only guaranteed to be canonical after `rebuild`.
         :returns: Dict[EClassID, List[ENode]]
         """
-        # Check for cached eclasses
-        if self._cached_eclasses[0] == self.version:
-            return self._cached_eclasses[1]
+        return self._eclasses
 
-        result = {}
-        for enode, eid in self.hashcons.items():
-            eid = eid.find()
-            if eid not in result:
-                result[eid] = [enode]
-            else:
-                result[eid].append(enode)
-
-        self._cached_eclasses = (self.version, result)
-        return result
+    def eclasses_with_key(self, key: Any) -> Set[EClassID]:
+        """
+        Return the canonical EClassIDs containing at least one enode with the
+        given key (or Symbol). The set is owned by the EGraph and must not be
+        mutated.
+        """
+        return self._eclasses_by_key.get(self.symbols.lookup(key), set())
 
-    def lookup_eclass(self, eclassid: EClassID):
+    def lookup_eclass(self, eclassid: EClassID) -> List[ENode]:
         """
         Return all enodes associated with an EClassID.
-        Warning: May be expensive, depending on egraph size. Results are cached
-        but must be recomputed every time the egraph is modified.
+        The list is owned by the (canonical) EClassID and must not be mutated.
         """
-        eclassid = eclassid.find()
-        result = []
-        for enode, eid in self.hashcons.items():
-            if eid.find() == eclassid:
-                result.append(enode)
-        return result
+        return eclassid.find().nodes
 
 
 class EGraphRewriter(ABC):
@@ -0,0 +1,356 @@
+from math import ceil, floor, inf
+from typing import Any, Callable, NamedTuple, Optional
+
+from quiche.egraph import EClassAnalysis, EClassID, EGraph, ENode, Subst
+
+# the largest shift count that is evaluated exactly; larger shifts of
+# non-zero values are bounded by an infinity
+MAX_SHIFT = 1024
+
+
+class Interval(NamedTuple):
+    """
+    Closed interval [lo, hi] of the values of an e-class (bounds may be
+    infinite). `integer` records that the values are ints (or bools), and
+    `maybe_bool` that they may be bools (e.g., `x & y`, but not `x + 0`).
+
+    Bounds are computed with the same (monotone) arithmetic as the program
+    itself, so they also hold for float results; NaN is not modelled. The
+    results of operations are those of the values for which they don't
+    raise: e.g., shifts and bitwise operations are of ints.
+    """
+
+    lo: Any
+    hi: Any
+    integer: bool = False
+    maybe_bool: bool = True
+
+    def is_nonzero(self) -> bool:
+        return self.lo > 0 or self.hi < 0
+
+    def is_nonnegative(self) -> bool:
+        return self.lo >= 0
+
+    def is_positive(self) -> bool:
+        return self.lo > 0
+
+    def is_nonnegative_integer(self) -> bool:
+        return self.integer and self.lo >= 0
+
+
+def _isinf(x) -> bool:
+    # unlike math.isinf, doesn't convert (possibly huge) ints to float
+    return x == inf or x == -inf
+
+
+TOP = Interval(-inf, inf)
+INTEGERS = Interval(-inf, inf, True)
+BOOLEANS = Interval(0, 1, True)
+
+
+def make_interval(lo, hi, integer: bool = False, maybe_bool: bool = True) -> Interval:
+    """
+    The interval [lo, hi]: unbounded if a bound is NaN, and with its bounds
+    rounded inwards to ints if `integer`.
+    """
+    # NaN bounds
+    if lo != lo:
+        lo = -inf
+    if hi != hi:
+        hi = inf
+    if integer:
+        if not _isinf(lo) and type(lo) is not int:
+            lo = ceil(lo)
+        if not _isinf(hi) and type(hi) is not int:
+            hi = floor(hi)
+    return Interval(lo, hi, integer, maybe_bool)
+
+
+def point(value) -> Interval:
+    """The interval of a literal: a single number, or TOP for other values."""
+    if type(value) is bool or type(value) is int:
+        return Interval(int(value), int(value), True, type(value) is bool)
+    if type(value) is float and value == value and not _isinf(value):
+        return Interval(value, value, False, False)
+    return TOP
+
+
+def intersect(i1: Interval, i2: Interval) -> Interval:
+    """
+    The intersection of two intervals of the same values.
+
+    :raises ValueError: if they are disjoint
+    """
+    if i1 == i2:
+        return i1
+    joined = make_interval(
+        max(i1.lo, i2.lo),
+        min(i1.hi, i2.hi),
+        i1.integer or i2.integer,
+        i1.maybe_bool and i2.maybe_bool,
+    )
+    if joined.lo > joined.hi:
+        raise ValueError(
+            "Interval analysis error: {} and {} are disjoint".format(i1, i2)
+        )
+    # return an argument that didn't change
+    if joined == i1:
+        return i1
+    if joined == i2:
+        return i2
+    return joined
+
+
+def _unbounded(integer: bool) -> Interval:
+    # all the ints (or numbers): arithmetic operations never return bools,
+    # e.g., `True + False` is 1
+    return Interval(-inf, inf, integer, False)
+
+
+def add(i1: Interval, i2: Interval) -> Interval:
+    return make_interval(
+        i1.lo + i2.lo, i1.hi + i2.hi, i1.integer and i2.integer, False
+    )
+
+
+def sub(i1: Interval, i2: Interval) -> Interval:
+    return make_interval(
+        i1.lo - i2.hi, i1.hi - i2.lo, i1.integer and i2.integer, False
+    )
+
+
+def pos(i: Interval) -> Interval:
+    return i._replace(maybe_bool=False)
+
+
+def neg(i: Interval) -> Interval:
+    return Interval(-i.hi, -i.lo, i.integer, False)
+
+
+def _overflow(x, y):
+    # the infinity of the sign of x * y
+    return inf if (x < 0) == (y < 0) else -inf
+
+
+def _times(x, y):
+    # zero times an unbounded value is zero
+    if x == 0 or y == 0:
+        return 0
+    try:
+        return x * y
+    except OverflowError:
+        return _overflow(x, y)
+
+
+def mul(i1: Interval, i2: Interval) -> Interval:
+    corners = [_times(x, y) for x in (i1.lo, i1.hi) for y in (i2.lo, i2.hi)]
+    return make_interval(min(corners), max(corners), i1.integer and i2.integer, False)
+
+
+def _quotient(x, y, floor_division: bool):
+    if _isinf(x):
+        return x if y > 0 else -x
+    if _isinf(y):
+        if floor_division and (x < 0) != (y < 0) and x != 0:
+            return -1
+        return 0
+    try:
+        return x // y if floor_division else x / y
+    except OverflowError:
+        return _overflow(x, y)
+
+
+def _divide(
+    i1: Interval, i2: Interval, floor_division: bool, integer: bool
+) -> Interval:
+    # a divisor that can be zero (or arbitrarily close to it) is unbounded
+    if i2.lo <= 0 <= i2.hi:
+        return _unbounded(integer)
+    corners = [
+        _quotient(x, y, floor_division)
+        for x in (i1.lo, i1.hi)
+        for y in (i2.lo, i2.hi)
+        # inf / inf is bounded by the neighbouring corners
+        if not (_isinf(x) and _isinf(y))
+    ]
+    return make_interval(min(corners), max(corners), integer, False)
+
+
+def truediv(i1: Interval, i2: Interval) -> Interval:
+    return _divide(i1, i2, False, False)
+
+
+def floordiv(i1: Interval, i2: Interval) -> Interval:
+    return _divide(i1, i2, True, i1.integer and i2.integer)
+
+
+def mod(i1: Interval, i2: Interval) -> Interval:
+    integer = i1.integer and i2.integer
+    # X % Y has the sign of Y, and |X % Y| < |Y|
+    if i2.lo > 0:
+        if i1.lo >= 0 and i1.hi < i2.lo:
+            return pos(i1)
+        hi = i2.hi - 1 if integer else i2.hi
+        if i1.lo >= 0:
+            hi = min(hi, i1.hi)
+        return make_interval(0, hi, integer, False)
+    if i2.hi < 0:
+        if i1.hi <= 0 and i1.lo > i2.hi:
+            return pos(i1)
+        lo = i2.lo + 1 if integer else i2.lo
+        if i1.hi <= 0:
+            lo = max(lo, i1.lo)
+        return make_interval(lo, 0, integer, False)
+    return _unbounded(integer)
+
+
+def _as_int(i: Interval) -> Optional[Interval]:
+    # the interval of the values of i for which a shift or bitwise
+    # operation doesn't raise (None if there are none)
+    i = make_interval(i.lo, i.hi, True, i.maybe_bool)
+    return i if i.lo <= i.hi else None
+
+
+def _lshift(x, n):
+    if x == 0 or _isinf(x):
+        return x
+    if _isinf(n) or n > MAX_SHIFT:
+        return inf if x > 0 else -inf
+    return x << n
+
+
+def _rshift(x, n):
+    if _isinf(x):
+        return x
+    if _isinf(n) or n > MAX_SHIFT:
+        return 0 if x >= 0 else -1
+    return x >> n
+
+
+def _shift(i1: Interval, i2: Interval, shift: Callable[[Any, Any], Any]) -> Interval:
+    i1, i2 = _as_int(i1), _as_int(i2)
+    # negative shift counts raise
+    if i1 is None or i2 is None or i2.hi < 0:
+        return _unbounded(True)
+    counts = (max(i2.lo, 0), i2.hi)
+    corners = [shift(x, n) for x in (i1.lo, i1.hi) for n in counts]
+    return make_interval(min(corners), max(corners), True, False)
+
+
+def lshift(i1: Interval, i2: Interval) -> Interval:
+    return _shift(i1, i2, _lshift)
+
+
+def rshift(i1: Interval, i2: Interval) -> Interval:
+    return _shift(i1, i2, _rshift)
+
+
+def invert(i: Interval) -> Interval:
+    i = _as_int(i)
+    if i is None:
+        return _unbounded(True)
+    return Interval(-i.hi - 1, -i.lo - 1, True, False)
+
+
+def bitand(i1: Interval, i2: Interval) -> Interval:
+    # (bools if both X and Y are)
+    maybe_bool = i1.maybe_bool and i2.maybe_bool
+    i1, i2 = _as_int(i1), _as_int(i2)
+    if i1 is None or i2 is None:
+        return Interval(-inf, inf, True, maybe_bool)
+    # X & Y is non-negative and at most Y if Y is non-negative
+    his = [i.hi for i in (i1, i2) if i.lo >= 0]
+    if not his:
+        return Interval(-inf, inf, True, maybe_bool)
+    return Interval(0, min(his), True, maybe_bool)
+
+
+def _ones(hi):
+    # the largest value with the bit length of hi
+    return hi if _isinf(hi) else (1 << hi.bit_length()) - 1
+
+
+def _bitor(i1: Interval, i2: Interval, xor: bool) -> Interval:
+    maybe_bool = i1.maybe_bool and i2.maybe_bool
+    i1, i2 = _as_int(i1), _as_int(i2)
+    # (only bounded for non-negative X and Y)
+    if i1 is None or i2 is None or i1.lo < 0 or i2.lo < 0:
+        return Interval(-inf, inf, True, maybe_bool)
+    lo = 0 if xor else max(i1.lo, i2.lo)
+    return Interval(lo, _ones(max(i1.hi, i2.hi)), True, maybe_bool)
+
+
+def bitor(i1: Interval, i2: Interval) -> Interval:
+    return _bitor(i1, i2, False)
+
+
+def bitxor(i1: Interval, i2: Interval) -> Interval:
+    return _bitor(i1, i2, True)
+
+
+class IntervalAnalysis(EClassAnalysis[Interval]):
+    """
+    Numeric bounds of the values of every e-class, joined by intersection
+    (all the e-nodes of an e-class have the same value, so each of their
+    intervals bounds it). Once the e-graph is rebuilt, questions such as
+    "is this e-class non-zero?" are answered in O(1), e.g., by the checkers
+    of `interval_condition`.
+
+    Subclasses implement `make` for their language, with the interval
+    arithmetic of this module.
+    """
+
+    def make(self, egraph: EGraph, n: ENode) -> Interval:
+        return TOP
+
+    def join(self, dval1: Interval, dval2: Interval) -> Interval:
+        return intersect(dval1, dval2)
+
+    def modify(self, egraph: EGraph, eclass: EClassID) -> EClassID:
+        return eclass
+
+    def is_nonzero(self, eclass: EClassID) -> bool:
+        return self.data(eclass).is_nonzero()
+
+    def is_nonnegative(self, eclass: EClassID) -> bool:
+        return self.data(eclass).is_nonnegative()
+
+
+def interval_analysis(egraph: EGraph) -> Optional[IntervalAnalysis]:
+    """
+    The IntervalAnalysis of `egraph` (which can be a component of a
+    ProductAnalysis), or None if it doesn't have one.
+    """
+    if egraph.analysis is None:
+        return None
+    return egraph.analysis.component(IntervalAnalysis)
+
+
+def interval_condition(
+    predicate: Callable[..., bool], *variables: str
+) -> Callable[[EGraph, EClassID, Subst], bool]:
+    """
+    Make a `ConditionalRule` checker that holds if `predicate` holds for the
+    intervals of the e-classes bound to `variables`, e.g.,
+    `interval_condition(Interval.is_nonzero, "x")`. It never holds if the
+    e-graph doesn't have an IntervalAnalysis.
+
+    :param predicate: function of one Interval per variable
+    :param variables: pattern variables (for AST patterns, the name of the
+        variable, e.g., "__quiche__x")
+    :returns: checker (EGraph, EClassID, Subst) -> bool
+    """
+
+    def checker(egraph: EGraph, eid: EClassID, env: Subst) -> bool:
+        analysis = interval_analysis(egraph)
+        if analysis is None:
+            return False
+        intervals = []
+        for variable in variables:
+            eclass = env.get(variable)
+            if eclass is None:
+                eclass = egraph.env_lookup(env, variable)
+            intervals.append(analysis.data(eclass))
+        return predicate(*intervals)
+
+    return checker
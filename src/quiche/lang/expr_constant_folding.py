@@ -5,7 +5,7 @@ from quiche.lang.expr_lang import ExprNode, ExprTree
 
 
 class ExprConstantFolding(EClassAnalysis[Optional[int]]):
-    binops: List[str] = ["+", "-", "*", "/", "<<"]
+    binops: List[str] = ["+", "-", "*", "/", "<<", ">>"]
 
     def make(self, egraph: "EGraph", enode: ENode) -> Optional[int]:
         """
@@ -14,25 +14,26 @@ class ExprConstantFolding(EClassAnalysis[Optional[int]]):
         :param n: enode
         :returns: dval value in the domain
         """
+        key = enode.key.value
         # return number if we have an int
-        if type(enode.key) == int:
-            return enode.key
+        if type(key) == int:
+            return key
         # if we have a supported operator and numeric operands,
         # perform the operation
-        elif enode.key in self.binops:
-            operands = [enode.args[0].data, enode.args[1].data]
+        elif key in self.binops:
+            operands = [self.data(enode.args[0]), self.data(enode.args[1])]
             if all(operands):
-                if enode.key == "+":
+                if key == "+":
                     return operands[0] + operands[1]
-                elif enode.key == "-":
+                elif key == "-":
                     return operands[0] - operands[1]
-                elif enode.key == "*":
+                elif key == "*":
                     return operands[0] * operands[1]
-                elif enode.key == "/" and operands[1] != 0:
+                elif key == "/" and operands[1] != 0:
                     return operands[0] // operands[1]
-                elif enode.key == "<<" and operands[1] >= 0:
+                elif key == "<<" and operands[1] >= 0:
                     return operands[0] << operands[1]
-                elif enode.key == ">>" and operands[1] >= 0:
+                elif key == ">>" and operands[1] >= 0:
                     return operands[0] >> operands[1]
         return None
 
@@ -55,8 +56,9 @@ class ExprConstantFolding(EClassAnalysis[Optional[int]]):
         changes.
         :returns: modified eclass
         """
-        if eclass.data is not None:
-            new_node = ExprNode(eclass.data, ())
+        data = self.data(eclass)
+        if data is not None:
+            new_node = ExprNode(data, ())
             ecid = egraph.add(ExprTree(new_node))
             egraph.merge(eclass, ecid)
         return eclass.find()
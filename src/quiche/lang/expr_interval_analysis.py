@@ -0,0 +1,32 @@
+from typing import Callable, Dict
+
+from quiche import interval
+from quiche.egraph import EGraph, ENode
+from quiche.interval import Interval, IntervalAnalysis
+
+
+class ExprIntervalAnalysis(IntervalAnalysis):
+    # values are ints, and "/" is floor division (as in ExprConstantFolding)
+    binops: Dict[str, Callable[[Interval, Interval], Interval]] = {
+        "+": interval.add,
+        "-": interval.sub,
+        "*": interval.mul,
+        "/": interval.floordiv,
+        "<<": interval.lshift,
+        ">>": interval.rshift,
+    }
+
+    def make(self, egraph: EGraph, enode: ENode) -> Interval:
+        """
+        Create a new analysis value in the domain.
+
+        :param n: enode
+        :returns: dval value in the domain
+        """
+        key = enode.key.value
+        if type(key) == int:
+            return interval.point(key)
+        elif key in self.binops and len(enode.args) == 2:
+            return self.binops[key](self.data(enode.args[0]), self.data(enode.args[1]))
+        # variables
+        return interval.INTEGERS
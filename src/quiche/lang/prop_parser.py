@@ -54,7 +54,7 @@ class PropTreeCost(CostModel):
         """
         Calculate the cost of a node based solely on its key (not its children)
         """
-        return self.prop_costs.get(node.key, 0)
+        return self.prop_costs.get(node.key.value, 0)
 
     def enode_cost_rec(
         self, enode: ENode, costs: Dict[EClassID, Tuple[int, ENode]]
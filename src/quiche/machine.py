@@ -0,0 +1,217 @@
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from .egraph import EClassID, EGraph, EMatch, ENode, SlotSubst, Subst
+from .quiche_tree import QuicheTree
+from .symbol_table import LinkedKeys
+
+# opcodes
+BIND = 0
+COMPARE = 1
+
+
+class Instruction(NamedTuple):
+    """
+    A single e-matching instruction.
+
+    BIND: for each enode in the e-class in register `reg` whose key is `key`
+        (interned in the e-graph's symbol table when the program is run)
+        and which has `arity` children, write the children to registers
+        `out`, ..., `out + arity - 1` and continue.
+    COMPARE: continue only if registers `reg` and `out` hold the same e-class.
+    """
+
+    opcode: int
+    reg: int
+    key: Any = None
+    arity: int = 0
+    out: int = 0
+
+
+class Program:
+    """
+    A pattern compiled to a flat list of instructions for an e-matching
+    abstract machine (as in egg): a match is found by running the
+    instructions in order, backtracking into the most recent BIND whenever an
+    instruction fails or the end of the program is reached (which yields a
+    match).
+
+    Register 0 holds the e-class being matched. BIND instructions are emitted
+    in pre-order, visiting children right-to-left: this makes the machine
+    enumerate matches in exactly the same order as `EGraph.ematch`.
+    """
+
+    def __init__(self, pattern: QuicheTree):
+        self.pattern = pattern
+        self.instructions: List[Instruction] = []
+        # (pattern symbol, register) pairs, in left-to-right pattern order
+        self.variables: List[Tuple[Any, int]] = []
+        # slot of each pattern symbol in the substitutions (see `SlotSubst`)
+        self.slots: Dict[Any, int] = {}
+        self.num_registers = 1
+        # length of the longest root-to-leaf path of the pattern
+        self.depth = 0
+        # key of the pattern's root, or None if the root is a pattern symbol
+        self.root_key: Optional[Any] = None
+        if not pattern.is_pattern_symbol():
+            self.root_key = pattern.value()
+        self._compile()
+        # the key of each instruction (None for a COMPARE), as symbols of the
+        # e-graph the program runs on
+        self._keys = LinkedKeys(instruction.key for instruction in self.instructions)
+
+    def __repr__(self):
+        return "Program({})".format(self.pattern)
+
+    def _compile(self):
+        bound: Dict[Any, int] = {}
+        todo = [(self.pattern, 0, 0)]
+        while todo:
+            node, reg, depth = todo.pop()
+            self.depth = max(self.depth, depth)
+            if node.is_pattern_symbol():
+                var = node.value()
+                if var in bound:
+                    self.instructions.append(Instruction(COMPARE, bound[var], out=reg))
+                else:
+                    bound[var] = reg
+                continue
+            children = node.children()
+            out = self.num_registers
+            self.num_registers += len(children)
+            self.instructions.append(
+                Instruction(BIND, reg, node.value(), len(children), out)
+            )
+            # pushed left-to-right, so the rightmost child is compiled next
+            todo.extend((child, out + i, depth + 1) for i, child in enumerate(children))
+
+        # order the substitution by first (left-to-right) occurrence
+        todo = [self.pattern]
+        while todo:
+            node = todo.pop()
+            if node.is_pattern_symbol():
+                var = node.value()
+                if var not in self.slots:
+                    self.slots[var] = len(self.variables)
+                    self.variables.append((var, bound[var]))
+            else:
+                todo.extend(reversed(node.children()))
+        self._slot_registers = tuple(reg for _, reg in self.variables)
+
+    def run(
+        self,
+        egraph: EGraph,
+        eclasses: Dict[EClassID, List[ENode]],
+        eid: EClassID,
+        dirty: Set[EClassID] = None,
+    ) -> Iterator[Subst]:
+        """
+        Run the program on the e-class `eid`.
+
+        :param egraph: e-graph of `eid`
+        :param eclasses: mapping from canonical e-class IDs to their e-nodes
+        :param eid: e-class to match the root of the pattern against
+        :param dirty: if given, only yield matches that visit at least one of
+            these canonical e-classes
+        :returns: iterator over the matching substitutions
+        """
+        instructions = self.instructions
+        keys = self._keys.symbols(egraph.symbols)
+        end = len(instructions)
+        slots, slot_registers = self.slots, self._slot_registers
+        regs: List[Optional[EClassID]] = [None] * self.num_registers
+        regs[0] = eid
+        # stack of (pc, iterator over e-nodes) for the pending BINDs
+        stack: List[Tuple[int, Iterator[ENode]]] = []
+        pc = 0
+        while True:
+            if pc == end:
+                if dirty is None or any(r.find() in dirty for r in regs):
+                    yield SlotSubst(slots, tuple([regs[reg] for reg in slot_registers]))
+            else:
+                opcode, reg, _, _, out = instructions[pc]
+                if opcode == BIND:
+                    stack.append((pc, iter(eclasses[regs[reg].find()])))
+                elif regs[reg] is regs[out]:
+                    pc += 1
+                    continue
+            # backtrack: resume the most recent BIND with its next e-node
+            while stack:
+                pc, enodes = stack[-1]
+                _, _, _, arity, out = instructions[pc]
+                key = keys[pc]
+                for enode in enodes:
+                    if enode.key is key and len(enode.args) == arity:
+                        regs[out:out + arity] = enode.args
+                        break
+                else:
+                    stack.pop()
+                    continue
+                pc += 1
+                break
+            else:
+                return
+
+    def search(
+        self,
+        egraph: EGraph,
+        eclasses: Dict[EClassID, List[ENode]] = None,
+        dirty: Set[EClassID] = None,
+    ) -> List[EMatch]:
+        """
+        Match the program against e-classes of the e-graph. Equivalent to
+        `egraph.ematch(self.pattern, eclasses)`.
+
+        With `dirty` (e.g., `egraph.changed_since(version)`), only the matches
+        that visit at least one dirty e-class are returned: these are all the
+        matches that are new since `version`. Only the ancestors of the dirty
+        e-classes, up to the depth of the pattern, are tried as roots.
+
+        :param egraph: e-graph to search
+        :param eclasses: mapping from e-class IDs to their e-nodes (defaults to
+            all canonical e-classes of `egraph`)
+        :param dirty: canonical e-classes a match must visit (defaults to no
+            restriction)
+        :returns: list of (e-class ID, substitution) matches
+        """
+        if eclasses is None:
+            eclasses = egraph.eclasses()
+        roots = None
+        if dirty is not None:
+            roots = egraph.ancestors(dirty, self.depth)
+        matches: List[EMatch] = []
+        for eid in egraph._ematch_candidates(self.root_key, eclasses, roots):
+            matches.extend(
+                (eid, env) for env in self.run(egraph, eclasses, eid, dirty)
+            )
+        return matches
+
+    def iter_search(
+        self,
+        egraph: EGraph,
+        eclasses: Dict[EClassID, List[ENode]] = None,
+        dirty: Set[EClassID] = None,
+    ) -> Iterator[EMatch]:
+        """
+        Lazy version of `search`: yields the matches as they are found, so
+        that a consumer that stops early doesn't pay for the rest of the
+        search. The e-graph must not be modified before the iterator is
+        exhausted or discarded.
+        """
+        if eclasses is None:
+            eclasses = egraph.eclasses()
+        roots = None
+        if dirty is not None:
+            roots = egraph.ancestors(dirty, self.depth)
+        for eid in egraph._ematch_candidates(self.root_key, eclasses, roots):
+            for env in self.run(egraph, eclasses, eid, dirty):
+                yield eid, env
+
+
+def compile_pattern(pattern: QuicheTree) -> Program:
+    """
+    Compile a pattern to a `Program` for the e-matching machine.
+
+    :param pattern: QuicheTree pattern
+    :returns: compiled Program
+    """
+    return Program(pattern)
@@ -0,0 +1,125 @@
+import gc
+import multiprocessing
+import os
+from array import array
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+from quiche.egraph import EGraph, EMatch, SlotSubst
+from quiche.scheduler import RuleScheduler, SearchRequest
+
+if TYPE_CHECKING:
+    from quiche.rewrite import Rule
+
+# (egraph, tasks, matcher) of the running parallel search: set before the
+# workers are forked, so that they share the e-graph (copy-on-write)
+# instead of receiving a pickled copy of it
+_snapshot: Optional[Tuple[EGraph, List[Tuple["Rule", SearchRequest]], Optional[str]]] = None
+
+
+def can_fork() -> bool:
+    """True if worker processes can be forked on this platform."""
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def _pack(matches: Sequence[EMatch]) -> array:
+    """
+    Flatten matches to an array of e-class ids: for each match, the root's
+    id followed by the ids of its bindings, in slot order.
+    """
+    ids = array("q")
+    for eid, env in matches:
+        ids.append(eid.id)
+        ids.extend([binding.id for binding in env.bindings])
+    return ids
+
+
+def _unpack(egraph: EGraph, rule: "Rule", matcher: Optional[str], ids: array) -> List[EMatch]:
+    eclass_ids = egraph._eclass_ids
+    slots = rule.searcher(matcher).slots
+    width = len(slots) + 1
+    return [
+        (
+            eclass_ids[ids[i]],
+            SlotSubst(slots, tuple([eclass_ids[j] for j in ids[i + 1:i + width]])),
+        )
+        for i in range(0, len(ids), width)
+    ]
+
+
+def _search_task(index: int) -> Tuple[int, array]:
+    egraph, tasks, matcher = _snapshot
+    rule, request = tasks[index]
+    return index, _pack(request.run(egraph, rule, matcher))
+
+
+def search_rules(
+    rules: Sequence["Rule"],
+    egraph: EGraph,
+    scheduler: RuleScheduler,
+    matcher: str = None,
+    workers: int = None,
+) -> List[Tuple["Rule", Sequence[EMatch]]]:
+    """
+    Search phase of `Rule.apply_rules`, with the searches of the rules run
+    by a pool of `workers` processes.
+
+    The workers are forked from this process, so they see a read-only,
+    copy-on-write snapshot of the e-graph, and each runs the searches of a
+    subset of the rules. The matches are sent back as flat arrays of
+    e-class ids, and the scheduler's decisions (`accept_matches`) are made
+    here, in rule order: the result is the same as a sequential search.
+
+    Falls back to a sequential search if processes can't be forked, or if
+    `scheduler` overrides `search_rule`.
+
+    :param workers: number of worker processes (defaults to the number of
+        CPUs)
+    :returns: list of (rule, matches) pairs
+    """
+    global _snapshot
+    iteration = scheduler.iteration
+    if (
+        not can_fork()
+        or type(scheduler).search_rule is not RuleScheduler.search_rule
+    ):
+        return [
+            (rule, scheduler.search_rule(iteration, egraph, rule, matcher))
+            for rule in rules
+        ]
+
+    requests = [scheduler.search_request(iteration, egraph, rule) for rule in rules]
+    tasks = [
+        (rule, request) for rule, request in zip(rules, requests) if request is not None
+    ]
+    for rule, _ in tasks:
+        # compile the patterns once, before forking
+        rule.searcher(matcher)
+
+    results: List[Optional[List[EMatch]]] = [None] * len(tasks)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    _snapshot = (egraph, tasks, matcher)
+    # keep the garbage collector from touching (and so copying) the pages of
+    # the e-graph in the workers
+    gc.freeze()
+    try:
+        context = multiprocessing.get_context("fork")
+        with context.Pool(min(workers, len(tasks)) or 1) as pool:
+            for index, ids in pool.imap_unordered(_search_task, range(len(tasks))):
+                rule, _ = tasks[index]
+                results[index] = _unpack(egraph, rule, matcher, ids)
+    finally:
+        gc.unfreeze()
+        _snapshot = None
+
+    matches: List[Tuple["Rule", Sequence[EMatch]]] = []
+    found = iter(results)
+    for rule, request in zip(rules, requests):
+        if request is None:
+            matches.append((rule, []))
+        else:
+            rule_matches = next(found)
+            matches.append(
+                (rule, scheduler.accept_matches(iteration, egraph, rule, request, rule_matches))
+            )
+    return matches
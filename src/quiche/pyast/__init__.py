@@ -2,3 +2,4 @@ from .ast_quiche_tree import ASTQuicheTree
 from .ast_constant_folding import ASTConstantFolding
 from .ast_size_cost_model import ASTSizeCostModel
 from .ast_heuristic_cost_model import ASTHeuristicCostModel
+from .ast_interval_analysis import ASTIntervalAnalysis
@@ -1,60 +1,235 @@
-from typing import Optional, List
-from ast import operator, Num, Constant, BinOp, Add, Sub, Mult, Div
+import operator as op
+from math import copysign, isfinite
+from typing import Any, Callable, Dict, List, Optional, Union
+from ast import (
+    Add,
+    And,
+    BinOp,
+    BitAnd,
+    BitOr,
+    BitXor,
+    BoolOp,
+    Compare,
+    Constant,
+    Div,
+    Eq,
+    FloorDiv,
+    Gt,
+    GtE,
+    Invert,
+    LShift,
+    Lt,
+    LtE,
+    Mod,
+    Mult,
+    NameConstant,
+    Not,
+    NotEq,
+    Num,
+    Or,
+    Pow,
+    RShift,
+    Sub,
+    UAdd,
+    UnaryOp,
+    USub,
+)
 
 from quiche.pyast.ast_quiche_tree import ASTQuicheTree
 from quiche.egraph import ENode, EClassID, EGraph, EClassAnalysis
 from quiche.pyast.pal.pal_block import PALLeaf
 
+# folded values (None: unknown)
+Value = Optional[Union[bool, int, float]]
 
-class ASTConstantFolding(EClassAnalysis[Optional[int]]):
-    binops: List[operator] = [Add, Sub, Mult, Div]
 
-    def lookup_binop(self, egraph: EGraph, eclass: EClassID) -> Optional[operator]:
+class ASTConstantFolding(EClassAnalysis[Value]):
+    """
+    Constant folding of Python expressions on bool, int and float constants,
+    with Python's semantics (e.g., `4 / 4` is `1.0`, `True + 1` is `2`, and
+    `0 and x` is `0`). Operations that raise, and results that can't be
+    written as a literal (complex numbers, infinities, NaN, and -0.0, whose
+    literal would be the same e-node as that of 0.0) aren't folded,
+    nor are ints with more than `max_int_bits` bits from `*`, `**` and `<<`
+    (as in CPython's AST optimizer).
+
+    Once an e-class is known to be a constant, `modify` adds the literal
+    (`-X` for a negative value) to it and prunes its other (non-leaf) e-nodes.
+    """
+
+    binops: Dict[type, Callable[[Any, Any], Any]] = {
+        Add: op.add,
+        Sub: op.sub,
+        Mult: op.mul,
+        Div: op.truediv,
+        FloorDiv: op.floordiv,
+        Mod: op.mod,
+        Pow: op.pow,
+        LShift: op.lshift,
+        RShift: op.rshift,
+        BitOr: op.or_,
+        BitXor: op.xor,
+        BitAnd: op.and_,
+    }
+    unaryops: Dict[type, Callable[[Any], Any]] = {
+        UAdd: op.pos,
+        USub: op.neg,
+        Invert: op.invert,
+        Not: op.not_,
+    }
+    cmpops: Dict[type, Callable[[Any, Any], bool]] = {
+        Eq: op.eq,
+        NotEq: op.ne,
+        Lt: op.lt,
+        LtE: op.le,
+        Gt: op.gt,
+        GtE: op.ge,
+    }
+    max_int_bits: int = 128
+
+    @staticmethod
+    def lookup_op(egraph: EGraph, eclass: EClassID, ops: Dict[type, Callable]):
         eclass_nodes = egraph.lookup_eclass(eclass)
         # We really shouldn't have more than one unless we somehow stated
         # that + and - are the same...
         if len(eclass_nodes) == 1:
             enode = eclass_nodes[0]
-            if enode.key in ASTConstantFolding.binops:
-                return enode.key
+            if enode.key.value in ops:
+                return enode.key.value
         return None
 
-    def make(self, egraph: EGraph, enode: ENode) -> Optional[int]:
-        # return number if we have an int
-        if type(enode.key) == tuple and enode.key[0] == "int":
-            return enode.key[2]
-        # if we have a BinOp and a foldable op, check to see if we have ints to fold
-        elif enode.key == BinOp:
+    def lookup_binop(self, egraph: EGraph, eclass: EClassID) -> Optional[type]:
+        return self.lookup_op(egraph, eclass, self.binops)
+
+    @staticmethod
+    def lookup_block(egraph: EGraph, eclass: EClassID) -> Optional[List[EClassID]]:
+        """The elements of a block (e.g., the ExprBlock of a BoolOp)."""
+        for enode in egraph.lookup_eclass(eclass):
+            if not isinstance(enode.key.value, tuple):
+                return list(enode.args)
+        return None
+
+    def fits(self, binop: type, left: Value, right: Value) -> bool:
+        """Whether an int result of `binop` has at most `max_int_bits` bits."""
+        if not (isinstance(left, int) and isinstance(right, int)):
+            return True
+        if binop == Mult:
+            return left.bit_length() + right.bit_length() <= self.max_int_bits
+        elif binop == Pow:
+            return right <= 0 or left.bit_length() * right <= self.max_int_bits
+        elif binop == LShift:
+            return right <= self.max_int_bits - left.bit_length()
+        return True
+
+    @staticmethod
+    def is_literal(value: Any) -> bool:
+        if type(value) is float:
+            return isfinite(value) and (value != 0 or copysign(1.0, value) > 0)
+        return type(value) is int or type(value) is bool
+
+    def evaluate(self, egraph: EGraph, enode: ENode) -> Value:
+        key = enode.key.value
+        if key == BinOp:
             binop = self.lookup_binop(egraph, enode.args[1])
-            operands = [enode.args[0].data, enode.args[2].data]
-            if binop is not None and all(operands):
-                if binop == Add:
-                    return operands[0] + operands[1]
-                elif binop == Sub:
-                    return operands[0] - operands[1]
-                elif binop == Mult:
-                    return operands[0] * operands[1]
-                elif binop == Div:
-                    return operands[0] / operands[1]
+            left, right = self.data(enode.args[0]), self.data(enode.args[2])
+            if binop is not None and left is not None and right is not None:
+                if self.fits(binop, left, right):
+                    return self.binops[binop](left, right)
+        elif key == UnaryOp:
+            unaryop = self.lookup_op(egraph, enode.args[0], self.unaryops)
+            operand = self.data(enode.args[1])
+            if unaryop is not None and operand is not None:
+                return self.unaryops[unaryop](operand)
+        elif key == BoolOp:
+            boolop = self.lookup_op(egraph, enode.args[0], {And: None, Or: None})
+            values = self.lookup_block(egraph, enode.args[1])
+            if boolop is not None and values:
+                # the first value that decides the result, if it's known
+                # up to that value
+                for eclass in values:
+                    value = self.data(eclass)
+                    if value is None or (not value if boolop == And else value):
+                        return value
+                return value
+        elif key == Compare:
+            cmpops = self.lookup_block(egraph, enode.args[1])
+            comparators = self.lookup_block(egraph, enode.args[2])
+            if cmpops is None or comparators is None:
+                return None
+            left = self.data(enode.args[0])
+            # a < b < c is a < b and b < c
+            for cmpop, eclass in zip(cmpops, comparators):
+                cmpop = self.lookup_op(egraph, cmpop, self.cmpops)
+                right = self.data(eclass)
+                if cmpop is None or left is None or right is None:
+                    return None
+                if not self.cmpops[cmpop](left, right):
+                    return False
+                left = right
+            return True
         return None
 
-    def join(self, n1: Optional[int], n2: Optional[int]) -> Optional[int]:
+    def make(self, egraph: EGraph, enode: ENode) -> Value:
+        key = enode.key.value
+        # return the value of a literal
+        if type(key) == tuple and key[0] in ("int", "float", "bool"):
+            return key[2]
+        try:
+            value = self.evaluate(egraph, enode)
+        except (ArithmeticError, TypeError, ValueError):
+            return None
+        return value if self.is_literal(value) else None
+
+    def join(self, n1: Value, n2: Value) -> Value:
         if n1 is None:
             return n2
         if n2 is None:
             return n1
+        # (equal values of different types, e.g., 1 and 1.0, are kept as n1)
         if n1 != n2:
             raise ValueError("Constant folding error: {} != {}".format(n1, n2))
         return n1
 
+    @staticmethod
+    def add_literal(egraph: EGraph, value: Union[bool, int, float]) -> EClassID:
+        """Add the (non-negative) literal `value` to `egraph`."""
+        from sys import version_info
+
+        kind = type(value).__name__
+        if version_info[:2] <= (3, 7):
+            constr = NameConstant if kind == "bool" else Num
+            new_node = PALLeaf(kind, constr, value)
+        else:
+            new_node = PALLeaf(kind, Constant, value, None)
+        return egraph.add(ASTQuicheTree(root=new_node))
+
     def modify(self, egraph: EGraph, eclass: EClassID) -> EClassID:
-        if eclass.data is not None:
-            from sys import version_info
+        data = self.data(eclass)
+        if data is not None:
+            if data < 0:
+                # -X rather than a negative literal, which the AST emitter
+                # would print without parentheses (e.g., as the base of **)
+                usub = egraph.add_enode(ENode(USub, ()))
+                operand = self.add_literal(egraph, -data)
+                ecid = egraph.add_enode(ENode(UnaryOp, (usub, operand)))
+
+                def keep(enode: ENode) -> bool:
+                    if not enode.args:
+                        return True
+                    args = tuple(arg.find() for arg in enode.args)
+                    return enode.key.value is UnaryOp and args == (
+                        usub.find(),
+                        operand.find(),
+                    )
 
-            if version_info[:2] <= (3, 7):
-                new_node = PALLeaf("int", Num, eclass.data)
             else:
-                new_node = PALLeaf("int", Constant, eclass.data, None)
-            ecid = egraph.add(ASTQuicheTree(root=new_node))
+                ecid = self.add_literal(egraph, data)
+
+                def keep(enode: ENode) -> bool:
+                    return not enode.args
+
             egraph.merge(eclass, ecid)
+            # the literal (or its negation, and any other leaf) is all
+            # that's left to match
+            egraph.prune(eclass, keep)
         return eclass
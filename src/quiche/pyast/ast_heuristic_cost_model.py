@@ -1,7 +1,8 @@
-from typing import Dict, Tuple
+from typing import Any, Dict, Tuple
 
 from quiche.analysis import CostModel
 from quiche.egraph import ENode, EClassID
+from quiche.symbol_table import Symbol
 
 
 class ASTHeuristicCostModel(CostModel):
@@ -119,21 +120,33 @@ class ASTHeuristicCostModel(CostModel):
         }
         if node_weights:
             self.node_weights.update(node_weights)
+        # cost of each ENode key, by Symbol (computed from `node_weights` on
+        # first use)
+        self._costs: Dict[Symbol, int] = {}
 
     def enode_cost(self, node: ENode) -> int:
         """
         Calculate the cost of a node based solely on its key (not its children)
         """
-        key = node.key
-        if hasattr(node.key, "__name__"):
-            key = node.key.__name__
-        elif isinstance(node.key, tuple):
-            key = node.key[0]
+        cost = self._costs.get(node.key)
+        if cost is None:
+            cost = self._costs[node.key] = self.key_cost(node.key.value)
+        return cost
 
-        if key in self.node_weights:
+    def key_cost(self, key: Any) -> int:
+        """
+        Calculate the cost of an (uninterned) ENode key
+        """
+        name = key
+        if hasattr(key, "__name__"):
+            name = key.__name__
+        elif isinstance(key, tuple):
+            name = key[0]
+
+        if name in self.node_weights:
+            return self.node_weights[name]
+        elif key in self.node_weights:
             return self.node_weights[key]
-        elif node.key in self.node_weights:
-            return self.node_weights[node.key]
         return 1
 
     def enode_cost_rec(
@@ -0,0 +1,77 @@
+from typing import Callable, Dict, Optional
+from ast import (
+    Add,
+    BinOp,
+    BitAnd,
+    BitOr,
+    BitXor,
+    Div,
+    FloorDiv,
+    Invert,
+    LShift,
+    Mod,
+    Mult,
+    Not,
+    RShift,
+    Sub,
+    UAdd,
+    UnaryOp,
+    USub,
+)
+
+from quiche import interval
+from quiche.egraph import ENode, EClassID, EGraph
+from quiche.interval import Interval, IntervalAnalysis
+
+
+class ASTIntervalAnalysis(IntervalAnalysis):
+    """
+    Interval analysis of Python expressions. Like the arithmetic rewrites,
+    it assumes that values are numbers (bools, ints or floats): e.g., the
+    values of `x & 7` are the ints from 0 to 7, whatever `x` is.
+    """
+
+    binops: Dict[type, Callable[[Interval, Interval], Interval]] = {
+        Add: interval.add,
+        Sub: interval.sub,
+        Mult: interval.mul,
+        Div: interval.truediv,
+        FloorDiv: interval.floordiv,
+        Mod: interval.mod,
+        LShift: interval.lshift,
+        RShift: interval.rshift,
+        BitAnd: interval.bitand,
+        BitOr: interval.bitor,
+        BitXor: interval.bitxor,
+    }
+    unaryops: Dict[type, Callable[[Interval], Interval]] = {
+        USub: interval.neg,
+        UAdd: interval.pos,
+        Invert: interval.invert,
+        Not: lambda i: interval.BOOLEANS,
+    }
+
+    @staticmethod
+    def lookup_op(
+        egraph: EGraph, eclass: EClassID, ops: Dict[type, Callable]
+    ) -> Optional[Callable]:
+        for enode in egraph.lookup_eclass(eclass):
+            op = ops.get(enode.key.value)
+            if op is not None:
+                return op
+        return None
+
+    def make(self, egraph: EGraph, enode: ENode) -> Interval:
+        key = enode.key.value
+        # numeric literals (PALLeaf kind, constructor, value, ...)
+        if type(key) == tuple and key[0] in ("int", "float", "bool"):
+            return interval.point(key[2])
+        elif key == BinOp:
+            binop = self.lookup_op(egraph, enode.args[1], self.binops)
+            if binop is not None:
+                return binop(self.data(enode.args[0]), self.data(enode.args[2]))
+        elif key == UnaryOp:
+            unaryop = self.lookup_op(egraph, enode.args[0], self.unaryops)
+            if unaryop is not None:
+                return unaryop(self.data(enode.args[1]))
+        return interval.TOP
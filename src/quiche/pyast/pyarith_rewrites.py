@@ -1,5 +1,6 @@
 from ast import Constant, Num
 
+from quiche.interval import interval_analysis
 from quiche.pyast import ASTQuicheTree
 
 # X * 0 = 0
@@ -8,17 +9,26 @@ mul_zero_rule = ASTQuicheTree.make_rule("__quiche__x * 0", "0")
 # X / 1 = X
 div_one_rule = ASTQuicheTree.make_rule("__quiche__x / 1", "__quiche__x")
 
-# X / X = 1
-div_self_rule = ASTQuicheTree.make_conditional_rule(
-    "__quiche__x / __quiche__x",
-    "1",
-    lambda eg, eid, env: not any(
+
+def _nonzero_divisor(eg, eid, env) -> bool:
+    x = eg.env_lookup(env, "__quiche__x")
+    # with an interval analysis, X must be provably non-zero (in O(1))
+    intervals = interval_analysis(eg)
+    if intervals is not None:
+        return intervals.is_nonzero(x)
+    # otherwise, X must not be a literal zero
+    return not any(
         [
             (not enode.args)
-            and enode.key in [("int", Constant, 0, None), ("int", Num, 0)]
-            for enode in eg.lookup_eclass(eg.env_lookup(env, "__quiche__x"))
+            and enode.key.value in [("int", Constant, 0, None), ("int", Num, 0)]
+            for enode in eg.lookup_eclass(x)
         ]
-    ),
+    )
+
+
+# X / X = 1
+div_self_rule = ASTQuicheTree.make_conditional_rule(
+    "__quiche__x / __quiche__x", "1", _nonzero_divisor
 )
 
 # X * 1 = X
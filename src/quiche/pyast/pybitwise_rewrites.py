@@ -1,3 +1,4 @@
+from quiche.interval import interval_condition, rshift
 from quiche.pyast import ASTQuicheTree
 
 # X xor 0 = X
@@ -18,6 +19,71 @@ xor_associativity_rules = ASTQuicheTree.make_invertible_rules(
     "(__quiche__x ^ __quiche__y) ^ __quiche__z"
 )
 
+# The following rules need facts about the values of X, Y, Z, which are
+# read from an IntervalAnalysis of the e-graph (e.g., ASTIntervalAnalysis);
+# without one, they never apply.
+
+# X // 2 = X >> 1, for int X (Python rounds both towards -inf)
+floordiv_two_rule = ASTQuicheTree.make_conditional_rule(
+    "__quiche__x // 2",
+    "__quiche__x >> 1",
+    interval_condition(lambda x: x.integer, "__quiche__x"),
+)
+
+# X % 2 = X & 1, for int X
+mod_two_rule = ASTQuicheTree.make_conditional_rule(
+    "__quiche__x % 2",
+    "__quiche__x & 1",
+    interval_condition(lambda x: x.integer, "__quiche__x"),
+)
+
+# (X << Y) << Z = X << (Y + Z), for non-negative int Y and Z
+lshift_combine_rule = ASTQuicheTree.make_conditional_rule(
+    "(__quiche__x << __quiche__y) << __quiche__z",
+    "__quiche__x << (__quiche__y + __quiche__z)",
+    interval_condition(
+        lambda y, z: y.is_nonnegative_integer() and z.is_nonnegative_integer(),
+        "__quiche__y",
+        "__quiche__z",
+    ),
+)
+
+# (X >> Y) >> Z = X >> (Y + Z), for non-negative int Y and Z
+rshift_combine_rule = ASTQuicheTree.make_conditional_rule(
+    "(__quiche__x >> __quiche__y) >> __quiche__z",
+    "__quiche__x >> (__quiche__y + __quiche__z)",
+    interval_condition(
+        lambda y, z: y.is_nonnegative_integer() and z.is_nonnegative_integer(),
+        "__quiche__y",
+        "__quiche__z",
+    ),
+)
+
+# X >> Y = 0, for int X and Y with 0 <= X < 2 ** Y
+rshift_zero_rule = ASTQuicheTree.make_conditional_rule(
+    "__quiche__x >> __quiche__y",
+    "0",
+    interval_condition(
+        lambda x, y: x.is_nonnegative_integer()
+        and y.is_nonnegative_integer()
+        and rshift(x, y)[:2] == (0, 0),
+        "__quiche__x",
+        "__quiche__y",
+    ),
+)
+
+# X % Y = X, for 0 <= X < Y, X not a bool and int Y (which keep the type
+# of X: `True % 3` is 1)
+mod_small_rule = ASTQuicheTree.make_conditional_rule(
+    "__quiche__x % __quiche__y",
+    "__quiche__x",
+    interval_condition(
+        lambda x, y: x.lo >= 0 and x.hi < y.lo and not x.maybe_bool and y.integer,
+        "__quiche__x",
+        "__quiche__y",
+    ),
+)
+
 # TODO: Add these rules
 # X | 0 = X
 # X | Y = Y | X
@@ -49,3 +115,15 @@ def get_all_bitwise_rules():
     # results in "double" rules being at the end, after all single rules
     # (merely a comment on ordering, not a requirement)
     return reduce(iconcat, double_rules, single_rules)
+
+
+def get_all_shift_rules():
+    """Rules that only apply with an interval analysis (see above)."""
+    return [
+        floordiv_two_rule,
+        mod_two_rule,
+        lshift_combine_rule,
+        rshift_combine_rule,
+        rshift_zero_rule,
+        mod_small_rule,
+    ]
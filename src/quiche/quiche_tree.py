@@ -15,7 +15,7 @@ class QuicheTree(ABC):
         pass
 
     def matches_enode(self, enode) -> bool:
-        if self.value() != enode.key:
+        if self.value() != enode.key.value:
             return False
         return True
 
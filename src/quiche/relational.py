@@ -0,0 +1,246 @@
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .egraph import EClassID, EGraph, EMatch, ENode, SlotSubst
+from .quiche_tree import QuicheTree
+from .symbol_table import LinkedKeys, Symbol
+
+# Trie over the columns of a relation, in the query's variable order: nested
+# dicts keyed by e-class ID (the values of the last level are None)
+Trie = Dict[EClassID, Any]
+
+
+class Atom:
+    """
+    An atom `key(v0, v1, ..., vn)` of a conjunctive query: there is an enode
+    with key `key` (interned in the e-graph's symbol table when the query is
+    evaluated) and children in e-classes `v1, ..., vn` in e-class `v0`.
+    """
+
+    def __init__(self, key: Any, variables: Tuple[int, ...]):
+        self.key = key
+        self.arity = len(variables) - 1
+        self.variables = variables
+
+    def __repr__(self):
+        return "{}({})".format(self.key, ", ".join("v{}".format(v) for v in self.variables))
+
+    def build_trie(self, rows: List[Tuple[EClassID, ...]], order: Dict[int, int]) -> Trie:
+        """
+        Index the rows of this atom's relation as a trie whose levels are the
+        atom's distinct variables, sorted by their position in `order`.
+        Rows that disagree on a repeated variable are dropped.
+        """
+        columns: List[int] = []
+        checks: List[Tuple[int, int]] = []
+        first: Dict[int, int] = {}
+        for column, var in enumerate(self.variables):
+            if var in first:
+                checks.append((first[var], column))
+            else:
+                first[var] = column
+                columns.append(column)
+        columns.sort(key=lambda column: order[self.variables[column]])
+        inner, last = columns[:-1], columns[-1]
+
+        trie: Trie = {}
+        for row in rows:
+            if any(row[i] is not row[j] for i, j in checks):
+                continue
+            node = trie
+            for column in inner:
+                value = row[column]
+                if value in node:
+                    node = node[value]
+                else:
+                    node[value] = node = {}
+            node[row[last]] = None
+        return trie
+
+
+class Query:
+    """
+    A pattern compiled to a conjunctive query over the e-graph, seen as one
+    relation per enode key and arity (rows of e-class and child e-classes),
+    and evaluated with generic join, a worst-case optimal join: variables are
+    bound one at a time by intersecting the candidates of every atom that
+    mentions them.
+
+    Unlike top-down e-matching, repeated pattern variables (e.g. in
+    `(| (& ?x ?y) (& ?x ?z))`) prune the search as soon as they are bound,
+    instead of filtering whole substitutions at the end.
+
+    Variable 0 is the e-class matched by the pattern's root; matches are
+    returned in increasing order of root e-class ID.
+    """
+
+    def __init__(self, pattern: QuicheTree):
+        self.pattern = pattern
+        self.atoms: List[Atom] = []
+        # (pattern symbol, variable) pairs, in left-to-right pattern order
+        self.variables: List[Tuple[Any, int]] = []
+        self.num_variables = 0
+        self._compile()
+        # slot of each pattern symbol in the substitutions (see `SlotSubst`)
+        self.slots = {symbol: i for i, (symbol, _) in enumerate(self.variables)}
+        self._slot_variables = tuple(var for _, var in self.variables)
+
+        # length of the longest root-to-leaf path of the pattern
+        self.depth = max(self._depths)
+        # the key of each atom, as symbols of the e-graph the query runs on
+        self._keys = LinkedKeys(atom.key for atom in self.atoms)
+
+        # variables are bound breadth-first from the root
+        self.order = sorted(range(self.num_variables), key=self._depths.__getitem__)
+        position = {var: i for i, var in enumerate(self.order)}
+        self._position = position
+        self._atoms_by_variable: List[List[int]] = [[] for _ in self.order]
+        for i, atom in enumerate(self.atoms):
+            for var in set(atom.variables):
+                self._atoms_by_variable[var].append(i)
+
+    def __repr__(self):
+        return "Query({})".format(", ".join(str(atom) for atom in self.atoms))
+
+    def _compile(self):
+        symbols: Dict[Any, int] = {}
+        self._depths: List[int] = []
+
+        def variable(node: QuicheTree, depth: int) -> int:
+            if node.is_pattern_symbol():
+                if node.value() in symbols:
+                    var = symbols[node.value()]
+                    self._depths[var] = min(self._depths[var], depth)
+                    return var
+                var = symbols[node.value()] = self.num_variables
+                self.variables.append((node.value(), var))
+            else:
+                var = self.num_variables
+            self.num_variables += 1
+            self._depths.append(depth)
+            return var
+
+        # pre-order, left-to-right
+        root = variable(self.pattern, 0)
+        todo = [(self.pattern, root, 0)]
+        while todo:
+            node, var, depth = todo.pop()
+            if node.is_pattern_symbol():
+                continue
+            children = [(child, variable(child, depth + 1)) for child in node.children()]
+            self.atoms.append(
+                Atom(node.value(), (var,) + tuple(v for _, v in children))
+            )
+            todo.extend(reversed([(c, v, depth + 1) for c, v in children]))
+
+    @staticmethod
+    def _relation(egraph: EGraph, key: Symbol, arity: int) -> List[Tuple[EClassID, ...]]:
+        rows = []
+        for eid in egraph.eclasses_with_key(key):
+            for enode in eid.nodes:
+                if enode.key is key and len(enode.args) == arity:
+                    rows.append((eid,) + tuple(arg.find() for arg in enode.args))
+        return rows
+
+    def search(
+        self,
+        egraph: EGraph,
+        eclasses: Dict[EClassID, List[ENode]] = None,
+        dirty: Set[EClassID] = None,
+    ) -> List[EMatch]:
+        """
+        Match the query against e-classes of the e-graph. Returns the same
+        matches as `egraph.ematch(self.pattern, eclasses)`, possibly in a
+        different order.
+
+        With `dirty`, only the matches that bind at least one dirty e-class
+        are returned (see `Program.search`).
+
+        :param egraph: e-graph to search
+        :param eclasses: mapping from e-class IDs to their e-nodes, restricting
+            the e-classes matched by the root of the pattern (defaults to all
+            canonical e-classes of `egraph`)
+        :param dirty: canonical e-classes a match must bind (defaults to no
+            restriction)
+        :returns: list of (e-class ID, substitution) matches
+        """
+        return list(self.iter_search(egraph, eclasses, dirty))
+
+    def iter_search(
+        self,
+        egraph: EGraph,
+        eclasses: Dict[EClassID, List[ENode]] = None,
+        dirty: Set[EClassID] = None,
+    ) -> Iterator[EMatch]:
+        """
+        Lazy version of `search`: yields the matches as they are found (the
+        relations of the query are still indexed up front). The e-graph must
+        not be modified before the iterator is exhausted or discarded.
+        """
+        if eclasses is None:
+            eclasses = egraph.eclasses()
+        if dirty is not None:
+            # a match rooted elsewhere can't reach a dirty e-class
+            roots = egraph.ancestors(dirty, self.depth)
+            eclasses = {
+                eid: eclasses[eid]
+                for eid in sorted(roots, key=lambda eid: eid.id)
+                if eid in eclasses
+            }
+        if not self.atoms:
+            # the pattern is a single symbol: it matches every e-class
+            for eid in eclasses:
+                yield eid, SlotSubst(self.slots, (eid,))
+            return
+
+        relations: Dict[Tuple[Symbol, int], List[Tuple[EClassID, ...]]] = {}
+        cursors: List[Trie] = []
+        keys = self._keys.symbols(egraph.symbols)
+        for atom, key in zip(self.atoms, keys):
+            signature = (key, atom.arity)
+            if signature not in relations:
+                relations[signature] = Query._relation(egraph, key, atom.arity)
+            cursors.append(atom.build_trie(relations[signature], self._position))
+
+        bindings: List[Optional[EClassID]] = [None] * self.num_variables
+        yield from self._join(0, cursors, bindings, eclasses, dirty)
+
+    def _join(
+        self,
+        depth: int,
+        cursors: List[Trie],
+        bindings: List[Optional[EClassID]],
+        eclasses: Dict[EClassID, List[ENode]],
+        dirty: Optional[Set[EClassID]],
+    ) -> Iterator[EMatch]:
+        if depth == len(self.order):
+            if dirty is None or any(eid in dirty for eid in bindings):
+                values = tuple([bindings[var] for var in self._slot_variables])
+                yield bindings[0], SlotSubst(self.slots, values)
+            return
+
+        var = self.order[depth]
+        atoms = self._atoms_by_variable[var]
+        tries = [cursors[atom] for atom in atoms]
+        candidates = min(tries, key=len)
+        if depth == 0:
+            candidates = sorted(
+                (eid for eid in candidates if eid in eclasses), key=lambda eid: eid.id
+            )
+        for value in candidates:
+            if all(value in trie for trie in tries):
+                for atom, trie in zip(atoms, tries):
+                    cursors[atom] = trie[value]
+                bindings[var] = value
+                yield from self._join(depth + 1, cursors, bindings, eclasses, dirty)
+        for atom, trie in zip(atoms, tries):
+            cursors[atom] = trie
+
+
+def compile_query(pattern: QuicheTree) -> Query:
+    """
+    Compile a pattern to a conjunctive `Query` for relational e-matching.
+
+    :param pattern: QuicheTree pattern
+    :returns: compiled Query
+    """
+    return Query(pattern)
@@ -1,4 +1,5 @@
-from typing import Callable, Dict, Sequence
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
 
 from quiche.quiche_tree import QuicheTree
 from quiche.egraph import (
@@ -10,54 +11,194 @@ from quiche.egraph import (
     Subst,
     EGraphSearcher,
 )
+from quiche.machine import compile_pattern
+from quiche.relational import compile_query
+from quiche.scheduler import RuleScheduler, SimpleScheduler
+from quiche.symbol_table import LinkedKeys, Symbol
+from quiche import parallel
+
+# e-matching backends, by name: each compiles a pattern to an object with
+# `search(egraph, eclasses, dirty)` and `iter_search(egraph, eclasses, dirty)`
+# methods returning a list of, respectively an iterator over, EMatches
+MATCHERS = {
+    "machine": compile_pattern,
+    "relational": compile_query,
+}
 
 
 class Rule(EGraphSearcher, EGraphRewriter):
-    def __init__(self, lhs: QuicheTree, rhs: QuicheTree):
+    """
+    Rewrite rule `lhs -> rhs`.
+
+    `matcher` selects the e-matching backend used to search for the LHS:
+    "machine" (the default) compiles it for the e-matching abstract machine,
+    "relational" compiles it to a conjunctive query evaluated with generic
+    join, which is faster for non-linear and deep patterns.
+    """
+
+    def __init__(self, lhs: QuicheTree, rhs: QuicheTree, matcher: str = "machine"):
         self.lhs = lhs
         self.rhs = rhs
+        self.matcher = matcher
+        # LHS compiled once for the e-matching machine
+        self.program = compile_pattern(lhs)
+        # LHS compiled for the other backends, on demand
+        self._searchers = {"machine": self.program}
+        # dict<id(RHS node), index> of the RHS's nodes in `_rhs_keys`, whose
+        # keys are interned once per e-graph instead of by every `add_enode`
+        # of `_subst`
+        self._rhs_nodes: Dict[int, int] = {}
+        keys = []
+        todo = [rhs]
+        while todo:
+            node = todo.pop()
+            if not node.is_pattern_symbol():
+                self._rhs_nodes[id(node)] = len(keys)
+                keys.append(node.value())
+                todo.extend(node.children())
+        self._rhs_keys = LinkedKeys(keys)
 
     def __repr__(self):
         return "{} -> {}".format(self.lhs, self.rhs)
 
     @staticmethod
-    def apply_rules(rules: Sequence["Rule"], egraph: EGraph):
+    def apply_rules(
+        rules: Sequence["Rule"],
+        egraph: EGraph,
+        matcher: str = None,
+        scheduler: RuleScheduler = None,
+        workers: int = None,
+    ):
         """
         :param egraph: e-graph in which rule is being applied
+        :param matcher: e-matching backend for all rules (defaults to each
+            rule's own `matcher`)
+        :param scheduler: decides which matches of each rule are applied
+            (defaults to applying all of them); pass the same scheduler to
+            every call of a saturation loop
+        :param workers: number of processes for the search phase (see
+            `search_rules`)
         :returns: modified e-graph
         """
-        matches = []
-        for rule in rules:
-            matches.append((rule, egraph.search(rule)))
+        if scheduler is None:
+            scheduler = SimpleScheduler()
+        iteration = scheduler.iteration
+
+        matches = Rule.search_rules(rules, egraph, matcher, scheduler, workers)
 
         version = egraph.version
         for (rule, rule_matches) in matches:
             egraph.apply_rewrite(rule, rule_matches)
 
         egraph.rebuild()
-        if version != egraph.version:
+        if version != egraph.version or not scheduler.can_stop(iteration):
             egraph._is_saturated = False
+        scheduler.iteration += 1
         return egraph
 
-    def search(self, egraph: EGraph) -> Sequence[EMatch]:
+    @staticmethod
+    def search_rules(
+        rules: Sequence["Rule"],
+        egraph: EGraph,
+        matcher: str = None,
+        scheduler: RuleScheduler = None,
+        workers: int = None,
+    ) -> List[Tuple["Rule", Sequence[EMatch]]]:
+        """
+        Search phase of `apply_rules`: find the matches of every rule in the
+        current iteration of `scheduler`, without modifying the e-graph.
+
+        :param workers: if greater than 1, search the rules in parallel with
+            this many processes forked from the current one (see
+            `quiche.parallel.search_rules`); the matches are the same
+        :returns: list of (rule, matches) pairs
+        """
+        if scheduler is None:
+            scheduler = SimpleScheduler()
+        if workers is not None and workers > 1:
+            return parallel.search_rules(rules, egraph, scheduler, matcher, workers)
+        iteration = scheduler.iteration
+        return [
+            (rule, scheduler.search_rule(iteration, egraph, rule, matcher))
+            for rule in rules
+        ]
+
+    def searcher(self, matcher: str = None):
+        """
+        :param matcher: name of an e-matching backend in `MATCHERS` (defaults
+            to this rule's `matcher`)
+        :returns: the LHS compiled for that backend
+        """
+        matcher = matcher or self.matcher
+        if matcher not in self._searchers:
+            if matcher not in MATCHERS:
+                raise ValueError("Unknown matcher: {}".format(matcher))
+            self._searchers[matcher] = MATCHERS[matcher](self.lhs)
+        return self._searchers[matcher]
+
+    def search(
+        self, egraph: EGraph, matcher: str = None, since: int = None, limit: int = None
+    ) -> Sequence[EMatch]:
+        """
+        :param matcher: e-matching backend (see `searcher`)
+        :param since: if given, a previous `egraph.version`: only return the
+            matches that involve an e-class changed since then (delta
+            e-matching), which include every match that is new since then
+        :param limit: maximum number of matches: the search stops as soon as
+            it is reached (None for no limit)
+        :returns: list of (e-class ID, substitution) matches
+        """
+        if limit is not None:
+            return list(self.iter_matches(egraph, matcher, since, limit))
         canonical_eclasses = egraph.eclasses()
-        return egraph.ematch(self.lhs, canonical_eclasses)
+        dirty = None
+        if since is not None:
+            dirty = egraph.changed_since(since)
+        return self.searcher(matcher).search(egraph, canonical_eclasses, dirty)
+
+    def iter_matches(
+        self, egraph: EGraph, matcher: str = None, since: int = None, limit: int = None
+    ) -> Iterator[EMatch]:
+        """
+        Lazy version of `search`: yields the matches as they are found. The
+        e-graph must not be modified before the iterator is exhausted or
+        discarded.
+        """
+        canonical_eclasses = egraph.eclasses()
+        dirty = None
+        if since is not None:
+            dirty = egraph.changed_since(since)
+        matches = self.searcher(matcher).iter_search(egraph, canonical_eclasses, dirty)
+        return islice(matches, limit)
 
     def apply_to_eclass(self, egraph: EGraph, eid: EClassID, env: Subst) -> EClassID:
-        return self._subst(egraph, self.rhs, env)
+        keys = self._rhs_keys.symbols(egraph.symbols)
+        return self._subst(egraph, self.rhs, env, keys)
 
-    def _subst(self, egraph: EGraph, pattern: QuicheTree, env: Dict[str, EClassID]):
+    def _subst(
+        self,
+        egraph: EGraph,
+        pattern: QuicheTree,
+        env: Subst,
+        keys: Sequence[Symbol] = (),
+    ):
         """
         :param pattern: QuicheTree
-        :param env: Dict[str, EClassID]
+        :param env: Subst
+        :param keys: symbols of the RHS's keys in `egraph` (see `_rhs_nodes`)
         :returns: EClassID
         """
         if pattern.is_pattern_symbol():
             return env[pattern.value()]
         else:
+            index = self._rhs_nodes.get(id(pattern))
+            key = pattern.value() if index is None or not keys else keys[index]
             enode = ENode(
-                pattern.value(),
-                tuple(self._subst(egraph, child, env) for child in pattern.children()),
+                key,
+                tuple(
+                    self._subst(egraph, child, env, keys)
+                    for child in pattern.children()
+                ),
             )
             return egraph.add_enode(enode)
 
@@ -81,8 +222,9 @@ class ConditionalRule(Rule):
         lhs: QuicheTree,
         rhs: QuicheTree,
         checker: Callable[[EGraph, EClassID, Subst], bool] = None,
+        matcher: str = "machine",
     ):
-        super().__init__(lhs, rhs)
+        super().__init__(lhs, rhs, matcher)
         self._checker = checker
 
     def check_condition(self, egraph: EGraph, eid: EClassID, env: Subst) -> bool:
@@ -0,0 +1,203 @@
+import os
+from enum import Enum
+from time import perf_counter
+from typing import List, NamedTuple, Optional, Sequence
+
+from quiche.egraph import EGraph
+from quiche.rewrite import Rule
+from quiche.scheduler import RuleScheduler, SimpleScheduler
+
+
+class StopReason(Enum):
+    SATURATED = "saturated"
+    ITERATION_LIMIT = "iteration limit"
+    NODE_LIMIT = "node limit"
+    TIME_LIMIT = "time limit"
+    MEMORY_LIMIT = "memory limit"
+
+
+class Iteration(NamedTuple):
+    """Statistics of a single iteration of a `Runner`."""
+
+    # size of the e-graph at the end of the iteration
+    egraph_nodes: int
+    egraph_classes: int
+    # number of matches applied
+    applied: int
+    # wall time, in seconds, of the search, apply and rebuild phases
+    search_time: float
+    apply_time: float
+    rebuild_time: float
+
+    @property
+    def total_time(self) -> float:
+        return self.search_time + self.apply_time + self.rebuild_time
+
+
+class RunReport(NamedTuple):
+    """Result of `Runner.run`."""
+
+    stop_reason: StopReason
+    iterations: List[Iteration]
+    # wall time, in seconds, of the whole run
+    total_time: float
+
+    def __str__(self):
+        lines = [
+            "Stop reason: {}".format(self.stop_reason.value),
+            "Iterations: {}".format(len(self.iterations)),
+            "Total time: {:.4f}s".format(self.total_time),
+        ]
+        if self.iterations:
+            last = self.iterations[-1]
+            lines.append("E-nodes: {}".format(last.egraph_nodes))
+            lines.append("E-classes: {}".format(last.egraph_classes))
+        return "\n".join(lines)
+
+
+def current_rss() -> Optional[int]:
+    """
+    Resident set size of the current process in bytes, or None if it can't
+    be determined on this platform.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        from sys import platform
+
+        # peak (not current) RSS: in bytes on macOS, in kilobytes elsewhere
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if platform == "darwin" else max_rss * 1024
+    except (ImportError, OSError):
+        return None
+
+
+class Runner:
+    """
+    Runs equality saturation (`Rule.apply_rules` until the e-graph is
+    saturated) with limits on the number of iterations, the number of
+    e-nodes, the wall time and the resident memory of the process.
+
+    Limits are checked after every iteration, and the node, time and memory
+    limits also after applying each rule's matches; a run that stops in the
+    middle of an iteration still rebuilds the e-graph, and the matches it
+    didn't apply are rejected (see `RuleScheduler.reject_matches`).
+
+    :param rules: rules to apply
+    :param iteration_limit: maximum number of iterations
+    :param node_limit: maximum number of e-nodes
+    :param time_limit: maximum wall time in seconds (defaults to the
+        e-graph's `timeout` if it is positive, and to 5 seconds otherwise)
+    :param memory_limit: maximum resident set size in bytes (None for no
+        limit)
+    :param scheduler: rule scheduler (defaults to a `SimpleScheduler`); e.g.,
+        `SimpleScheduler(match_limit=...)` bounds the number of matches of
+        each rule that are searched for and kept in memory per iteration
+    :param matcher: e-matching backend for all rules (see `Rule.search`)
+    :param workers: number of processes for the search phase (see
+        `Rule.search_rules`)
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[Rule],
+        iteration_limit: int = 30,
+        node_limit: int = 10000,
+        time_limit: Optional[float] = None,
+        memory_limit: Optional[int] = None,
+        scheduler: RuleScheduler = None,
+        matcher: str = None,
+        workers: int = None,
+    ):
+        self.rules = rules
+        self.iteration_limit = iteration_limit
+        self.node_limit = node_limit
+        self.time_limit = time_limit
+        self.memory_limit = memory_limit
+        self.scheduler = scheduler if scheduler is not None else SimpleScheduler()
+        self.matcher = matcher
+        self.workers = workers
+
+    def _check_limits(
+        self, egraph: EGraph, start: float, time_limit: float
+    ) -> Optional[StopReason]:
+        if egraph.total_size() > self.node_limit:
+            return StopReason.NODE_LIMIT
+        if perf_counter() - start > time_limit:
+            return StopReason.TIME_LIMIT
+        if self.memory_limit is not None:
+            rss = current_rss()
+            if rss is not None and rss > self.memory_limit:
+                return StopReason.MEMORY_LIMIT
+        return None
+
+    def run(self, egraph: EGraph) -> RunReport:
+        """
+        Apply the rules to `egraph` until it is saturated or a limit is hit.
+
+        :param egraph: e-graph to saturate (modified in place)
+        :returns: RunReport with the stop reason and per-iteration statistics
+        """
+        time_limit = self.time_limit
+        if time_limit is None:
+            time_limit = egraph.timeout if egraph.timeout > 0 else 5.0
+        scheduler = self.scheduler
+        iterations: List[Iteration] = []
+        start = perf_counter()
+
+        if self.iteration_limit <= 0:
+            stop_reason = StopReason.ITERATION_LIMIT
+        else:
+            stop_reason = self._check_limits(egraph, start, time_limit)
+        while stop_reason is None:
+            iteration = scheduler.iteration
+            search_start = perf_counter()
+            matches = Rule.search_rules(
+                self.rules, egraph, self.matcher, scheduler, self.workers
+            )
+
+            apply_start = perf_counter()
+            version = egraph.version
+            applied = 0
+            for i, (rule, rule_matches) in enumerate(matches):
+                egraph.apply_rewrite(rule, rule_matches)
+                applied += len(rule_matches)
+                stop_reason = self._check_limits(egraph, start, time_limit)
+                if stop_reason is not None:
+                    # the scheduler must search the other rules' matches again
+                    for rule, rule_matches in matches[i + 1:]:
+                        if rule_matches:
+                            scheduler.reject_matches(iteration, rule)
+                    break
+
+            rebuild_start = perf_counter()
+            egraph.rebuild()
+            saturated = version == egraph.version and scheduler.can_stop(iteration)
+            egraph._is_saturated = saturated
+            scheduler.iteration += 1
+            end = perf_counter()
+
+            iterations.append(
+                Iteration(
+                    egraph.total_size(),
+                    len(egraph.eclasses()),
+                    applied,
+                    apply_start - search_start,
+                    rebuild_start - apply_start,
+                    end - rebuild_start,
+                )
+            )
+            if stop_reason is not None:
+                break
+            if saturated:
+                stop_reason = StopReason.SATURATED
+            elif len(iterations) >= self.iteration_limit:
+                stop_reason = StopReason.ITERATION_LIMIT
+            else:
+                stop_reason = self._check_limits(egraph, start, time_limit)
+
+        return RunReport(stop_reason, iterations, perf_counter() - start)
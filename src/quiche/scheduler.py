@@ -0,0 +1,329 @@
+from abc import ABC
+from itertools import islice
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Sequence
+
+from quiche.egraph import EGraph, EMatch
+
+if TYPE_CHECKING:
+    from quiche.rewrite import Rule
+
+
+class SearchRequest(NamedTuple):
+    """
+    How a scheduler wants a rule to be searched in an iteration: the
+    matches involving an e-class changed since version `since` (all of them
+    if None), skipping the first `offset` matches, and stopping after
+    `limit` matches (None for no limit).
+    """
+
+    since: Optional[int] = None
+    limit: Optional[int] = None
+    offset: int = 0
+
+    def run(self, egraph: EGraph, rule: "Rule", matcher: str = None) -> List[EMatch]:
+        """Search `egraph` for the requested matches of `rule`."""
+        if self.offset:
+            matches = rule.iter_matches(egraph, matcher, self.since)
+            end = None if self.limit is None else self.offset + self.limit
+            return list(islice(matches, self.offset, end))
+        return rule.search(egraph, matcher, self.since, self.limit)
+
+
+class RuleScheduler(ABC):
+    """
+    Decides, in each iteration of `Rule.apply_rules`, which matches of each
+    rule are applied.
+
+    A rule is searched in three steps: `search_request` says how to search
+    it (or that it is skipped), the request is run, and `accept_matches`
+    selects the matches to apply and updates the scheduler. The requests of
+    an iteration don't depend on each other's results, so they can be run
+    in parallel (see `Rule.search_rules`). If the accepted matches are then
+    not applied (e.g., a `Runner` stopped at a limit), `reject_matches`
+    undoes the update, so that they are searched for again.
+
+    `iteration` counts the calls to `Rule.apply_rules` made with this
+    scheduler; it is advanced by `Rule.apply_rules` after each call.
+
+    With `incremental=True`, each rule is only searched for matches that
+    involve an e-class changed since the rule was last searched (see
+    `Rule.search`), instead of the whole e-graph. Matches that were already
+    applied are not searched again, so an incremental scheduler must drive a
+    single e-graph. Conditional rules whose checker depends on more than the
+    matched e-classes (e.g., on analysis data of other e-classes) may miss
+    matches that only become applicable later.
+    """
+
+    def __init__(self, incremental: bool = False):
+        self.iteration = 0
+        self.incremental = incremental
+        # egraph.version at the last search of each rule, when incremental,
+        # and at the search before it (for `reject_matches`)
+        self._searched_versions: Dict["Rule", int] = {}
+        self._previous_versions: Dict["Rule", Optional[int]] = {}
+
+    def search_rule(
+        self, iteration: int, egraph: EGraph, rule: "Rule", matcher: str = None
+    ) -> Sequence[EMatch]:
+        """
+        Search for the matches of `rule` to apply in this iteration.
+
+        :param iteration: current iteration
+        :param egraph: e-graph to search
+        :param rule: rule to search for
+        :param matcher: e-matching backend (see `Rule.search`)
+        :returns: matches to apply
+        """
+        request = self.search_request(iteration, egraph, rule)
+        if request is None:
+            return []
+        matches = request.run(egraph, rule, matcher)
+        return self.accept_matches(iteration, egraph, rule, request, matches)
+
+    def search_request(
+        self, iteration: int, egraph: EGraph, rule: "Rule"
+    ) -> Optional[SearchRequest]:
+        """
+        :returns: how to search `rule` in this iteration, or None if it
+            isn't searched
+        """
+        return SearchRequest(self._since(rule))
+
+    def accept_matches(
+        self,
+        iteration: int,
+        egraph: EGraph,
+        rule: "Rule",
+        request: SearchRequest,
+        matches: List[EMatch],
+    ) -> Sequence[EMatch]:
+        """
+        :param matches: result of running `request` on the (unmodified)
+            e-graph
+        :returns: matches of `rule` to apply in this iteration
+        """
+        self._mark_searched(egraph, rule)
+        return matches
+
+    def reject_matches(self, iteration: int, rule: "Rule"):
+        """
+        Called when the matches of `rule` accepted in this iteration were
+        not applied: they are searched for again in the next search of
+        `rule`.
+        """
+        if rule in self._previous_versions:
+            version = self._previous_versions.pop(rule)
+            if version is None:
+                self._searched_versions.pop(rule, None)
+            else:
+                self._searched_versions[rule] = version
+
+    def can_stop(self, iteration: int) -> bool:
+        """
+        Called when an iteration didn't change the e-graph. Returns False if
+        the e-graph should not be considered saturated yet (e.g., because
+        some rules were not searched).
+        """
+        return True
+
+    def _since(self, rule: "Rule") -> Optional[int]:
+        """
+        The `since` argument of `Rule.search` for `rule`: if the scheduler is
+        incremental, the version at which `rule` was last searched (then
+        `_mark_searched`, when all its matches were going to be applied).
+        """
+        return self._searched_versions.get(rule) if self.incremental else None
+
+    def _mark_searched(self, egraph: EGraph, rule: "Rule"):
+        if self.incremental:
+            self._previous_versions[rule] = self._searched_versions.get(rule)
+            self._searched_versions[rule] = egraph.version
+
+
+class SimpleScheduler(RuleScheduler):
+    """
+    Applies every match of every rule in every iteration, or, with a
+    `match_limit`, at most `match_limit` matches of each rule: the search
+    stops there, which bounds the time and memory of an iteration. A rule
+    with more matches resumes, in the next iteration, after the last match
+    it returned, so that every match is eventually applied.
+
+    The e-graph is only reported as saturated once every rule made a whole
+    pass over its matches without the e-graph changing.
+    """
+
+    def __init__(self, match_limit: int = None, incremental: bool = False):
+        super().__init__(incremental)
+        self.match_limit = match_limit
+        # rules that were not searched in full in the last iteration
+        self.truncated: List["Rule"] = []
+        self._truncated_iteration = -1
+        # number of matches to skip in the next search of each rule, and
+        # egraph.version when its current pass over its matches started
+        self._offsets: Dict["Rule", int] = {}
+        self._pass_versions: Dict["Rule", int] = {}
+        # offset of the last search of each rule (for `reject_matches`)
+        self._search_offsets: Dict["Rule", int] = {}
+
+    def search_request(
+        self, iteration: int, egraph: EGraph, rule: "Rule"
+    ) -> Optional[SearchRequest]:
+        if self._truncated_iteration != iteration:
+            self.truncated = []
+            self._truncated_iteration = iteration
+
+        limit = self.match_limit
+        if limit is None:
+            return SearchRequest(self._since(rule))
+        offset = self._offsets.pop(rule, 0)
+        self._search_offsets[rule] = offset
+        if offset == 0:
+            self._pass_versions[rule] = egraph.version
+        # one more match tells whether some were left out
+        return SearchRequest(self._since(rule), limit + 1, offset)
+
+    def accept_matches(
+        self,
+        iteration: int,
+        egraph: EGraph,
+        rule: "Rule",
+        request: SearchRequest,
+        matches: List[EMatch],
+    ) -> Sequence[EMatch]:
+        limit = self.match_limit
+        if limit is not None:
+            if len(matches) > limit:
+                self._offsets[rule] = request.offset + limit
+                self.truncated.append(rule)
+                return matches[:limit]
+            if self._pass_versions[rule] != egraph.version:
+                # the e-graph changed during the pass: make another one
+                self.truncated.append(rule)
+                return matches
+        return super().accept_matches(iteration, egraph, rule, request, matches)
+
+    def reject_matches(self, iteration: int, rule: "Rule"):
+        # resume at the first rejected match
+        offset = self._search_offsets.get(rule, 0)
+        if offset:
+            self._offsets[rule] = offset
+        else:
+            self._offsets.pop(rule, None)
+        super().reject_matches(iteration, rule)
+
+    def can_stop(self, iteration: int) -> bool:
+        return self._truncated_iteration != iteration or not self.truncated
+
+
+class RuleStats:
+    """Backoff state of a single rule in a `BackoffScheduler`."""
+
+    def __init__(self, match_limit: int, ban_length: int):
+        self.match_limit = match_limit
+        self.ban_length = ban_length
+        # number of iterations in which the rule's matches were applied
+        self.times_applied = 0
+        # number of times the rule exceeded its match limit
+        self.times_banned = 0
+        # the rule is not searched before this iteration
+        self.banned_until = 0
+
+    def __repr__(self):
+        return "RuleStats(applied={}, banned={}, banned_until={})".format(
+            self.times_applied, self.times_banned, self.banned_until
+        )
+
+
+class BackoffScheduler(RuleScheduler):
+    """
+    Exponential backoff scheduler, as in egg.
+
+    A rule with more than `match_limit * 2**times_banned` matches in an
+    iteration is not applied, and is banned (not searched) for the next
+    `ban_length * 2**times_banned` iterations. Explosive rules, such as
+    commutativity and associativity, therefore can't dominate the e-graph
+    while the other rules are still making progress.
+
+    When an iteration doesn't change the e-graph while some rules are banned,
+    `can_stop` lifts the bans (by fast-forwarding them) so that saturation
+    is only reported once every rule has been applied.
+    """
+
+    def __init__(
+        self, match_limit: int = 1000, ban_length: int = 5, incremental: bool = False
+    ):
+        super().__init__(incremental)
+        self.default_match_limit = match_limit
+        self.default_ban_length = ban_length
+        self.stats: Dict["Rule", RuleStats] = {}
+        # rules that exceeded their match limit in the last iteration
+        self.throttled: List["Rule"] = []
+        self._throttled_iteration = -1
+
+    def rule_stats(self, rule: "Rule") -> RuleStats:
+        if rule not in self.stats:
+            self.stats[rule] = RuleStats(self.default_match_limit, self.default_ban_length)
+        return self.stats[rule]
+
+    def with_limits(
+        self, rule: "Rule", match_limit: int = None, ban_length: int = None
+    ) -> "BackoffScheduler":
+        """
+        Override the match limit and/or ban length of a single rule.
+
+        :returns: self, for chaining
+        """
+        stats = self.rule_stats(rule)
+        if match_limit is not None:
+            stats.match_limit = match_limit
+        if ban_length is not None:
+            stats.ban_length = ban_length
+        return self
+
+    def banned_rules(self, iteration: int) -> List["Rule"]:
+        """Rules that are banned in the given iteration."""
+        return [rule for rule, stats in self.stats.items() if stats.banned_until > iteration]
+
+    def search_request(
+        self, iteration: int, egraph: EGraph, rule: "Rule"
+    ) -> Optional[SearchRequest]:
+        if self._throttled_iteration != iteration:
+            self.throttled = []
+            self._throttled_iteration = iteration
+
+        stats = self.rule_stats(rule)
+        if iteration < stats.banned_until:
+            return None
+
+        threshold = stats.match_limit << stats.times_banned
+        # stop searching as soon as the rule is known to exceed its limit
+        return SearchRequest(self._since(rule), threshold + 1)
+
+    def accept_matches(
+        self,
+        iteration: int,
+        egraph: EGraph,
+        rule: "Rule",
+        request: SearchRequest,
+        matches: List[EMatch],
+    ) -> Sequence[EMatch]:
+        stats = self.rule_stats(rule)
+        threshold = stats.match_limit << stats.times_banned
+        if len(matches) > threshold:
+            stats.banned_until = iteration + (stats.ban_length << stats.times_banned)
+            stats.times_banned += 1
+            self.throttled.append(rule)
+            return []
+
+        stats.times_applied += 1
+        return super().accept_matches(iteration, egraph, rule, request, matches)
+
+    def can_stop(self, iteration: int) -> bool:
+        banned = [stats for stats in self.stats.values() if stats.banned_until > iteration]
+        if not banned:
+            return True
+        # fast-forward the bans so that the earliest one ends next iteration
+        delta = min(stats.banned_until for stats in banned) - (iteration + 1)
+        for stats in banned:
+            stats.banned_until -= delta
+        return False
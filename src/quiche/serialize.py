@@ -0,0 +1,299 @@
+import ast
+import copyreg
+import io
+import mmap
+import pickle
+import struct
+import sys
+from array import array
+from typing import Any, Dict, List
+
+from quiche.egraph import _NO_USES, EClassAnalysis, EClassID, EGraph, ENode
+from quiche.symbol_table import Symbol
+
+# File layout (little-endian):
+#
+#   header    magic, then the format version and the byte length of each
+#             section as uint64s
+#   meta      pickled dict of the EGraph's scalar fields
+#   keys      pickled list of the distinct enode keys (the key table),
+#             re-interned as `Symbol`s on load
+#   parents   union-find root of every e-class id
+#   classes   (e-class id, union-find set size) of every canonical e-class,
+#             in `EGraph.eclasses()` order
+#   nodes     (e-class id, key index, arity) of every enode, grouped by
+#             canonical e-class in the same order
+#   pruned    (e-class id, key index, arity) of every pruned enode (see
+#             `EGraph.prune`), which is only in the hashcons and uses
+#   children  canonical child e-class ids of every enode, then of every
+#             pruned enode, concatenated
+#   data      pickled dict<int, D> of the analysis data of each canonical
+#             e-class
+#
+# The integers of the parents, classes, nodes, pruned and children sections
+# are int32s. Sections start on 8-byte boundaries, so that the integer
+# sections of a memory-mapped file can be cast to int32s without a copy (they
+# are then converted to lists by `_read_ints`).
+MAGIC = b"QUICHEEG"
+FORMAT_VERSION = 2
+SECTIONS = (
+    "meta", "keys", "parents", "classes", "nodes", "pruned", "children", "data"
+)
+_HEADER = struct.Struct("<8sQ{}Q".format(len(SECTIONS)))
+_ALIGN = 8
+_INT = "i"
+
+
+# Python source in which the parser uses every field-less AST node type
+# (expression contexts and operators), see `_ast_singleton`
+_AST_SINGLETON_SOURCE = """
+x = a + b - c * d @ e / f % g ** h << i >> j | k ^ l & m // n
+x = not -+~a and b or c
+x = a == b != c < d <= e > f >= g is h is not i in j not in k
+del x
+"""
+_ast_singletons: Dict[type, ast.AST] = {}
+
+
+def _ast_singleton(node_type: type) -> ast.AST:
+    """
+    The instance of a field-less AST node type (e.g., `ast.Load`) that the
+    parser of this process uses. AST nodes compare by identity, and the
+    parser shares a single instance of each such type, so keys holding one
+    (e.g., the context of an `ast.Name`) must be unpickled to that instance
+    to compare equal to keys of newly parsed code (such as rules).
+    """
+    if not _ast_singletons:
+        for node in ast.walk(ast.parse(_AST_SINGLETON_SOURCE)):
+            if not node._fields:
+                _ast_singletons.setdefault(type(node), node)
+    if node_type not in _ast_singletons:
+        _ast_singletons[node_type] = node_type()
+    return _ast_singletons[node_type]
+
+
+def _reduce_ast_singleton(node: ast.AST):
+    return _ast_singleton, (type(node),)
+
+
+def _pickle_keys(keys: List[Any]) -> bytes:
+    dispatch_table = copyreg.dispatch_table.copy()
+    for node_type in vars(ast).values():
+        if isinstance(node_type, type) and issubclass(node_type, ast.AST):
+            if not node_type._fields:
+                dispatch_table[node_type] = _reduce_ast_singleton
+    out = io.BytesIO()
+    pickler = pickle.Pickler(out, pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = dispatch_table
+    pickler.dump(keys)
+    return out.getvalue()
+
+
+def _padding(length: int) -> bytes:
+    return b"\0" * (-length % _ALIGN)
+
+
+def _int_bytes(ints: array) -> bytes:
+    if sys.byteorder != "little":
+        ints = array(_INT, ints)
+        ints.byteswap()
+    return ints.tobytes()
+
+
+def _read_ints(view: memoryview) -> List[int]:
+    if sys.byteorder != "little":
+        ints = array(_INT, view.tobytes())
+        ints.byteswap()
+        return ints.tolist()
+    with view.cast(_INT) as ints:
+        return ints.tolist()
+
+
+def save_egraph(egraph: EGraph, path: str):
+    """
+    Write `egraph` to the file `path` (see `EGraph.save`).
+
+    :param egraph: rebuilt EGraph to save
+    :param path: path of the file to write
+    """
+    if egraph.worklist:
+        raise ValueError("EGraph must be rebuilt before it is saved")
+
+    # index of each symbol in the key table
+    key_index: Dict[Symbol, int] = {}
+    keys: List[Any] = []
+    union_find = egraph._union_find
+    classes = array(_INT)
+    nodes = array(_INT)
+    children = array(_INT)
+    data: Dict[int, Any] = {}
+
+    def add_enode(eid: EClassID, enode: ENode, enodes: array):
+        index = key_index.get(enode.key)
+        if index is None:
+            index = key_index[enode.key] = len(keys)
+            keys.append(enode.key.value)
+        enodes.extend((eid.id, index, len(enode.args)))
+        children.extend([arg.find().id for arg in enode.args])
+
+    for eid, enodes in egraph.eclasses().items():
+        classes.extend((eid.id, union_find.sizes[eid.id]))
+        data[eid.id] = eid.data
+        for enode in enodes:
+            add_enode(eid, enode, nodes)
+
+    # the hashcons entries that aren't in an e-class
+    pruned = array(_INT)
+    if len(egraph.hashcons) > len(nodes) // 3:
+        live = set()
+        for enodes in egraph.eclasses().values():
+            live.update(enodes)
+        for enode, eid in egraph.hashcons.items():
+            if enode not in live:
+                add_enode(eid.find(), enode, pruned)
+
+    meta = {
+        "version": egraph.version,
+        "is_saturated": egraph._is_saturated,
+        "timeout": egraph.timeout,
+        "root": -1 if egraph.root is None else egraph.root.id,
+    }
+    sections = [
+        pickle.dumps(meta, pickle.HIGHEST_PROTOCOL),
+        _pickle_keys(keys),
+        _int_bytes(array(_INT, [union_find.find(i) for i in range(len(union_find))])),
+        _int_bytes(classes),
+        _int_bytes(nodes),
+        _int_bytes(pruned),
+        _int_bytes(children),
+        pickle.dumps(data, pickle.HIGHEST_PROTOCOL),
+    ]
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, *(len(s) for s in sections)))
+        for section in sections:
+            f.write(section)
+            f.write(_padding(len(section)))
+
+
+def load_egraph(path: str, analysis: EClassAnalysis = None) -> EGraph:
+    """
+    Read an EGraph written by `save_egraph` (see `EGraph.load`). The file
+    is unpickled: only load trusted files.
+
+    :param path: path of the file to read
+    :param analysis: analysis of the loaded EGraph
+    :returns: the loaded EGraph
+    """
+    with open(path, "rb") as f:
+        try:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # e.g., an empty file, or a file that can't be mapped
+            buffer = f.read()
+        try:
+            with memoryview(buffer) as view:
+                sections = _read_sections(view)
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+    return _build_egraph(analysis, *sections)
+
+
+def _read_sections(view: memoryview) -> List[Any]:
+    if len(view) < _HEADER.size:
+        raise ValueError("not a saved EGraph: file is too short")
+    magic, format_version, *lengths = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError("not a saved EGraph: bad magic number")
+    if format_version != FORMAT_VERSION:
+        raise ValueError(
+            "unsupported EGraph format version {} (expected {})".format(
+                format_version, FORMAT_VERSION
+            )
+        )
+
+    sections: List[Any] = []
+    start = _HEADER.size
+    for name, length in zip(SECTIONS, lengths):
+        if start + length > len(view):
+            raise ValueError("truncated EGraph file: section {!r} is incomplete".format(name))
+        with view[start:start + length] as section:
+            if name in ("meta", "keys", "data"):
+                sections.append(pickle.loads(section))
+            else:
+                sections.append(_read_ints(section))
+        start += length + (-length % _ALIGN)
+    return sections
+
+
+def _build_egraph(
+    analysis: EClassAnalysis,
+    meta: Dict[str, Any],
+    keys: List[Any],
+    parents: List[int],
+    classes: List[int],
+    nodes: List[int],
+    pruned: List[int],
+    children: List[int],
+    data: Dict[int, Any],
+) -> EGraph:
+    egraph = EGraph(analysis=analysis)
+    union_find = egraph._union_find
+    union_find.parents = parents
+    # only the sizes of the roots are ever read
+    union_find.sizes = [1] * len(parents)
+    for i in range(0, len(classes), 2):
+        union_find.sizes[classes[i]] = classes[i + 1]
+    eclass_ids = egraph._eclass_ids
+    eclass_ids.extend([EClassID(i, egraph) for i in range(len(parents))])
+    egraph.id_counter = len(parents)
+    for eid, parent in zip(eclass_ids, parents):
+        if parent != eid.id:
+            eid.uses = _NO_USES
+            eid.nodes = ()
+
+    hashcons = egraph.hashcons
+    eclasses = egraph._eclasses
+    eclasses_by_key = egraph._eclasses_by_key
+    keys = [egraph.symbols.intern(key) for key in keys]
+    offset = 0
+    for i in range(0, len(nodes), 3):
+        eid = eclass_ids[nodes[i]]
+        key = keys[nodes[i + 1]]
+        end = offset + nodes[i + 2]
+        args = tuple([eclass_ids[child] for child in children[offset:end]])
+        offset = end
+        enode = ENode(key, args)
+        if not eid.nodes:
+            eclasses[eid] = eid.nodes
+        eid.nodes.append(enode)
+        hashcons[enode] = eid
+        for arg in args:
+            arg.uses[enode] = eid
+        if key in eclasses_by_key:
+            eclasses_by_key[key].add(eid)
+        else:
+            eclasses_by_key[key] = {eid}
+    for i in range(0, len(pruned), 3):
+        eid = eclass_ids[pruned[i]]
+        end = offset + pruned[i + 2]
+        args = tuple([eclass_ids[child] for child in children[offset:end]])
+        offset = end
+        enode = ENode(keys[pruned[i + 1]], args)
+        hashcons[enode] = eid
+        for arg in args:
+            arg.uses[enode] = eid
+
+    for id, eclass_data in data.items():
+        eclass_ids[id].data = eclass_data
+
+    egraph.version = meta["version"]
+    egraph._is_saturated = meta["is_saturated"]
+    egraph.timeout = meta["timeout"]
+    root = meta["root"]
+    egraph.root = None if root < 0 else eclass_ids[root]
+    # the change log isn't saved: report every e-class as changed at the
+    # saved version, so that `changed_since` stays conservative
+    for eid in eclasses:
+        egraph._log_change(eid)
+    return egraph
@@ -0,0 +1,128 @@
+from itertools import count
+from math import copysign
+from typing import Any, Dict, Iterable, Optional, Tuple
+from weakref import ref
+
+# numbers of the symbols of all tables: the symbols of different tables are
+# different ints, so that caches by symbol (e.g., of a cost model used with
+# several e-graphs) can't confuse them
+_numbers = count()
+
+
+class Symbol(int):
+    """
+    An interned ENode key: a small int, unique to the key in its
+    `SymbolTable` (and different from the symbols of other tables), so that
+    hashing and comparing keys are integer operations, which also carries
+    the original key as `value`.
+
+    Symbols only compare equal to each other when they are the same symbol,
+    but they also compare equal to the int with the same number: code that
+    inspects an ENode's key (analyses, cost models) should use
+    `enode.key.value`.
+    """
+
+    def __new__(cls, number: int, value: Any, table: "SymbolTable"):
+        symbol = super().__new__(cls, number)
+        symbol.value = value
+        symbol.table = table
+        return symbol
+
+    def __repr__(self):
+        return repr(self.value)
+
+    def __str__(self):
+        return str(self.value)
+
+    def __reduce__(self):
+        # symbols pickle as their keys, which are interned again when added
+        # to an e-graph
+        return _unpickle_key, (self.value,)
+
+
+def _unpickle_key(value: Any) -> Any:
+    return value
+
+
+def _typed_key(key: Any) -> Any:
+    """
+    A key of the table for `key` that tells apart keys which compare equal
+    but aren't the same value: 1, 1.0 and True, or 0.0 and -0.0 (also inside
+    tuples).
+    """
+    kind = type(key)
+    # (only equal to keys of the same type)
+    if kind is str or kind is type:
+        return key
+    if kind is tuple:
+        return kind, tuple([_typed_key(item) for item in key])
+    if kind is float:
+        return kind, key, copysign(1.0, key)
+    return kind, key
+
+
+class SymbolTable:
+    """
+    Interns ENode keys (any hashable values, e.g. strings, AST types or
+    `PALLeaf` tuples) as `Symbol`s. Each EGraph has its own table. There is
+    a single Symbol object per key, so symbols can be compared with `is`.
+    """
+
+    def __init__(self):
+        # dict<typed key, Symbol>
+        self._symbols: Dict[Any, Symbol] = {}
+
+    def __len__(self):
+        return len(self._symbols)
+
+    def intern(self, key: Any) -> Symbol:
+        """
+        :param key: ENode key, or a Symbol (of this table, which is returned
+            as is, or of another table, whose key is interned)
+        :returns: the Symbol of `key`, created if `key` wasn't interned yet
+        """
+        if type(key) is Symbol:
+            if key.table is self:
+                return key
+            key = key.value
+        typed = _typed_key(key)
+        symbol = self._symbols.get(typed)
+        if symbol is None:
+            symbol = self._symbols[typed] = Symbol(next(_numbers), key, self)
+        return symbol
+
+    def lookup(self, key: Any) -> Optional[Symbol]:
+        """
+        :param key: ENode key, or a Symbol (of this table, which is returned
+            as is, or of another table, whose key is looked up)
+        :returns: the Symbol of `key`, or None if it wasn't interned
+        """
+        if type(key) is Symbol:
+            if key.table is self:
+                return key
+            key = key.value
+        return self._symbols.get(_typed_key(key))
+
+
+class LinkedKeys:
+    """
+    The symbols of a fixed sequence of keys, e.g., the keys of a compiled
+    pattern, in the symbol table of the e-graph they were last used with
+    (they are interned again when used with another e-graph).
+
+    :param keys: ENode keys (None entries are kept as None)
+    """
+
+    def __init__(self, keys: Iterable[Any]):
+        self.keys = tuple(keys)
+        self._table = None
+        self._symbols: Tuple[Optional[Symbol], ...] = ()
+
+    def symbols(self, table: SymbolTable) -> Tuple[Optional[Symbol], ...]:
+        """The symbols of the keys in `table`, in order."""
+        if self._table is None or self._table() is not table:
+            self._symbols = tuple(
+                None if key is None else table.intern(key) for key in self.keys
+            )
+            self._table = ref(table)
+        return self._symbols
@@ -0,0 +1,58 @@
+from typing import List
+
+
+class UnionFind:
+    """
+    Union-find (disjoint set) over the integers 0..n-1, stored in flat
+    growable lists of ints (which index faster than `array.array` in
+    CPython). `find` uses iterative path compression, and `union` uses union
+    by size (ties keep the lower, i.e. older, id as the root).
+    """
+
+    def __init__(self):
+        self.parents: List[int] = []
+        self.sizes: List[int] = []
+
+    def __len__(self):
+        return len(self.parents)
+
+    def make_set(self) -> int:
+        """
+        Add a new singleton set.
+
+        :returns: id of the new set
+        """
+        new_id = len(self.parents)
+        self.parents.append(new_id)
+        self.sizes.append(1)
+        return new_id
+
+    def find(self, i: int) -> int:
+        """
+        Find the root (canonical id) of the set containing `i`, compressing
+        the path from `i` to the root along the way.
+        """
+        parents = self.parents
+        root = i
+        while parents[root] != root:
+            root = parents[root]
+        while parents[i] != root:
+            parents[i], i = root, parents[i]
+        return root
+
+    def union(self, i: int, j: int) -> int:
+        """
+        Union the sets containing `i` and `j`.
+
+        :returns: root of the merged set
+        """
+        i = self.find(i)
+        j = self.find(j)
+        if i == j:
+            return i
+        sizes = self.sizes
+        if sizes[i] < sizes[j] or (sizes[i] == sizes[j] and j < i):
+            i, j = j, i
+        self.parents[j] = i
+        sizes[i] += sizes[j]
+        return i
@@ -2,13 +2,20 @@ import ast
 import os
 from sys import version_info
 
-from quiche import EGraph, MinimumCostExtractor, Rule
+from quiche import DagCostExtractor, EGraph, MinimumCostExtractor, Rule
 from quiche.pyast import (
     ASTQuicheTree,
     ASTSizeCostModel,
     ASTHeuristicCostModel,
     ASTConstantFolding,
+    ASTIntervalAnalysis,
 )
+from quiche.pyast.pyarith_rewrites import (
+    add_associativity_rules,
+    add_commutativity_rule,
+    div_self_rule,
+)
+from quiche.pyast.pybitwise_rewrites import get_all_shift_rules
 from quiche.pyast.pal import StmtBlock as PALStmtBlock
 
 
@@ -320,6 +327,196 @@ def test_constant_folding():
             assert res == "    y = 60 * x * 0"
         elif idx == 84:
             assert pre == "    y = 4 / 4"
-            assert res == "    y = 1"
+            assert res == "    y = 1.0"
         else:
             assert res == pre, "Line {}: {} != {}".format(idx, res, pre)
+
+
+def test_constant_folding_operators():
+    source = "\n".join(
+        [
+            "a = 7 // 2 + 7 % -3",
+            "b = 2 ** 10 << 1",
+            "c = 2 ** 200",
+            "d = -(1.5 * 2)",
+            "e = ~5 & 255 ^ 1 | 8",
+            "f = not 0",
+            "g = 1 < 2 <= 2 != 3",
+            "h = 3 > 4 < x",
+            "i = 0 and x",
+            "j = x or 0",
+            "k = True + 1",
+            "l = 1 / 0",
+            "m = -0.0",
+            "n = -(0.0 * 1)",
+            "o = 0.0 * -1.0",
+        ]
+    )
+    tree = ASTQuicheTree()
+    tree.from_string(source)
+    eg = EGraph(tree, ASTConstantFolding())
+    eg.rebuild()
+    extracted = MinimumCostExtractor().extract(
+        ASTSizeCostModel(), eg, eg.root, ASTQuicheTree.make_node
+    )
+    assert extracted.to_source_string().splitlines() == [
+        "a = 1",
+        "b = 2048",
+        # too big to fold
+        "c = 2 ** 200",
+        "d = -3.0",
+        "e = 251",
+        "f = True",
+        "g = True",
+        "h = False",
+        "i = 0",
+        "j = x or 0",
+        "k = 2",
+        "l = 1 / 0",
+        # -0.0 isn't folded, as its literal would be that of 0.0
+        "m = -0.0",
+        "n = -0.0",
+        "o = 0.0 * -1.0",
+    ]
+    # the e-classes of constants only keep their literals (or, if negative,
+    # their negations)
+    for eclass, enodes in eg.eclasses().items():
+        if eclass.data is not None:
+            assert all(
+                not enode.args or (eclass.data < 0 and enode.key.value is ast.UnaryOp)
+                for enode in enodes
+            )
+
+
+def test_constant_folding_negative():
+    source = "\n".join(
+        [
+            "a = (-2) ** x",
+            "b = (0.0 - 3) ** 0.5",
+            "c = (1 - 3) * 2",
+        ]
+    )
+    tree = ASTQuicheTree()
+    tree.from_string(source)
+    eg = EGraph(tree, ASTConstantFolding())
+    eg.rebuild()
+    extracted = MinimumCostExtractor().extract(
+        ASTSizeCostModel(), eg, eg.root, ASTQuicheTree.make_node
+    )
+    # negative constants are negations of literals, so they keep their
+    # parentheses as the base of **
+    assert extracted.to_source_string().splitlines() == [
+        "a = (-2) ** x",
+        "b = (-3.0) ** 0.5",
+        "c = -4",
+    ]
+
+
+def test_constant_folding_saturates():
+    tree = ASTQuicheTree()
+    tree.from_string("y = x + 2 + 3")
+    eg = EGraph(tree, ASTConstantFolding())
+    rules = add_associativity_rules + [add_commutativity_rule]
+    # adding a pruned e-node again is a no-op, so pruning doesn't undo itself
+    for _ in range(10):
+        Rule.apply_rules(rules, eg)
+        if eg.is_saturated():
+            break
+    assert eg.is_saturated()
+    extracted = MinimumCostExtractor().extract(
+        ASTSizeCostModel(), eg, eg.root, ASTQuicheTree.make_node
+    )
+    assert extracted.to_source_string().splitlines() == ["y = x + 5"]
+
+
+def test_dag_extract():
+    eg = EGraph(setup_constant_folding_tree(), ASTConstantFolding())
+    cost_model = ASTSizeCostModel()
+    expected = MinimumCostExtractor().extract(
+        cost_model, eg, eg.root, ASTQuicheTree.make_node
+    )
+    extractor = DagCostExtractor(exact=True)
+    extracted = extractor.extract(cost_model, eg, eg.root, ASTQuicheTree.make_node)
+    assert extractor.optimal
+    assert extracted.to_source_string() == expected.to_source_string()
+
+
+def test_interval_analysis():
+    source = "\n".join(
+        [
+            "a = ((x & 7) + 1) / ((x & 7) + 1)",
+            "b = x / x",
+            "c = x % 4 % 8",
+            "d = ((x & 15) >> 2) >> 2",
+            "e = (y << 1) << 2",
+            "f = (x | 3) % 2",
+            "g = (y << 1) % 2",
+            "h = (x & 7) / 8 >> 3",
+            "i = (not x) % 3",
+            "j = (x & 1) % 3",
+        ]
+    )
+    tree = ASTQuicheTree()
+    tree.from_string(source)
+    analysis = ASTIntervalAnalysis()
+    eg = EGraph(tree, analysis)
+    for _ in range(3):
+        Rule.apply_rules(get_all_shift_rules() + [div_self_rule], eg)
+    extracted = MinimumCostExtractor().extract(
+        ASTSizeCostModel(), eg, eg.root, ASTQuicheTree.make_node
+    )
+    assert extracted.to_source_string().splitlines() == [
+        # (x & 7) + 1 is at least 1
+        "a = 1",
+        # x can be 0
+        "b = x / x",
+        "c = x % 4",
+        "d = 0",
+        "e = y << 1 + 2",
+        "f = (x | 3) & 1",
+        "g = y << 1 & 1",
+        # a float can't be shifted
+        "h = (x & 7) / 8 >> 3",
+        # True % 3 is 1
+        "i = (not x) % 3",
+        "j = x & 1",
+    ]
+
+    # without an interval analysis, X / X is rewritten unless X is 0
+    eg = EGraph(tree)
+    Rule.apply_rules([div_self_rule], eg)
+    extracted = MinimumCostExtractor().extract(
+        ASTSizeCostModel(), eg, eg.root, ASTQuicheTree.make_node
+    )
+    assert extracted.to_source_string().splitlines()[:2] == ["a = 1", "b = 1"]
+
+
+def test_save_load(tmp_path):
+    analysis = ASTConstantFolding()
+    saved = EGraph(setup_constant_folding_tree(), analysis)
+    saved.rebuild()
+    path = str(tmp_path / "egraph.bin")
+    saved.save(path)
+    loaded = EGraph.load(path, analysis)
+
+    assert loaded.total_size() == saved.total_size()
+    for eid, nodes in saved.eclasses().items():
+        # (each e-graph has its own symbols)
+        assert [
+            (enode.key.value, enode.args)
+            for enode in loaded.lookup_eclass(loaded._eclass_ids[eid.id])
+        ] == [(enode.key.value, enode.args) for enode in nodes]
+        assert loaded._eclass_ids[eid.id].data == eid.data
+    # keys holding AST contexts (e.g. `x`'s ast.Load) match newly parsed code
+    size = loaded.total_size()
+    loaded.add(ASTQuicheTree.lift_to_quiche_tree("x"))
+    assert loaded.total_size() == size
+
+    extractor = MinimumCostExtractor()
+    source = [
+        extractor.extract(
+            ASTSizeCostModel(), egraph, egraph.root, ASTQuicheTree.make_node
+        ).to_source_string()
+        for egraph in (saved, loaded)
+    ]
+    assert source[0] == source[1]
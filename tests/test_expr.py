@@ -1,6 +1,29 @@
-from quiche import EGraph, MinimumCostExtractor, Rule
+from collections import Counter
+from math import inf
+
+import pytest
+
+from quiche import (
+    DagCostExtractor,
+    EGraph,
+    ENode,
+    IncrementalCostExtractor,
+    MinimumCostExtractor,
+    Rule,
+    Runner,
+    VectorizedCostExtractor,
+)
+from quiche.egraph import EClassAnalysis, ProductAnalysis
+from quiche.interval import INTEGERS, Interval, interval_condition
+from quiche.lang.expr_constant_folding import ExprConstantFolding
+from quiche.lang.expr_interval_analysis import ExprIntervalAnalysis
 from quiche.lang.expr_lang import ExprNode, ExprNodeCost, ExprTree
 
+from quiche.rewrite import ConditionalRule
+from quiche.runner import StopReason
+from quiche.scheduler import SimpleScheduler
+from quiche.symbol_table import Symbol
+
 from .util import verify_egraph_shape  # , print_egraph
 
 
@@ -83,6 +106,48 @@ def test_merge_exprs():
     assert verify_egraph_shape(actual, expected)
 
 
+def test_lookup_eclass():
+    actual = EGraph(ExprTree(times_divide()))
+    times_root = actual.add(ExprTree(times2()))
+    shift_root = actual.add(ExprTree(shift()))
+    assert [str(enode.key) for enode in actual.lookup_eclass(shift_root)] == ["<<"]
+
+    actual.merge(times_root, shift_root)
+    actual.rebuild()
+    assert actual.lookup_eclass(shift_root) is actual.eclasses()[times_root.find()]
+    assert sorted(str(enode.key) for enode in actual.lookup_eclass(shift_root)) == [
+        "*",
+        "<<",
+    ]
+
+
+def test_eclasses_with_key():
+    actual = EGraph(ExprTree(times_divide()))
+    times_root = actual.add(ExprTree(times2()))
+    shift_root = actual.add(ExprTree(shift()))
+    assert actual.eclasses_with_key("<<") == {shift_root}
+    assert actual.eclasses_with_key("-") == set()
+
+    actual.merge(times_root, shift_root)
+    actual.rebuild()
+    assert actual.eclasses_with_key("<<") == {times_root.find()}
+    assert actual.eclasses_with_key("*") == {times_root.find()}
+    assert actual.eclasses_with_key("/") == {actual.root}
+
+
+def test_merge_long_chain():
+    actual = EGraph()
+    eclasses = [actual.add(ExprTree(ExprNode("v{}".format(i), ()))) for i in range(5000)]
+    for i in reversed(range(len(eclasses) - 1)):
+        actual.merge(eclasses[i], eclasses[i + 1])
+    actual.rebuild()
+
+    root = eclasses[-1].find()
+    assert all(actual.find(eid) is root for eid in eclasses)
+    assert len(actual.eclasses()) == 1
+    assert len(actual.lookup_eclass(root)) == len(eclasses)
+
+
 def test_expr_ematch():
     actual = EGraph(ExprTree(times_divide()))
     # Rule to reassociate *,/
@@ -147,10 +212,11 @@ def test_apply_rules():
         assert actual.version == version
         Rule.apply_rules(rules, actual)
     assert actual.version == versions[-1]
+    # union by size: e3 (a * 1, (a * 2) / 2) absorbs the singleton e0 (a)
     expected = {
-        "e0": {"a": [()], "/": [("e2", "e1")], "*": [("e0", "e4")]},
         "e1": {"2": [()]},
-        "e2": {"*": [("e0", "e1")], "<<": [("e0", "e4")]},
+        "e2": {"*": [("e3", "e1")], "<<": [("e3", "e4")]},
+        "e3": {"a": [()], "/": [("e2", "e1")], "*": [("e3", "e4")]},
         "e4": {"1": [()], "/": [("e1", "e1")]},
     }
     assert verify_egraph_shape(actual, expected)
@@ -187,15 +253,245 @@ def test_extract():
         str(cost_analysis.extract(cost_model, actual, root.find(), ExprTree.make_node))
         == best_terms[-1]
     )
+    # union by size: e3 (a * 1, (a * 2) / 2) absorbs the singleton e0 (a)
     expected = {
-        "e0": {"a": [()], "/": [("e2", "e1")], "*": [("e0", "e4")]},
         "e1": {"2": [()]},
-        "e2": {"*": [("e0", "e1")], "<<": [("e0", "e4")]},
+        "e2": {"*": [("e3", "e1")], "<<": [("e3", "e4")]},
+        "e3": {"a": [()], "/": [("e2", "e1")], "*": [("e3", "e4")]},
         "e4": {"1": [()], "/": [("e1", "e1")]},
     }
     assert verify_egraph_shape(actual, expected)
 
 
+def test_runner_saturates():
+    actual = EGraph(ExprTree(times_divide()))
+    report = Runner(make_rules()).run(actual)
+
+    assert report.stop_reason == StopReason.SATURATED
+    assert actual.is_saturated()
+    assert [it.egraph_nodes for it in report.iterations] == [8, 8, 8, 8]
+    assert report.iterations[-1].applied > 0
+    assert report.iterations[-1].egraph_classes == len(actual.eclasses())
+    extracted = MinimumCostExtractor().extract(
+        ExprNodeCost(), actual, actual.root, ExprTree.make_node
+    )
+    assert str(extracted) == "a"
+
+
+def test_runner_limits():
+    rules = make_rules() + [ExprTree.make_rule(lambda x, y: (x * y, y * x))]
+
+    report = Runner(rules, iteration_limit=2).run(EGraph(ExprTree(times_divide())))
+    assert report.stop_reason == StopReason.ITERATION_LIMIT
+    assert len(report.iterations) == 2
+
+    report = Runner(rules, node_limit=8).run(EGraph(ExprTree(times_divide())))
+    assert report.stop_reason == StopReason.NODE_LIMIT
+    assert report.iterations[-1].egraph_nodes > 8
+
+    report = Runner(rules, time_limit=0).run(EGraph(ExprTree(times_divide())))
+    assert report.stop_reason == StopReason.TIME_LIMIT
+    assert report.iterations == []
+
+    report = Runner(rules, memory_limit=1).run(EGraph(ExprTree(times_divide())))
+    assert report.stop_reason == StopReason.MEMORY_LIMIT
+
+
+def test_runner_limits_keep_matches():
+    rules = [
+        ExprTree.make_rule(lambda x, y: (x + y, y + x)),
+        ExprTree.make_rule(lambda x: (x * 2, x << 1)),
+    ]
+    b, c = ExprNode("b", ()), ExprNode("c", ())
+    egraph = EGraph(ExprTree(times2() - (b + c)))
+    scheduler = SimpleScheduler(incremental=True)
+    # the node limit is hit after applying the first rule: the matches of the
+    # second rule are searched for again in the next run
+    report = Runner(rules, node_limit=egraph.total_size(), scheduler=scheduler).run(
+        egraph
+    )
+    assert report.stop_reason == StopReason.NODE_LIMIT
+    assert not egraph.eclasses_with_key("<<")
+    report = Runner(rules, scheduler=scheduler).run(egraph)
+    assert report.stop_reason == StopReason.SATURATED
+    assert egraph.eclasses_with_key("<<")
+
+
+def test_compute_costs():
+    class CountingCost(ExprNodeCost):
+        calls = 0
+
+        def enode_cost_rec(self, enode, costs):
+            self.calls += 1
+            return super().enode_cost_rec(enode, costs)
+
+    rules = make_rules() + [ExprTree.make_rule(lambda x, y: (x * y, y * x))]
+    egraph = EGraph(ExprTree(times_divide()))
+    Runner(rules).run(egraph)
+    # merge without rebuilding: costs must follow the canonical e-nodes
+    b = ExprNode("b", ())
+    egraph.merge(egraph.add(ExprTree(b * 1)), egraph.add(ExprTree(b)))
+    assert egraph.worklist
+
+    cost_model = CountingCost()
+    costs = MinimumCostExtractor().compute_costs(cost_model, egraph)
+    eclasses = egraph.eclasses()
+    # every e-node is costed exactly once
+    assert cost_model.calls == sum(len(enodes) for enodes in eclasses.values())
+    # and the costs are a fixed point: the cheapest e-node of each e-class
+    for eclass, enodes in eclasses.items():
+        assert costs[eclass] == min(
+            (cost_model.enode_cost_rec(enode, costs), enode) for enode in enodes
+        )
+    extracted = MinimumCostExtractor().extract(
+        cost_model, egraph, egraph.root, ExprTree.make_node
+    )
+    assert str(extracted) == "a"
+
+
+def test_incremental_extract():
+    rules = make_rules() + [ExprTree.make_rule(lambda x, y: (x * y, y * x))]
+    egraph = EGraph(ExprTree(times_divide()))
+    cost_model = ExprNodeCost()
+    extractor = IncrementalCostExtractor()
+    best_terms = []
+    for _ in range(4):
+        best_terms.append(
+            str(extractor.extract(cost_model, egraph, egraph.root, ExprTree.make_node))
+        )
+        expected = MinimumCostExtractor().compute_costs(cost_model, egraph)
+        assert {eid: extractor.costs[eid][0] for eid in egraph.eclasses()} == {
+            eid: cost for eid, (cost, _) in expected.items()
+        }
+        Rule.apply_rules(rules, egraph)
+    assert best_terms == ["(/ (* a 2) 2)", "(/ (<< a 1) 2)", "(* a 1)", "a"]
+
+    # nothing changed since the last update: the costs are returned as is
+    costs = extractor.compute_costs(cost_model, egraph)
+    assert extractor.compute_costs(cost_model, egraph) is costs
+
+    egraph.merge(egraph.root, egraph.add(ExprTree(ExprNode("b", ()))))
+    with pytest.raises(ValueError):
+        extractor.compute_costs(cost_model, egraph)
+
+
+def test_extract_pruned():
+    egraph = EGraph(ExprTree(times2() + 1))
+    cost_model = ExprNodeCost()
+    times = egraph.add(ExprTree(times2()))
+    egraph.merge(times, egraph.add(ExprTree(shift())))
+    egraph.rebuild()
+    extractor = IncrementalCostExtractor()
+    extracted = extractor.extract(cost_model, egraph, egraph.root, ExprTree.make_node)
+    assert str(extracted) == "(+ (<< a 1) 1)"
+
+    # the pruned e-node is still in the uses of its children, but is no
+    # longer costed
+    egraph.prune(times, lambda enode: enode.key.value == "*")
+    for costs in (
+        MinimumCostExtractor().compute_costs(cost_model, egraph),
+        extractor.compute_costs(cost_model, egraph),
+    ):
+        assert costs[times.find()] == (2, times.find().nodes[0])
+        assert costs[egraph.root.find()][0] == 3
+    extracted = extractor.extract(cost_model, egraph, egraph.root, ExprTree.make_node)
+    assert str(extracted) == "(+ (* a 2) 1)"
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def test_vectorized_extract(monkeypatch, numpy):
+    if numpy:
+        pytest.importorskip("numpy")
+    else:
+        # as if NumPy wasn't installed
+        monkeypatch.setattr("quiche.analysis.np", None)
+    rules = make_rules() + [ExprTree.make_rule(lambda x, y: (x * y, y * x))]
+    egraph = EGraph(ExprTree(times_divide()))
+    cost_model = ExprNodeCost()
+    for _ in range(3):
+        Rule.apply_rules(rules, egraph)
+        expected = MinimumCostExtractor().compute_costs(cost_model, egraph)
+        actual = VectorizedCostExtractor().compute_costs(cost_model, egraph)
+        assert {eid: cost for eid, (cost, _) in actual.items()} == {
+            eid: cost for eid, (cost, _) in expected.items()
+        }
+        assert all(
+            cost_model.enode_cost_rec(enode, actual) == cost
+            for cost, enode in actual.values()
+        )
+    extracted = VectorizedCostExtractor().extract(
+        cost_model, egraph, egraph.root, ExprTree.make_node
+    )
+    assert str(extracted) == "a"
+
+
+def test_vectorized_extract_empty_eclass():
+    pytest.importorskip("numpy")
+    egraph = EGraph(ExprTree(times2() + 1))
+    times = egraph.add(ExprTree(times2()))
+    last = egraph.add(ExprTree(ExprNode("b", ()) * 3))
+    # e-classes left without e-nodes, before others and last
+    egraph.prune(times, lambda enode: False)
+    egraph.prune(last, lambda enode: False)
+    cost_model = ExprNodeCost()
+    expected = MinimumCostExtractor().compute_costs(cost_model, egraph)
+    actual = VectorizedCostExtractor().compute_costs(cost_model, egraph)
+    assert actual == expected
+    assert actual[times] == actual[last] == actual[egraph.root] == (inf, None)
+
+
+def test_extract_deep_shared_term():
+    # x_{i+1} = x_i + x_i: a term of depth 3000 with 2^3000 leaves, as a tree
+    egraph = EGraph()
+    eclass = egraph.add(ExprTree(ExprNode("x", ())))
+    for _ in range(3000):
+        eclass = egraph.add_enode(ENode("+", (eclass, eclass)))
+    extracted = MinimumCostExtractor().extract(
+        ExprNodeCost(), egraph, eclass, ExprTree.make_node
+    )
+    depth = 0
+    while extracted.children():
+        left, right = extracted.children()
+        # each e-class is built once
+        assert left is right
+        extracted = left
+        depth += 1
+    assert depth == 3000
+    assert str(extracted) == "x"
+
+
+def test_dag_extract():
+    p, q, r, s, t = (ExprNode(name, ()) for name in "pqrst")
+    egraph = EGraph(ExprTree((r / s) - t))
+    egraph.merge(egraph.root, egraph.add(ExprTree((p * q) + (p * q))))
+    egraph.rebuild()
+    cost_model = ExprNodeCost()
+    extracted = MinimumCostExtractor().extract(
+        cost_model, egraph, egraph.root, ExprTree.make_node
+    )
+    assert str(extracted) == "(- (/ r s) t)"
+    # p * q is counted once
+    extractor = DagCostExtractor()
+    extracted = extractor.extract(cost_model, egraph, egraph.root, ExprTree.make_node)
+    assert str(extracted) == "(+ (* p q) (* p q))"
+    selection = extractor.select(cost_model, egraph, egraph.root)
+    assert extractor.dag_cost(cost_model, selection) == 3
+
+    # sharing across e-classes: only the exact search finds it
+    a, b, d, e, f = (ExprNode(name, ()) for name in "abdef")
+    egraph = EGraph(ExprTree((a * b) + ((d - e) - f)))
+    egraph.merge(egraph.add(ExprTree((d - e) - f)), egraph.add(ExprTree((a * b) << b)))
+    egraph.rebuild()
+    extracted = DagCostExtractor().extract(
+        cost_model, egraph, egraph.root, ExprTree.make_node
+    )
+    assert str(extracted) == "(+ (* a b) (- (- d e) f))"
+    extractor = DagCostExtractor(exact=True)
+    extracted = extractor.extract(cost_model, egraph, egraph.root, ExprTree.make_node)
+    assert str(extracted) == "(+ (* a b) (<< (* a b) b))"
+    assert extractor.optimal
+
+
 def run_test():
     eg = EGraph(ExprTree(times_divide()))
     root = eg.root
@@ -210,5 +506,182 @@ def run_test():
             break
 
 
+def test_rebuild_compacts_uses():
+    rules = make_rules() + [
+        ExprTree.make_rule(lambda x, y: (x * y, y * x)),
+        ExprTree.make_rule(lambda x, y, z: ((x * y) * z, x * (y * z))),
+    ]
+    actual = EGraph(ExprTree(times_divide()))
+    for _ in range(6):
+        Rule.apply_rules(rules, actual)
+
+    # the hashcons holds exactly the canonical enodes of the e-classes
+    enodes = [enode for eid in actual.eclasses() for enode in eid.nodes]
+    assert set(actual.hashcons) == set(enodes)
+    assert all(enode == enode.canonicalize() for enode in enodes)
+    # every use is canonical, and listed once by each child e-class
+    for eid in actual.eclasses():
+        assert all(enode == enode.canonicalize() for enode in eid.uses)
+    assert sum(len(eid.uses) for eid in actual.eclasses()) == sum(
+        len(set(enode.args)) for enode in enodes
+    )
+    # merged EClassIDs hold no uses or e-nodes
+    merged = [eid for eid in actual._eclass_ids if eid.parent is not None]
+    assert merged
+    assert all(not eid.uses and not eid.nodes for eid in merged)
+    assert not hasattr(merged[0], "__dict__")
+
+
+def test_analysis_propagation():
+    class CountingFolding(ExprConstantFolding):
+        def __init__(self):
+            self.made = Counter()
+
+        def make(self, egraph, enode):
+            self.made[enode.canonicalize()] += 1
+            return super().make(egraph, enode)
+
+    x = ExprNode("x", ())
+    analysis = CountingFolding()
+    egraph = EGraph(ExprTree((x + 1) * (x + 2)), analysis)
+    three = egraph.add(ExprTree(ExprNode(3, ())))
+    analysis.made.clear()
+    egraph.merge(egraph.add(ExprTree(x)), three)
+    egraph.rebuild()
+
+    assert egraph.root.data == 20
+    # x + 1, x + 2, their product and the new constants are made once each
+    assert len(analysis.made) == 6
+    assert set(analysis.made.values()) == {1}
+    extracted = MinimumCostExtractor().extract(
+        ExprNodeCost(), egraph, egraph.root, ExprTree.make_node
+    )
+    assert str(extracted) == "20"
+
+
+class MinDepth(EClassAnalysis[int]):
+    """Depth of the shallowest term of each e-class."""
+
+    def make(self, egraph, enode):
+        return 1 + max((self.data(arg) for arg in enode.args), default=0)
+
+    def join(self, dval1, dval2):
+        return min(dval1, dval2)
+
+
+def test_product_analysis():
+    constants = ExprConstantFolding()
+    analysis = ProductAnalysis(constants=constants, depth=MinDepth())
+    x = ExprNode("x", ())
+    egraph = EGraph(ExprTree((x * (ExprNode(2, ()) + 3)) / 5), analysis)
+    egraph.rebuild()
+    five = egraph.add(ExprTree(ExprNode(5, ())))
+    # 2 + 3 was folded (and merged with 5)
+    assert constants.data(five) == 5
+    assert analysis["depth"].data(five) == 1
+    assert analysis.data(egraph.root) == (None, 3)
+
+    lhs, rhs = ExprNode.exp(lambda a, b: ((a * b) / b, a))
+
+    def nonzero_divisor(eg, eid, env):
+        return eg.analysis["constants"].data(env["b"]) not in (None, 0)
+
+    rule = ConditionalRule(ExprTree(lhs), ExprTree(rhs), nonzero_divisor)
+    Rule.apply_rules([rule], egraph)
+    assert egraph.root.find() is egraph.add(ExprTree(x))
+    assert analysis.data(egraph.root.find()) == (None, 1)
+
+    with pytest.raises(ValueError):
+        ProductAnalysis(constants=constants)
+
+
+def test_interval_analysis():
+    intervals = ExprIntervalAnalysis()
+    analysis = ProductAnalysis(constants=ExprConstantFolding(), intervals=intervals)
+    x = ExprNode("x", ())
+    three = x * 0 + 3
+    egraph = EGraph(ExprTree(three / three + x / x + (x << 1 >> 3)), analysis)
+    egraph.rebuild()
+    assert intervals.data(egraph.add(ExprTree(three))) == Interval(3, 3, True, False)
+    assert intervals.data(egraph.add(ExprTree(x))) == INTEGERS
+    assert intervals.is_nonzero(egraph.add(ExprTree(three)))
+    assert not intervals.is_nonnegative(egraph.add(ExprTree(x << 1 >> 3)))
+    # >> is folded
+    shifted = egraph.add(ExprTree(ExprNode(20, ()) >> 2))
+    assert analysis.data(shifted) == (5, (5, 5, True, False))
+
+    lhs, rhs = ExprNode.exp(lambda a: (a / a, ExprNode(1, ())))
+    rule = ConditionalRule(
+        ExprTree(lhs), ExprTree(rhs), interval_condition(Interval.is_nonzero, "a")
+    )
+    Rule.apply_rules([rule], egraph)
+    extracted = MinimumCostExtractor().extract(
+        ExprNodeCost(), egraph, egraph.root, ExprTree.make_node
+    )
+    assert str(extracted) == "(+ (+ 1 (/ x x)) (>> (<< x 1) 3))"
+
+    # without an interval analysis, the condition never holds
+    plain = EGraph(ExprTree(three / three))
+    Rule.apply_rules([rule], plain)
+    assert plain.add(ExprTree(ExprNode(1, ()))) is not plain.root.find()
+
+
+def test_save_load(tmp_path):
+    rules = make_rules()
+    saved = EGraph(ExprTree(times_divide()))
+    for _ in range(2):
+        Rule.apply_rules(rules, saved)
+    path = str(tmp_path / "egraph.bin")
+    saved.save(path)
+    loaded = EGraph.load(path)
+
+    def shape(egraph):
+        return {
+            eid.id: sorted((str(n.key), tuple(a.id for a in n.args)) for n in nodes)
+            for eid, nodes in egraph.eclasses().items()
+        }
+
+    assert shape(loaded) == shape(saved)
+    assert loaded.version == saved.version
+    assert loaded.root == saved.root
+    assert loaded.total_size() == saved.total_size()
+    assert loaded.changed_since(saved.version - 1) == set(loaded.eclasses())
+
+    # the loaded e-graph keeps growing like the saved one
+    for egraph in (saved, loaded):
+        Runner(rules).run(egraph)
+    assert shape(loaded) == shape(saved)
+    extracted = MinimumCostExtractor().extract(
+        ExprNodeCost(), loaded, loaded.root, ExprTree.make_node
+    )
+    assert str(extracted) == "a"
+
+
+def test_symbol_keys():
+    actual = EGraph(ExprTree(times_divide()))
+    other = EGraph(ExprTree(shift()))
+    keys = {enode.key.value: enode.key for enode in actual.hashcons}
+    assert sorted(keys, key=str) == ["*", "/", 2, "a"]
+    assert all(type(key) is Symbol for key in keys.values())
+    assert actual.symbols.intern("a") is keys["a"]
+    assert actual.symbols.lookup("-") is None
+    assert str(keys["*"]) == "*"
+    # each e-graph has its own symbols, which are different ints
+    other_keys = {enode.key.value: enode.key for enode in other.hashcons}
+    assert other_keys["a"] != keys["a"]
+    assert other.symbols.lookup("*") is None
+    assert other.symbols.lookup(keys["a"]) is other_keys["a"]
+    # keys that are equal but of different types are different symbols
+    true = actual.add(ExprTree(ExprNode(True, ())))
+    assert actual.add(ExprTree(ExprNode(1, ()))) is not true
+    one_plus_x = ExprNode(1, ()) + ExprNode("x", ())
+    plain = EGraph(ExprTree(one_plus_x))
+    extracted = MinimumCostExtractor().extract(
+        ExprNodeCost(), plain, plain.root, ExprTree.make_node
+    )
+    assert str(extracted) == "(+ 1 x)"
+    assert actual.eclasses_with_key(keys["/"]) == actual.eclasses_with_key("/")
+
+
 if __name__ == "main":
     run_test()
@@ -1,6 +1,7 @@
 from quiche import EGraph, MinimumCostExtractor, Rule
 
 from quiche.lang.prop_parser import PropParser, PropTree, PropTreeCost
+from quiche.scheduler import BackoffScheduler, SimpleScheduler
 
 from .util import verify_egraph_shape  # , print_egraph
 
@@ -19,6 +20,15 @@ def make_rules():
     return rules
 
 
+def make_chain_rules():
+    return make_rules() + [
+        # x & y ===> y & x
+        PropTree.make_rule("(& ?x ?y)", "(& ?y ?x)"),
+        # (x -> y) & (~x -> z) ===> y | z
+        PropTree.make_rule("(& (-> ?x ?y) (-> (~ ?x) ?z))", "(| ?y ?z)"),
+    ]
+
+
 def x_implies_y():
     test_str = "(-> x y)"
     parser = PropParser()
@@ -147,6 +157,64 @@ def test_prop_ematch():
     assert str(match[1]["?y"]) == "e3"
 
 
+def test_compiled_ematch():
+    actual = EGraph(PropTree.parse("(& (| (& a b) (& a c)) (& a a))"))
+    rules = [
+        PropTree.make_rule("(& ?x ?x)", "?x"),
+        PropTree.make_rule("(| (& ?x ?y) (& ?x ?z))", "(& ?x (| ?y ?z))"),
+        PropTree.make_rule("(| ?x ?y)", "(| ?y ?x)"),
+    ]
+    for _ in range(3):
+        for rule in rules:
+            expected = actual.ematch(rule.lhs, actual.eclasses())
+            assert rule.program.search(actual, actual.eclasses()) == expected
+        Rule.apply_rules(rules, actual)
+
+    # (& a a) is the only match of the non-linear pattern
+    matches = rules[0].program.search(actual)
+    assert len(matches) == 1
+    assert str(matches[0][1]["?x"]) == "e0"
+
+
+def test_slot_subst():
+    actual = EGraph(PropTree.parse("(& (| (& a b) (& a c)) (& a a))"))
+    rule = PropTree.make_rule("(| (& ?x ?y) (& ?x ?z))", "(& ?x (| ?y ?z))")
+    for matches in [
+        actual.ematch(rule.lhs, actual.eclasses()),
+        rule.search(actual),
+        rule.search(actual, "relational"),
+    ]:
+        (eid, env), = matches
+        assert str(eid) == "e5"
+        # symbols in left-to-right order, each bound once
+        assert list(env) == ["?x", "?y", "?z"]
+        assert [str(v) for v in env.values()] == ["e0", "e1", "e3"]
+        assert "?w" not in env
+        assert dict(env) == {"?x": env["?x"], "?y": env["?y"], "?z": env["?z"]}
+
+
+def test_relational_ematch():
+    actual = EGraph(PropTree.parse("(& (| (& a b) (& a c)) (& a a))"))
+    rules = [
+        PropTree.make_rule("(& ?x ?x)", "?x"),
+        PropTree.make_rule("(| (& ?x ?y) (& ?x ?z))", "(& ?x (| ?y ?z))"),
+        PropTree.make_rule("(| ?x ?y)", "(| ?y ?x)"),
+        PropTree.make_rule("?x", "(~ (~ ?x))"),
+    ]
+
+    def canonical(matches):
+        return sorted((str(eid), sorted(env.items())) for eid, env in matches)
+
+    for _ in range(3):
+        for rule in rules:
+            expected = canonical(rule.search(actual))
+            assert canonical(rule.search(actual, "relational")) == expected
+        Rule.apply_rules(rules, actual, matcher="relational")
+
+    # (| (& a b) (& a c)) ===> (& a (| b c))
+    assert str(rules[1].search(actual, "relational")[0][1]["?x"]) == "e0"
+
+
 def test_expr_subst():
     actual = EGraph(x_implies_y())
     impl_root = actual.root
@@ -305,3 +373,145 @@ def test_prove_chain():
         "e18": {"~": [("e5",)]},
     }
     assert verify_egraph_shape(actual, expected)
+
+
+def test_backoff_scheduler():
+    rules = make_chain_rules()
+    actual = EGraph(PropTree.parse("(& (-> a b) (-> b c))"))
+    scheduler = BackoffScheduler(match_limit=8, ban_length=2)
+
+    # ?x ===> ~ (~ ?x) matches every e-class, so it is the first to be banned
+    Rule.apply_rules(rules, actual, scheduler=scheduler)
+    assert scheduler.throttled == []
+    Rule.apply_rules(rules, actual, scheduler=scheduler)
+    assert scheduler.throttled == [rules[2]]
+    assert scheduler.banned_rules(scheduler.iteration) == [rules[2]]
+    assert scheduler.stats[rules[2]].times_banned == 1
+
+    for _ in range(10):
+        if actual.is_saturated():
+            break
+        Rule.apply_rules(rules, actual, scheduler=scheduler)
+    assert actual.is_saturated()
+    assert scheduler.banned_rules(scheduler.iteration) == []
+
+    extracted = MinimumCostExtractor().extract(PropTreeCost(), actual, actual.root, PropTree)
+    assert str(extracted) == "(-> a c)"
+
+
+def test_incremental_search():
+    rules = make_chain_rules()
+    full = EGraph(PropTree.parse("(& (-> a b) (-> b c))"))
+    actual = EGraph(PropTree.parse("(& (-> a b) (-> b c))"))
+    scheduler = SimpleScheduler(incremental=True)
+
+    version = actual.version
+    assert actual.changed_since(version) == set()
+    for _ in range(10):
+        if actual.is_saturated():
+            break
+        Rule.apply_rules(rules, full)
+        Rule.apply_rules(rules, actual, scheduler=scheduler)
+        # the same e-graph is built, with fewer matches searched
+        assert actual.version == full.version
+        assert len(actual.eclasses()) == len(full.eclasses())
+    assert actual.is_saturated()
+    assert actual.changed_since(actual.version) == set()
+    assert actual.root.find() in actual.changed_since(version)
+    # nothing changed since the last search: no match is new
+    assert all(rule.search(actual, since=actual.version) == [] for rule in rules)
+
+    extracted = MinimumCostExtractor().extract(PropTreeCost(), actual, actual.root, PropTree)
+    assert str(extracted) == "(-> a c)"
+
+
+def test_change_log_compaction():
+    rules = [
+        PropTree.make_rule("(| ?x ?y)", "(| ?y ?x)"),
+        PropTree.make_rule("(& ?x ?y)", "(& ?y ?x)"),
+        PropTree.make_rule("(~ (| ?x ?y))", "(& (~ ?x) (~ ?y))"),
+    ]
+    actual = EGraph(PropTree.parse("(~ (| (| a b) (| c (& d e))))"))
+    versions = [actual.version]
+    for _ in range(6):
+        Rule.apply_rules(rules, actual)
+        versions.append(actual.version)
+    expected = [actual.changed_since(version) for version in versions]
+    actual._compact_change_log()
+    # one entry per changed e-class, with the same results
+    assert len(actual._changed_eclasses) <= len(actual.eclasses())
+    assert [actual.changed_since(version) for version in versions] == expected
+
+    # the log stays proportional to the e-graph however many changes it logs
+    for _ in range(2000):
+        actual._log_change(actual.root)
+    assert len(actual._changed_eclasses) <= 2 * len(actual.eclasses()) + 1024
+
+
+def test_iter_matches():
+    actual = EGraph(PropTree.parse("(& (| (& a b) (& a c)) (& a a))"))
+    pattern = PropTree.parse("(& ?x ?y)")
+    expected = actual.ematch(pattern, actual.eclasses())
+    assert len(expected) == 4
+    assert list(actual.iter_matches(pattern)) == expected
+    assert list(actual.iter_matches(pattern, 2)) == expected[:2]
+
+    rule = PropTree.make_rule("(& ?x ?y)", "(& ?y ?x)")
+    for matcher in ["machine", "relational"]:
+        assert len(list(rule.iter_matches(actual, matcher))) == 4
+        assert len(rule.search(actual, matcher, limit=3)) == 3
+
+
+def test_match_limit():
+    rules = [
+        PropTree.make_rule("(| ?x ?y)", "(| ?y ?x)"),
+        PropTree.make_rule("(& ?x ?y)", "(& ?y ?x)"),
+    ]
+    actual = EGraph(PropTree.parse("(& (| (& a b) (& a c)) (& a a))"))
+    scheduler = SimpleScheduler(match_limit=2)
+    matches = Rule.search_rules(rules, actual, scheduler=scheduler)
+    assert [len(rule_matches) for _, rule_matches in matches] == [1, 2]
+    assert scheduler.truncated == [rules[1]]
+    for _ in range(20):
+        if actual.is_saturated():
+            break
+        Rule.apply_rules(rules, actual, scheduler=scheduler)
+    # only saturated once no rule has matches left out
+    assert actual.is_saturated()
+    assert scheduler.truncated == []
+
+    expected = EGraph(PropTree.parse("(& (| (& a b) (& a c)) (& a a))"))
+    while not expected.is_saturated():
+        Rule.apply_rules(rules, expected)
+    assert len(actual.hashcons) == len(expected.hashcons)
+
+
+def test_parallel_search():
+    def canonical(matches):
+        return [
+            (str(rule), [(str(eid), sorted(map(str, env.items()))) for eid, env in m])
+            for rule, m in matches
+        ]
+
+    rules = make_chain_rules()
+    actual = EGraph(PropTree.parse("(& (-> a b) (-> b c))"))
+    expected = EGraph(PropTree.parse("(& (-> a b) (-> b c))"))
+    scheduler = BackoffScheduler(match_limit=8, ban_length=2)
+    expected_scheduler = BackoffScheduler(match_limit=8, ban_length=2)
+    for _ in range(4):
+        matches = Rule.search_rules(rules, actual, scheduler=scheduler, workers=2)
+        expected_matches = Rule.search_rules(rules, expected, scheduler=expected_scheduler)
+        assert canonical(matches) == canonical(expected_matches)
+        for egraph, sched, rule_matches in [
+            (actual, scheduler, matches),
+            (expected, expected_scheduler, expected_matches),
+        ]:
+            for rule, m in rule_matches:
+                egraph.apply_rewrite(rule, m)
+            egraph.rebuild()
+            sched.iteration += 1
+    assert scheduler.stats[rules[2]].times_banned == 1
+    assert [repr(stats) for stats in scheduler.stats.values()] == [
+        repr(stats) for stats in expected_scheduler.stats.values()
+    ]
+    assert len(actual.hashcons) == len(expected.hashcons)